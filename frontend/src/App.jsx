@@ -1,28 +1,106 @@
-import { useState, useEffect, use } from "react";
+import { useState, useEffect, useRef, useCallback } from "react";
 import "./App.css";
-const API_URL = "http://localhost:8000/api/transaction/";
+const SYNC_URL = "http://localhost:8000/api/v1/sync/";
+const CACHE_KEY = "inwallet:sync";
+const PAGE_SIZE = 50;
+
+// Cópia local: { token, categories: { [id]: categoria }, transactions: { [id]: transação } }
+function loadCache() {
+  try {
+    const cached = JSON.parse(localStorage.getItem(CACHE_KEY));
+    if (cached && cached.transactions && cached.categories) return cached;
+  } catch (e) {
+    // Cache corrompido: começa do zero
+  }
+  return { token: "0", categories: {}, transactions: {} };
+}
+
+function saveCache(cache) {
+  try {
+    localStorage.setItem(CACHE_KEY, JSON.stringify(cache));
+  } catch (e) {
+    console.warn("Não foi possível salvar o cache local:", e);
+  }
+}
+
+// Mais recentes primeiro, como na listagem da API
+function sortTransactions(byId) {
+  return Object.values(byId).sort(
+    (a, b) => b.date.localeCompare(a.date) || b.id - a.id
+  );
+}
 
 function App() {
-  const [transactions, setTransactions] = useState([]);
+  const [transactions, setTransactions] = useState(() =>
+    sortTransactions(loadCache().transactions)
+  );
+  const [categories, setCategories] = useState(() => loadCache().categories);
   const [error, setError] = useState(null);
+  const [syncing, setSyncing] = useState(false);
+  // Quantas transações já estão na tela (rolagem infinita sobre o cache local)
+  const [visible, setVisible] = useState(PAGE_SIZE);
+  const sentinelRef = useRef(null);
 
-  useEffect(() => {
-    async function fetchTransactions() {
-      try {
-        const response = await fetch(API_URL);
+  // Busca só o que mudou desde o último token e aplica no cache local
+  const sync = useCallback(async () => {
+    setSyncing(true);
+    const cache = loadCache();
+    try {
+      let hasMore = true;
+      while (hasMore) {
+        const response = await fetch(`${SYNC_URL}?since=${cache.token}`, {
+          credentials: "include",
+        });
         if (!response.ok) {
           throw new Error(`HTTP error! status: ${response.status}`);
         }
         const data = await response.json();
-        setTransactions(data.results || data);
-      } catch (e) {
-        console.error("Falha ao buscar transações:", e);
-        setError(
-          `Não foi possível carregar dados. Você está com o servidor Django rodando?`
-        );
+        if (data.reset) {
+          cache.categories = {};
+          cache.transactions = {};
+        }
+        for (const c of data.categories) cache.categories[c.id] = c;
+        for (const id of data.deleted.category) delete cache.categories[id];
+        for (const t of data.transactions) cache.transactions[t.id] = t;
+        for (const id of data.deleted.transaction) delete cache.transactions[id];
+        cache.token = data.token;
+        hasMore = data.has_more;
       }
+      saveCache(cache);
+      setCategories(cache.categories);
+      setTransactions(sortTransactions(cache.transactions));
+      setError(null);
+    } catch (e) {
+      console.error("Falha ao sincronizar transações:", e);
+      setError(
+        `Não foi possível carregar dados. Você está com o servidor Django rodando?`
+      );
+    } finally {
+      setSyncing(false);
     }
-    fetchTransactions();
+  }, []);
+
+  // Sincroniza ao abrir e sempre que a aba volta a ficar visível
+  useEffect(() => {
+    sync();
+    const onVisible = () => {
+      if (document.visibilityState === "visible") sync();
+    };
+    document.addEventListener("visibilitychange", onVisible);
+    return () => document.removeEventListener("visibilitychange", onVisible);
+  }, [sync]);
+
+  // Rolagem infinita: mostra mais itens quando o fim da lista aparece
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!sentinel) return;
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) {
+        setVisible((current) => current + PAGE_SIZE);
+      }
+    });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
   }, []);
 
   return (
@@ -36,7 +114,7 @@ function App() {
         {transactions.length > 0 ? (
           <ul style={{ listStyle: "none", paddingLeft: 0 }}>
             {/* 7. Fazemos um "loop" (map) sobre o estado das transações */}
-            {transactions.map((t) => (
+            {transactions.slice(0, visible).map((t) => (
               <li
                 key={t.id}
                 style={{
@@ -47,7 +125,9 @@ function App() {
                   background: "#fff",
                 }}
               >
-                <strong>{t.date}</strong> | {t.category_name}
+                <strong>{t.date}</strong> |{" "}
+                {/* Categoria renomeada chega pelo sync sem reenviar as transações */}
+                {categories[t.category]?.name ?? t.category_name}
                 <span
                   style={{
                     float: "right",
@@ -70,8 +150,11 @@ function App() {
             ))}
           </ul>
         ) : (
-          !error && <p>Carregando transações...</p>
+          !error && !syncing && <p>Nenhuma transação encontrada.</p>
         )}
+        {syncing && <p>Sincronizando transações...</p>}
+        {/* Elemento observado para mostrar mais itens */}
+        <div ref={sentinelRef} style={{ height: "1px" }} />
       </div>
     </div>
   );
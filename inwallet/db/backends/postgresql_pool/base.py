@@ -0,0 +1,122 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+import os
+import threading
+
+# --- POSTGRESQL COM POOL DE CONEXÕES (psycopg_pool) ---
+# Backend igual ao 'django.db.backends.postgresql', mas as conexões vêm de um
+# psycopg_pool.ConnectionPool do processo (um pool por worker do gunicorn /
+# uvicorn) em vez de um connect() novo a cada requisição. Quando o Django
+# "fecha" a conexão (fim da requisição, CONN_MAX_AGE = 0), ela volta ao pool.
+#
+# DATABASES['default'] = {
+#     'ENGINE': 'inwallet.db.backends.postgresql_pool',
+#     'CONN_MAX_AGE': 0,
+#     'CONN_HEALTH_CHECKS': True,   # o pool testa a conexão antes de entregá-la
+#     'OPTIONS': {'pool': {'min_size': 2, 'max_size': 10, 'timeout': 10}},
+#     ...
+# }
+#
+# O Django 5.1 tem isto nativamente (OPTIONS['pool']); este backend segue a
+# mesma configuração para a troca ser só de ENGINE.
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_stats():
+    """ {alias: ConnectionPool.get_stats()} dos pools já abertos neste processo. """
+    with _pools_lock:
+        pools = [(key[1], pool) for key, pool in _pools.items() if key[0] == os.getpid()]
+    return {alias: pool.get_stats() for alias, pool in pools}
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    # Conexões paradas no pool impediriam o CREATE/DROP do banco de testes
+    def create_test_db(self, *args, **kwargs):
+        self.connection.close_pools()
+        return super().create_test_db(*args, **kwargs)
+
+    def destroy_test_db(self, *args, **kwargs):
+        self.connection.close_pools()
+        return super().destroy_test_db(*args, **kwargs)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def pool_options(self):
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if options is True:
+            return {}
+        return options or None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # 'pool' é deste backend, não um parâmetro do psycopg.connect()
+        params.pop('pool', None)
+        return params
+
+    @property
+    def pool(self):
+        """
+        Pool deste processo para o banco configurado, criado no primeiro uso.
+        A chave inclui o PID (um worker criado por fork não herda o pool do
+        processo pai) e o nome do banco (o de testes tem o seu).
+        """
+        options = self.pool_options()
+        if options is None or self.alias == NO_DB_ALIAS:
+            return None
+        key = (os.getpid(), self.alias, self.settings_dict['NAME'])
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured(
+                'Com o pool, use CONN_MAX_AGE = 0: a conexão volta ao pool no fim de cada requisição.'
+            )
+        try:
+            from psycopg_pool import ConnectionPool
+        except ImportError as exc:
+            raise ImproperlyConfigured('O pool de conexões precisa do pacote psycopg-pool.') from exc
+
+        with _pools_lock:
+            if key not in _pools:
+                params = self.get_connection_params()
+                # O Django acerta o autocommit depois de receber a conexão
+                params['autocommit'] = True
+                check = ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+                _pools[key] = ConnectionPool(
+                    kwargs=params, check=check, open=True, name=f'{self.alias}-{os.getpid()}', **options,
+                )
+        return _pools[key]
+
+    def close_pools(self):
+        """ Fecha os pools deste alias neste processo (testes, reconfiguração). """
+        with _pools_lock:
+            for key in [key for key in _pools if key[:2] == (os.getpid(), self.alias)]:
+                _pools.pop(key).close()
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.getconn()
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        if isolation_level is None:
+            self.isolation_level = base.IsolationLevel.READ_COMMITTED
+        else:
+            self.isolation_level = base.IsolationLevel(isolation_level)
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None and self.pool is not None:
+            with self.wrap_database_errors:
+                # Devolve ao pool (que desfaz uma transação aberta, se houver)
+                self.connection._pool.putconn(self.connection)
+                self.connection = None
+            return
+        return super()._close()
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Category, Account, Transaction
+from .models import Category, CategoryRule, Account, Budget, Transaction, RecurringRule
+from . import search
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -7,13 +9,42 @@ class CategoryAdmin(admin.ModelAdmin):
     list_filter = ('type', 'user')
     search_fields = ('name',)
 
+
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
     list_display = ('name', 'user', 'balance')
     search_fields = ('name', 'user__username') # Corrigi 'user_username' para 'user__username'
 
+
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
     list_display = ('date', 'user', 'account', 'type', 'amount', 'category')
-    list_filter = ('type', 'date', 'category')
-    search_fields = ('description',)
\ No newline at end of file
+    list_filter = ('type', 'date', 'category', ('possible_duplicate', admin.EmptyFieldListFilter))
+    search_fields = ('description',)
+    # Um <select> com todas as transações seria inviável
+    raw_id_fields = ('possible_duplicate',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Busca indexada (search.py) em vez de um icontains em toda a tabela
+        if not search_term.strip():
+            return queryset, False
+        return search.search(queryset, search_term), False
+
+
+@admin.register(RecurringRule)
+class RecurringRuleAdmin(admin.ModelAdmin):
+    list_display = ('description', 'user', 'account', 'type', 'amount', 'frequency', 'interval', 'next_date', 'active')
+    list_filter = ('frequency', 'type', 'active')
+    search_fields = ('description', 'user__username')
+
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ('category', 'user', 'amount', 'alert_percent')
+    search_fields = ('category__name', 'user__username')
+
+
+@admin.register(CategoryRule)
+class CategoryRuleAdmin(admin.ModelAdmin):
+    list_display = ('pattern', 'category', 'user')
+    search_fields = ('pattern', 'category__name', 'user__username')
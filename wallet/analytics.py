@@ -0,0 +1,186 @@
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+import numpy as np
+import pandas as pd
+from .models import Category, Transaction
+
+# --- ANÁLISES VETORIZADAS (pandas) ---
+# As transações do usuário são lidas uma única vez com values_list() (sem
+# instanciar modelos) para um DataFrame, e todas as métricas são calculadas
+# com operações vetorizadas sobre colunas: nenhum laço Python por linha.
+# O valor vem do banco já como float (Cast): para análises a precisão de
+# centavos do Decimal não é necessária, e a conversão é bem mais rápida.
+
+COLUMNS = ('id', 'date', 'type', 'amount', 'category_id', 'account_id')
+
+
+def build_frame(data, category_names):
+    """
+    Monta o DataFrame de análise a partir de registros na ordem de COLUMNS
+    (ou de um dict de colunas) e de um dict {category_id: nome}.
+    """
+    if isinstance(data, dict):
+        frame = pd.DataFrame(data, columns=COLUMNS)
+    else:
+        frame = pd.DataFrame.from_records(data, columns=COLUMNS)
+    frame['date'] = pd.to_datetime(frame['date'])
+    frame['amount'] = frame['amount'].astype('float64')
+    is_income = (frame['type'] == 'income').to_numpy()
+    frame['type'] = frame['type'].astype('category')
+    frame['signed'] = np.where(is_income, frame['amount'], -frame['amount'])
+    frame['category'] = frame['category_id'].map(category_names).astype('category')
+    frame['month'] = frame['date'].dt.to_period('M')
+    return frame
+
+
+def load_frame(user, start=None, end=None, chunk_size=20_000):
+    """ Transações do usuário (start <= date < end) em um DataFrame. """
+    qs = Transaction.objects.filter(user=user)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lt=end)
+    rows = qs.order_by().values_list(
+        'id', 'date', 'type', Cast('amount', FloatField()), 'category_id', 'account_id',
+    )
+    names = dict(Category.objects.filter(user=user).values_list('id', 'name'))
+    return build_frame(list(rows.iterator(chunk_size=chunk_size)), names)
+
+
+def _month_range(frame):
+    return pd.period_range(frame['month'].min(), frame['month'].max(), freq='M')
+
+
+def monthly_totals(frame):
+    """ Receita, despesa e saldo (net) por mês, sem buracos entre meses. """
+    if frame.empty:
+        return pd.DataFrame(columns=['income', 'expense', 'net'])
+    table = (
+        frame.groupby(['month', 'type'], observed=True)['amount'].sum()
+        .unstack(fill_value=0.0)
+        .reindex(index=_month_range(frame), columns=['income', 'expense'], fill_value=0.0)
+    )
+    table['net'] = table['income'] - table['expense']
+    return table
+
+
+def rolling_average(monthly, window=3):
+    """ Média móvel da receita, despesa e saldo, em 'window' meses. """
+    return monthly[['income', 'expense', 'net']].rolling(window, min_periods=1).mean()
+
+
+def month_over_month(monthly):
+    """ Variação absoluta e percentual de cada mês para o anterior. """
+    delta = monthly[['income', 'expense', 'net']].diff()
+    pct = monthly[['income', 'expense']].pct_change(fill_method=None).replace([np.inf, -np.inf], np.nan) * 100
+    return delta.join(pct, rsuffix='_pct')
+
+
+def category_trends(frame, months=6):
+    """
+    Despesa por categoria nos últimos 'months' meses e a tendência de cada
+    uma: inclinação da reta de mínimos quadrados (R$/mês), calculada para
+    todas as categorias de uma vez com um produto de matrizes.
+    """
+    expenses = frame[frame['type'] == 'expense']
+    if expenses.empty:
+        return pd.DataFrame(columns=['total', 'average', 'last', 'slope'])
+    last_month = frame['month'].max()
+    periods = pd.period_range(last_month - (months - 1), last_month, freq='M')
+    recent = expenses[expenses['month'] >= periods[0]]
+    table = (
+        recent.groupby(['category', 'month'], observed=True)['amount'].sum()
+        .unstack(fill_value=0.0)
+        .reindex(columns=periods, fill_value=0.0)
+    )
+    values = table.to_numpy()
+    x = np.arange(months, dtype='float64')
+    x -= x.mean()
+    slope = values @ x / (x @ x) if months > 1 else np.zeros(len(table))
+    trends = pd.DataFrame({
+        'total': values.sum(axis=1),
+        'average': values.mean(axis=1),
+        'last': values[:, -1],
+        'slope': slope,
+    }, index=table.index)
+    return trends.sort_values('total', ascending=False)
+
+
+def burn_rate(frame, days=90, balance=None):
+    """
+    Gasto médio por dia e por mês (30 dias) nos últimos 'days' dias e, se o
+    saldo atual for informado, por quantos meses ele cobre o saldo negativo
+    do período (runway).
+    """
+    if frame.empty:
+        return {'days': days, 'daily': 0.0, 'monthly': 0.0, 'net_monthly': 0.0, 'runway_months': None}
+    end = frame['date'].max()
+    window = frame[frame['date'] > end - pd.Timedelta(days=days)]
+    expense = window['amount'].where(window['type'] == 'expense', 0.0).sum()
+    net = window['signed'].sum()
+    daily = expense / days
+    net_monthly = net / days * 30
+    runway = None
+    if balance is not None and net_monthly < 0:
+        runway = float(balance) / -net_monthly
+    return {
+        'days': days,
+        'daily': float(daily),
+        'monthly': float(daily * 30),
+        'net_monthly': float(net_monthly),
+        'runway_months': runway,
+    }
+
+
+def outliers(frame, threshold=3.0, min_count=5):
+    """
+    Despesas fora do padrão da própria categoria: |z-score| >= threshold,
+    com média e desvio padrão de cada categoria (groupby().transform).
+    Categorias com menos de 'min_count' despesas são ignoradas.
+    """
+    expenses = frame[frame['type'] == 'expense']
+    grouped = expenses.groupby('category_id')['amount']
+    mean = grouped.transform('mean')
+    std = grouped.transform('std')
+    count = grouped.transform('size')
+    z = ((expenses['amount'] - mean) / std.where(std > 0)).fillna(0.0)
+    flagged = expenses.assign(z=z)[(z.abs() >= threshold) & (count >= min_count)]
+    return flagged.sort_values('z', ascending=False)[['id', 'date', 'category', 'amount', 'z']]
+
+
+# --- SAÍDA EM JSON ---
+
+def _clean(values):
+    return [None if isinstance(v, float) and np.isnan(v) else v for v in values]
+
+
+def _columns(table, index_name):
+    """ DataFrame -> dict colunar ({'period': [...], 'coluna': [...]}). """
+    index = table.index
+    if isinstance(index, pd.PeriodIndex):
+        index = index.to_timestamp().strftime('%Y-%m-%d')
+    data = {index_name: [str(value) for value in index]}
+    for column in table.columns:
+        data[str(column)] = _clean(table[column].round(2).tolist())
+    return data
+
+
+def insights(user, start, end, window=3, threshold=3.0, balance=None):
+    """ Todas as métricas do período, prontas para a API. """
+    frame = load_frame(user, start, end)
+    monthly = monthly_totals(frame)
+    flagged = outliers(frame, threshold)
+    return {
+        'monthly': _columns(monthly, 'period'),
+        'rolling': _columns(rolling_average(monthly, window), 'period'),
+        'month_over_month': _columns(month_over_month(monthly), 'period'),
+        'category_trends': _columns(category_trends(frame), 'category'),
+        'burn_rate': burn_rate(frame, balance=balance),
+        'outliers': {
+            'id': flagged['id'].tolist(),
+            'date': flagged['date'].dt.date.astype(str).tolist(),
+            'category': flagged['category'].astype(str).tolist(),
+            'amount': flagged['amount'].round(2).tolist(),
+            'z': flagged['z'].round(2).tolist(),
+        },
+    }
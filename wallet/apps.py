@@ -6,4 +6,5 @@ class WalletConfig(AppConfig):
 
     # ADICIONE ESTE MÉTODO:
     def ready(self):
-        import wallet.signals  # Isso ativa os sinais
\ No newline at end of file
+        import wallet.signals  # Isso ativa os sinais
+        import wallet.metrics  # Mede as consultas SQL de cada requisição
\ No newline at end of file
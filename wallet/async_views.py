@@ -0,0 +1,238 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import Http404, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags, quote_etag
+from django.views import View
+from rest_framework.exceptions import NotAuthenticated, NotFound, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+import asyncio
+import datetime
+import hashlib
+from .models import Account, Transaction
+from .serializers import TransactionSerializer
+from . import budgets, filters, ledger, pagination, replicas, reports, rollups
+from . import cache as dashboard_cache
+
+# --- API ASSÍNCRONA (ASGI) ---
+# Versões async das APIs de leitura de transações, contas e relatórios, para
+# rodar sob um servidor ASGI (uvicorn). O DRF não tem views async, então são
+# views do Django que devolvem o mesmo JSON das views do DRF.
+# O ORM do Django ainda é síncrono: cada consulta roda em uma thread com
+# sync_to_async. Com thread_sensitive=False (ver _db) as consultas
+# independentes de uma requisição (os agregados do dashboard, a página e as
+# facetas) rodam ao mesmo tempo, cada uma com a sua conexão, e o event loop
+# fica livre para outras requisições enquanto o banco trabalha.
+# Todo acesso ao banco passa por _db, inclusive a sessão e o usuário: sob
+# ASGI, o código thread_sensitive (o padrão de sync_to_async e da API async
+# do ORM) roda em uma thread criada para cada requisição, que abriria uma
+# conexão nova toda vez. As threads do executor duram, e com CONN_MAX_AGE as
+# suas conexões são reaproveitadas.
+
+
+def _db(func):
+    """
+    Roda 'func' (que consulta o banco) em uma thread do executor. No fim,
+    devolve a conexão daquela thread conforme o CONN_MAX_AGE, como o Django
+    faz ao terminar uma requisição.
+    """
+    def call(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+def _json(data, status=200):
+    # O mesmo encoder do DRF: Decimal e datas saem como nas views síncronas
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _accounts(user):
+    return list(Account.objects.filter(user=user).order_by('name').values('id', 'name', 'balance'))
+
+
+class AsyncAPIView(View):
+    """
+    Base das views async: exige um usuário autenticado (sessão) e converte
+    os erros de validação do DRF em respostas JSON.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        # request.user (sessão e usuário) é carregado do banco na primeira leitura
+        if not await _db(lambda: request.user.is_authenticated)():
+            return _json({'detail': str(NotAuthenticated.default_detail)}, status=403)
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except ValidationError as exc:
+            return _json(exc.detail, status=400)
+        except (Http404, NotFound) as exc:
+            return _json({'detail': str(exc)}, status=404)
+
+
+class AsyncTransactionListAPIView(AsyncAPIView):
+    """
+    GET: como TransactionListCreateAPIView (filtros, cursor, ?facets=1), com
+    a página e as facetas consultadas ao mesmo tempo.
+    """
+    page_size = 50
+    max_page_size = 200
+
+    def _page_size(self, params):
+        try:
+            size = int(params.get('page_size', self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _page(self, queryset, cursor, size):
+        try:
+            page = pagination.paginate(queryset, cursor, size)
+        except pagination.InvalidCursor:
+            raise NotFound('Cursor inválido.')
+        return page, TransactionSerializer(page.object_list, many=True).data
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), 'cursor', cursor)
+
+    async def get(self, request):
+        user = request.user
+        parsed = filters.parse(request.GET)
+        queryset = filters.apply(Transaction.objects.filter(user=user).for_listing(), parsed)
+        cursor = request.GET.get('cursor')
+
+        tasks = [_db(self._page)(queryset, cursor, self._page_size(request.GET))]
+        if request.GET.get('facets') in ('1', 'true') and not cursor:
+            tasks.append(_db(filters.facets_for)(user, parsed))
+        (page, results), *facets = await asyncio.gather(*tasks)
+
+        data = {
+            'next': self._link(page.next_cursor),
+            'previous': self._link(page.previous_cursor),
+            'results': results,
+        }
+        if facets:
+            data['facets'] = facets[0]
+        return _json(data)
+
+
+class AsyncAccountListAPIView(AsyncAPIView):
+    """ GET: contas do usuário com o saldo atual. """
+    async def get(self, request):
+        return _json(await _db(_accounts)(request.user))
+
+
+class AsyncAccountBalanceAPIView(AsyncAPIView):
+    """ GET ?date=AAAA-MM-DD: como AccountBalanceAPIView. """
+    async def get(self, request, pk):
+        account = await _db(Account.objects.filter(user=request.user, pk=pk).first)()
+        if account is None:
+            raise Http404('Conta não encontrada.')
+        day = reports.parse_date(request.GET, 'date', datetime.date.today())
+        return _json({
+            'account': account.pk,
+            'date': day.isoformat(),
+            'balance': await _db(ledger.balance_at)(account, day),
+        })
+
+
+class AsyncReportAPIView(AsyncAPIView):
+    """
+    Base dos relatórios async, com o mesmo ETag das views síncronas
+    (BaseReportAPIView): se nada mudou, 304 sem nenhuma agregação.
+    """
+    async def get(self, request):
+        start, end, granularity = reports.parse_params(request.GET)
+        version = await sync_to_async(dashboard_cache.get_version)(request.user.pk)
+        params = reports.etag_params(request.GET, start, end, granularity)
+        raw = f"{request.path}|{request.user.pk}|{version}|{params}"
+        etag = quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            # O contexto (a réplica escolhida) segue para a thread de _db
+            with replicas.using(await sync_to_async(replicas.choose)(request.user.pk)):
+                data = await _db(self.build_report)(request, start, end, granularity)
+            response = _json({
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'granularity': granularity,
+                'data': data,
+            })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def build_report(self, request, start, end, granularity):
+        raise NotImplementedError
+
+
+class AsyncMonthlyReportAPIView(AsyncReportAPIView):
+    """ GET: receita e despesa por período (day/week/month/year). """
+    def build_report(self, request, start, end, granularity):
+        return reports.period_totals(request.user, start, end, granularity)
+
+
+class AsyncCategoryReportAPIView(AsyncReportAPIView):
+    """ GET: totais por categoria no intervalo (filtro opcional 'type'). """
+    def build_report(self, request, start, end, granularity):
+        tx_type = request.GET.get('type')
+        if tx_type and tx_type not in dict(Transaction.TYPE_CHOICES):
+            raise ValidationError({'type': "Use 'income' ou 'expense'."})
+        return reports.category_totals(request.user, start, end, tx_type)
+
+
+class AsyncCashflowReportAPIView(AsyncReportAPIView):
+    """ GET: fluxo de caixa por período, com saldo líquido e acumulado. """
+    def build_report(self, request, start, end, granularity):
+        return reports.cashflow(request.user, start, end, granularity)
+
+
+class AsyncDashboardAPIView(AsyncAPIView):
+    """
+    GET ?year=&month=: os dados do dashboard em JSON. Os agregados são
+    independentes entre si e rodam ao mesmo tempo; o resultado fica no cache
+    do dashboard (invalidado pelos sinais, como o da página HTML).
+    """
+    def _month(self, params):
+        today = datetime.date.today()
+        try:
+            year = int(params.get('year', today.year))
+            month = int(params.get('month', today.month))
+            return datetime.date(year, month, 1)
+        except ValueError:
+            raise ValidationError({'month': "Informe 'year' e 'month' válidos."})
+
+    async def get(self, request):
+        user = request.user
+        month = self._month(request.GET)
+
+        async def build():
+            # asyncio.gather copia o contexto (a réplica escolhida) para cada tarefa
+            with replicas.using(await sync_to_async(replicas.choose)(user.pk)):
+                accounts, (income, expense), categories, year, month_budgets = await asyncio.gather(
+                    _db(_accounts)(user),
+                    _db(rollups.month_totals)(user, month.year, month.month),
+                    _db(rollups.top_categories)(user, month.year, month.month),
+                    _db(rollups.year_summary)(user, month.year),
+                    _db(budgets.status)(user, month),
+                )
+            return {
+                'accounts': accounts,
+                'total_balance': sum(account['balance'] for account in accounts),
+                'monthly_income': income,
+                'monthly_expense': expense,
+                'monthly_net': income - expense,
+                'top_categories': [
+                    {'name': row['category__name'], 'total': row['total']} for row in categories
+                ],
+                'year_summary': year,
+                'budgets': month_budgets,
+            }
+
+        payload = await dashboard_cache.aget_dashboard(
+            user.pk, month.year, month.month, build, name='dashboard-api',
+        )
+        return _json(payload)
@@ -0,0 +1,151 @@
+from django.db import transaction as db_transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from collections import defaultdict
+from contextlib import contextmanager
+from django.utils import timezone
+from decimal import Decimal
+import threading
+from .models import Account, UserRevision
+from . import cache as dashboard_cache
+
+# --- MOTOR DE SALDOS ---
+# Os saldos são alterados sempre com UPDATE ... SET balance = balance + delta,
+# executado pelo próprio banco. Assim dois workers gravando na mesma conta
+# ao mesmo tempo não perdem atualizações (não há leitura + escrita no Python).
+
+
+def delta_for(amount, tx_type):
+    """ Calcula o delta (positivo ou negativo) de uma transação no saldo. """
+    if tx_type == 'income':
+        return Decimal(amount)
+    elif tx_type == 'expense':
+        return -Decimal(amount)
+    return Decimal('0.00')
+
+
+_pending = threading.local()
+
+
+@contextmanager
+def deferred():
+    """
+    Dentro deste bloco os deltas são apenas somados por conta; ao sair,
+    cada conta recebe um único UPDATE. Use dentro de um transaction.atomic():
+    se o bloco falhar, os deltas acumulados são descartados junto com o rollback.
+    """
+    if getattr(_pending, 'deltas', None) is not None:
+        # Bloco aninhado: quem abriu o primeiro aplica tudo
+        yield
+        return
+
+    _pending.deltas = defaultdict(Decimal)
+    try:
+        yield
+        deltas = _pending.deltas
+    finally:
+        _pending.deltas = None
+    apply_deltas(deltas)
+
+
+def apply_deltas(deltas):
+    """
+    Aplica um dict {account_id: delta} com um UPDATE atômico por conta.
+    As contas são atualizadas em ordem de ID para que duas transações
+    concorrentes travem as linhas na mesma ordem (evita deadlocks).
+    """
+    pending = getattr(_pending, 'deltas', None)
+    if pending is not None:
+        for account_id, delta in deltas.items():
+            pending[account_id] += delta
+        return
+
+    # A conta recebe a revisão atual do usuário (já incrementada pela gravação
+    # que causou o delta), para que o novo saldo chegue aos clientes no sync.
+    revision = Coalesce(
+        Subquery(UserRevision.objects.filter(user_id=OuterRef('user_id')).values('revision')[:1]),
+        F('revision'),
+    )
+    for account_id in sorted(deltas):
+        delta = deltas[account_id]
+        if account_id is None or not delta:
+            continue
+        # Se a conta já foi apagada, o UPDATE simplesmente não afeta nenhuma linha
+        Account.objects.filter(pk=account_id).update(
+            balance=F('balance') + delta, revision=revision, updated_at=timezone.now(),
+        )
+
+
+def post(account_id, amount, tx_type):
+    """ Lança uma transação no saldo da conta. """
+    apply_deltas({account_id: delta_for(amount, tx_type)})
+
+
+def reverse(account_id, amount, tx_type):
+    """ Desfaz o lançamento de uma transação no saldo da conta. """
+    apply_deltas({account_id: -delta_for(amount, tx_type)})
+
+
+def repost(old_account_id, old_amount, old_type, new_account_id, new_amount, new_type):
+    """
+    Troca o lançamento antigo pelo novo. Se a conta não mudou, faz um único
+    UPDATE com a diferença; se mudou, atualiza as duas contas.
+    """
+    deltas = {}
+    deltas[old_account_id] = -delta_for(old_amount, old_type)
+    deltas[new_account_id] = deltas.get(new_account_id, Decimal('0.00')) + delta_for(new_amount, new_type)
+    apply_deltas(deltas)
+
+
+# --- CONCILIAÇÃO ---
+# Gravações que não disparam sinais (QuerySet.update, SQL direto, bulk_create
+# sem post_bulk_create) deixam o saldo errado sem aviso. O saldo esperado de
+# uma conta é o saldo inicial mais a soma das suas transações.
+
+def find_drift(user_ids):
+    """
+    Compara saldo gravado e esperado das contas dos usuários com uma única
+    consulta agregada. Retorna as contas divergentes:
+    [{'account_id', 'user_id', 'name', 'balance', 'expected', 'drift'}].
+    """
+    signed = Case(
+        When(transaction__type='income', then=F('transaction__amount')),
+        When(transaction__type='expense', then=-F('transaction__amount')),
+        default=Decimal('0.00'), output_field=DecimalField(),
+    )
+    # Saldo e soma saem do mesmo SELECT (mesmo instantâneo do banco): uma
+    # gravação concorrente entra nos dois ou em nenhum.
+    rows = (
+        Account.objects.filter(user_id__in=user_ids)
+        .values('pk', 'user_id', 'name', 'balance', 'opening_balance')
+        .annotate(total=Coalesce(Sum(signed), Decimal('0.00'), output_field=DecimalField()))
+        .order_by()
+    )
+    drifts = []
+    for row in rows:
+        expected = row['opening_balance'] + row['total']
+        if expected != row['balance']:
+            drifts.append({
+                'account_id': row['pk'],
+                'user_id': row['user_id'],
+                'name': row['name'],
+                'balance': row['balance'],
+                'expected': expected,
+                'drift': expected - row['balance'],
+            })
+    return drifts
+
+
+def fix_drift(drifts):
+    """
+    Corrige as divergências somando a diferença ao saldo (F('balance') + drift)
+    em vez de gravar o valor esperado: o que foi lançado depois da consulta
+    de find_drift() continua contado. Cada usuário afetado recebe uma revisão
+    nova, gravada nas contas corrigidas, para que a correção chegue aos
+    clientes que já sincronizaram, e tem o dashboard em cache descartado.
+    """
+    with db_transaction.atomic():
+        for user_id in sorted({row['user_id'] for row in drifts}):
+            UserRevision.reserve(user_id)
+            dashboard_cache.invalidate_on_commit(user_id)
+        apply_deltas({row['account_id']: row['drift'] for row in drifts})
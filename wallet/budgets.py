@@ -0,0 +1,205 @@
+from django.db import IntegrityError, models, transaction as db_transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.dispatch import Signal
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+import datetime
+import threading
+from .models import Budget, BudgetUsage, Transaction
+
+# --- ORÇAMENTOS POR CATEGORIA ---
+# O gasto do mês de cada orçamento fica em um contador (BudgetUsage), somado
+# pelos sinais a cada despesa gravada, editada ou apagada. Ler o status de um
+# orçamento é buscar uma linha, sem agregar as transações.
+# Só as categorias com orçamento têm contador. A linha de um mês é criada na
+# primeira despesa dele, somando as transações já gravadas (que incluem a
+# despesa atual); a partir daí só recebe os deltas.
+# Quando uma gravação faz o gasto passar do percentual de aviso ou do limite,
+# o sinal 'threshold_crossed' é enviado depois do COMMIT.
+
+_ZERO = Decimal('0.00')
+_date_field = models.DateField()
+_pending = threading.local()
+
+# Argumentos: budget, month, spent, percent (o percentual do limite cruzado)
+threshold_crossed = Signal()
+
+
+def month_start(value):
+    return _date_field.to_python(value).replace(day=1)
+
+
+@contextmanager
+def deferred():
+    """
+    Acumula os deltas e aplica tudo ao sair, com uma leitura por lote.
+    Use dentro de um transaction.atomic().
+    """
+    if getattr(_pending, 'entries', None) is not None:
+        yield
+        return
+
+    _pending.entries = defaultdict(Decimal)
+    try:
+        yield
+        entries = _pending.entries
+    finally:
+        _pending.entries = None
+    apply(entries)
+
+
+def expense_delta(amount, tx_type):
+    """ Quanto uma transação soma no gasto da categoria. """
+    return Decimal(amount) if tx_type == 'expense' else _ZERO
+
+
+def apply(entries):
+    """
+    Aplica um dict {(category_id, month): delta} aos contadores. Deve rodar
+    dentro de um transaction.atomic(), depois da gravação das transações.
+    """
+    pending = getattr(_pending, 'entries', None)
+    if pending is not None:
+        for key, delta in entries.items():
+            pending[key] += delta
+        return
+
+    entries = {
+        (category_id, month_start(month)): delta
+        for (category_id, month), delta in entries.items() if delta
+    }
+    if not entries:
+        return
+    budgets = {
+        budget.category_id: budget
+        for budget in Budget.objects.filter(category_id__in={key[0] for key in entries})
+    }
+    if not budgets:
+        # Caminho comum: nenhuma das categorias tem orçamento
+        return
+
+    entries = {key: delta for key, delta in entries.items() if key[0] in budgets}
+    existing = {
+        (row.budget_id, row.month): row
+        for row in BudgetUsage.objects.select_for_update().filter(
+            budget__in=[budgets[key[0]] for key in entries],
+            month__in={key[1] for key in entries},
+        ).order_by('pk')
+    }
+
+    changes, to_update = [], []
+    for (category_id, month), delta in entries.items():
+        budget = budgets[category_id]
+        row = existing.get((budget.pk, month))
+        if row is not None:
+            changes.append((budget, month, row.spent, row.spent + delta))
+            row.spent += delta
+            to_update.append(row)
+        else:
+            spent = _create_usage(budget, month, delta)
+            changes.append((budget, month, spent - delta, spent))
+    BudgetUsage.objects.bulk_update(to_update, ['spent'])
+
+    for budget, month, before, after in changes:
+        _notify(budget, month, before, after)
+
+
+def _spent_in(category_id, month):
+    """ Soma das despesas da categoria no mês, lida das transações. """
+    next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+    return Transaction.objects.filter(
+        category_id=category_id, type='expense', date__gte=month, date__lt=next_month,
+    ).aggregate(total=Sum('amount'))['total'] or _ZERO
+
+
+def _create_usage(budget, month, delta):
+    """ Cria o contador do mês. Retorna o gasto já com o delta atual. """
+    spent = _spent_in(budget.category_id, month)
+    try:
+        with db_transaction.atomic():
+            BudgetUsage.objects.create(budget=budget, month=month, spent=spent)
+        return spent
+    except IntegrityError:
+        # Outro processo criou o contador antes (sem esta gravação): soma o delta
+        rows = BudgetUsage.objects.filter(budget=budget, month=month)
+        rows.update(spent=F('spent') + delta)
+        return rows.values_list('spent', flat=True).get()
+
+
+def _notify(budget, month, before, after):
+    limit = budget.amount
+    for percent in sorted({budget.alert_percent, 100}):
+        mark = limit * percent / 100
+        if before < mark <= after:
+            db_transaction.on_commit(
+                lambda percent=percent: threshold_crossed.send(
+                    sender=Budget, budget=budget, month=month, spent=after, percent=percent,
+                )
+            )
+
+
+# --- CONSULTAS ---
+
+def with_usage(queryset, month):
+    """ Anota 'spent' (gasto no mês) em um queryset de Budget. """
+    usage = BudgetUsage.objects.filter(budget=OuterRef('pk'), month=month_start(month))
+    return queryset.annotate(
+        spent=Coalesce(Subquery(usage.values('spent')[:1]), Value(_ZERO)),
+    )
+
+
+def status(user, month):
+    """ Orçamentos do usuário com o gasto, o restante e o percentual do mês. """
+    budgets = with_usage(Budget.objects.filter(user=user), month)
+    rows = []
+    for budget in budgets.select_related('category').order_by('category__name'):
+        percent = float(budget.spent / budget.amount * 100)
+        if percent >= 100:
+            state = 'exceeded'
+        elif percent >= budget.alert_percent:
+            state = 'alert'
+        else:
+            state = 'ok'
+        rows.append({
+            'id': budget.pk,
+            'category': budget.category_id,
+            'category_name': budget.category.name,
+            'amount': budget.amount,
+            'spent': budget.spent,
+            'remaining': budget.amount - budget.spent,
+            'percent': round(percent, 1),
+            'status': state,
+        })
+    return rows
+
+
+# --- RECONSTRUÇÃO ---
+
+def rebuild(user_ids=None, budget_ids=None):
+    """
+    Recria os contadores a partir das transações (de todos os orçamentos ou
+    só dos usuários/orçamentos informados). Retorna quantos foram criados.
+    """
+    budgets = Budget.objects.all()
+    if user_ids is not None:
+        budgets = budgets.filter(user_id__in=user_ids)
+    if budget_ids is not None:
+        budgets = budgets.filter(pk__in=budget_ids)
+    budget_of = dict(budgets.values_list('category_id', 'pk'))
+
+    rows = (
+        Transaction.objects.filter(category_id__in=list(budget_of), type='expense')
+        .annotate(month=TruncMonth('date'))
+        .values('category_id', 'month')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    with db_transaction.atomic():
+        BudgetUsage.objects.filter(budget_id__in=list(budget_of.values())).delete()
+        created = BudgetUsage.objects.bulk_create([
+            BudgetUsage(budget_id=budget_of[row['category_id']], month=row['month'], spent=row['total'])
+            for row in rows
+        ])
+    return len(created)
@@ -0,0 +1,107 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+import threading
+import time
+from . import replicas
+
+# --- CACHE DO DASHBOARD ---
+# O dashboard de um usuário só muda quando ele grava uma Transação, Conta ou
+# Categoria. O contexto pronto fica no cache com a chave (usuário, ano, mês,
+# versão). Cada gravação incrementa a versão do usuário, o que invalida de uma
+# vez todos os meses em cache dele, sem precisar apagar chave por chave.
+
+CACHE_ALIAS = getattr(settings, 'WALLET_DASHBOARD_CACHE', 'default')
+TIMEOUT = getattr(settings, 'WALLET_DASHBOARD_CACHE_TIMEOUT', 60 * 60)
+
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    """ Contadores deste processo: {'hits', 'misses', 'invalidations'}. """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _version_key(user_id):
+    return f'wallet:dashboard:version:{user_id}'
+
+
+def get_version(user_id):
+    cache = _cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Se a versão sumiu do cache (expirou/foi descartada), começa de um valor
+        # novo para não reaproveitar um contexto antigo gravado com "versão 1".
+        cache.add(_version_key(user_id), time.time_ns(), None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def invalidate(user_id):
+    """ Descarta todo o dashboard em cache de um usuário. """
+    cache = _cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        # A versão ainda não existia: nada em cache para este usuário
+        cache.add(_version_key(user_id), time.time_ns(), None)
+    _count('invalidations')
+    # Os próximos relatórios do usuário leem do primário, não da réplica
+    replicas.pin(user_id)
+
+
+def invalidate_on_commit(user_id):
+    """
+    Invalida só depois do COMMIT. Se fosse antes, outra requisição poderia
+    recalcular o dashboard com os dados antigos e guardá-lo na versão nova.
+    """
+    db_transaction.on_commit(lambda: invalidate(user_id))
+
+
+def _dashboard_key(user_id, year, month, name):
+    return f'wallet:{name}:{user_id}:{year}:{month}:{get_version(user_id)}'
+
+
+def get_dashboard(user_id, year, month, build, name='dashboard'):
+    """
+    Retorna o contexto do dashboard do cache, ou chama build() e guarda o resultado.
+    'name' separa formatos diferentes do mesmo dashboard (HTML, API).
+    """
+    cache = _cache()
+    key = _dashboard_key(user_id, year, month, name)
+    payload = cache.get(key)
+    if payload is not None:
+        _count('hits')
+        return payload
+
+    _count('misses')
+    payload = build()
+    cache.set(key, payload, TIMEOUT)
+    return payload
+
+
+async def aget_dashboard(user_id, year, month, build, name='dashboard'):
+    """ Versão async de get_dashboard(): 'build' é uma corrotina. """
+    cache = _cache()
+    key = await sync_to_async(_dashboard_key)(user_id, year, month, name)
+    payload = await cache.aget(key)
+    if payload is not None:
+        _count('hits')
+        return payload
+
+    _count('misses')
+    payload = await build()
+    await cache.aset(key, payload, TIMEOUT)
+    return payload
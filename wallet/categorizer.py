@@ -0,0 +1,270 @@
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+from collections import defaultdict
+from contextlib import contextmanager
+import math
+import re
+import threading
+import unicodedata
+from .models import Category, CategoryRule, Transaction
+from . import cache as dashboard_cache
+
+# --- CATEGORIZAÇÃO AUTOMÁTICA ---
+# Duas etapas, nesta ordem:
+# 1. Regras do usuário (CategoryRule): todas as palavras-chave viram uma única
+#    expressão regular, testada uma vez por descrição.
+# 2. Naive Bayes multinomial sobre as palavras da descrição, a forma de
+#    pagamento e a faixa de valor, aprendido com o histórico do usuário.
+# O modelo (só contagens, sem objetos do ORM) fica no cache por usuário. Ele
+# é montado do banco na primeira sugestão e depois atualizado aos poucos pelos
+# sinais: cada transação criada, corrigida ou apagada soma ou subtrai as suas
+# contagens, sem treinar tudo de novo. Se o cache perder o modelo, a próxima
+# sugestão o monta outra vez; o TIMEOUT limita desvios de gravações
+# simultâneas de processos diferentes.
+
+TIMEOUT = 24 * 60 * 60
+# Transações mais recentes usadas para montar o modelo do zero
+TRAINING_LIMIT = 50_000
+# Confiança mínima do modelo para atribuir a categoria sem perguntar
+AUTO_ASSIGN_CONFIDENCE = 0.6
+# Suavização de Laplace
+ALPHA = 1.0
+
+_WORD = re.compile(r'[a-z]{2,}')
+_pending = threading.local()
+
+
+def normalize(text):
+    """ Minúsculas e sem acentos ('Farmácia' -> 'farmacia'). """
+    text = unicodedata.normalize('NFKD', text or '')
+    return text.encode('ascii', 'ignore').decode().lower()
+
+
+def features(description, payment_method=None, amount=None):
+    """
+    Tokens de uma transação: as palavras da descrição (sem números, que
+    costumam ser datas ou códigos), a forma de pagamento e a ordem de
+    grandeza do valor (sem sinal: um estorno cai na faixa da compra).
+    """
+    tokens = _WORD.findall(normalize(description))
+    if payment_method:
+        tokens.append('pm:' + normalize(payment_method).strip())
+    if amount:
+        magnitude = abs(float(amount))
+        if math.isfinite(magnitude):
+            tokens.append(f'amt:{int(math.log2(magnitude + 1))}')
+    return tokens
+
+
+def _cache():
+    return caches[dashboard_cache.CACHE_ALIAS]
+
+
+def _key(user_id):
+    return f'wallet:categorizer:{user_id}'
+
+
+def _empty_model():
+    # categories: {id: [nº de transações, nº de tokens]}; tokens: {token: {id: contagem}}
+    return {'categories': {}, 'types': {}, 'tokens': {}}
+
+
+def _learn(model, tokens, category_id, tx_type, sign=1):
+    stats = model['categories'].setdefault(category_id, [0, 0])
+    stats[0] += sign
+    stats[1] += sign * len(tokens)
+    model['types'][category_id] = tx_type
+    for token in tokens:
+        counts = model['tokens'].setdefault(token, {})
+        counts[category_id] = counts.get(category_id, 0) + sign
+        if counts[category_id] <= 0:
+            del counts[category_id]
+            if not counts:
+                del model['tokens'][token]
+    if stats[0] <= 0:
+        del model['categories'][category_id]
+
+
+def build_model(user_id):
+    """ Monta o modelo a partir das transações mais recentes do usuário. """
+    model = _empty_model()
+    rows = (
+        Transaction.objects.filter(user_id=user_id)
+        .order_by('-date', '-id')
+        .values_list('category_id', 'type', 'description', 'payment_method', 'amount')
+        [:TRAINING_LIMIT]
+    )
+    for category_id, tx_type, description, payment_method, amount in rows.iterator(chunk_size=5000):
+        _learn(model, features(description, payment_method, amount), category_id, tx_type)
+    return model
+
+
+def get_model(user_id):
+    model = _cache().get(_key(user_id))
+    if model is None:
+        model = build_model(user_id)
+        _cache().set(_key(user_id), model, TIMEOUT)
+    return model
+
+
+@contextmanager
+def deferred():
+    """
+    Dentro deste bloco as observações são acumuladas e aplicadas juntas no
+    COMMIT (um get_many e um set_many no cache), em vez de um get/set por
+    gravação. Use dentro de um transaction.atomic().
+    """
+    if getattr(_pending, 'changes', None) is not None:
+        yield
+        return
+
+    _pending.changes = defaultdict(list)
+    try:
+        yield
+        changes = _pending.changes
+    finally:
+        _pending.changes = None
+    _observe_many(changes)
+
+
+def observe(user_id, added=(), removed=()):
+    """
+    Atualiza o modelo em cache com transações novas ('added') e antigas
+    ('removed'), cada uma uma tupla (tokens, category_id, type). Roda depois
+    do COMMIT; sem modelo em cache não há nada a fazer (o próximo uso o
+    monta do banco, já com estas mudanças).
+    """
+    if not (added or removed):
+        return
+    pending = getattr(_pending, 'changes', None)
+    if pending is not None:
+        pending[user_id].append((list(added), list(removed)))
+        return
+    _observe_many({user_id: [(list(added), list(removed))]})
+
+
+def _observe_many(changes):
+    """ 'changes' é um dict {user_id: [(added, removed)]}, na ordem das gravações. """
+    def update():
+        keys = {user_id: _key(user_id) for user_id in changes}
+        models = _cache().get_many(list(keys.values()))
+        updated = {}
+        for user_id, user_changes in changes.items():
+            model = models.get(keys[user_id])
+            if model is None:
+                continue
+            for added, removed in user_changes:
+                for tokens, category_id, tx_type in removed:
+                    if category_id in model['categories']:
+                        _learn(model, tokens, category_id, tx_type, sign=-1)
+                for tokens, category_id, tx_type in added:
+                    _learn(model, tokens, category_id, tx_type)
+            updated[keys[user_id]] = model
+        if updated:
+            _cache().set_many(updated, TIMEOUT)
+
+    if changes:
+        db_transaction.on_commit(update)
+
+
+def forget(user_id):
+    """ Descarta o modelo em cache (ex.: após cargas diretas no banco). """
+    _cache().delete(_key(user_id))
+
+
+class Categorizer:
+    """
+    Sugere categorias para muitas transações de um usuário. Carrega as
+    regras e o modelo uma vez; cada sugestão só consulta dicionários.
+    """
+    def __init__(self, user):
+        self.user = user
+        self.names = dict(Category.objects.filter(user=user).values_list('pk', 'name'))
+        self._compile_rules()
+        self._compile_model(get_model(user.pk))
+
+    def _compile_rules(self):
+        self.rules = {}
+        rules = CategoryRule.objects.filter(user=self.user).values_list('pattern', 'category_id', 'category__type')
+        for pattern, category_id, tx_type in rules:
+            pattern = normalize(pattern).strip()
+            if pattern:
+                self.rules[pattern] = (category_id, tx_type)
+        # As palavras-chave mais longas primeiro: 'uber eats' antes de 'uber'
+        patterns = sorted(self.rules, key=len, reverse=True)
+        self.rule_regex = re.compile('|'.join(map(re.escape, patterns))) if patterns else None
+
+    def _compile_model(self, model):
+        """ Pré-calcula os logaritmos: a sugestão só soma números. """
+        categories = {c: stats for c, stats in model['categories'].items() if c in self.names}
+        vocabulary = len(model['tokens']) or 1
+        documents = sum(stats[0] for stats in categories.values()) or 1
+        self.by_type = defaultdict(list)
+        self.prior = {}
+        self.unseen = {}
+        for category_id, (count, total) in categories.items():
+            self.by_type[model['types'][category_id]].append(category_id)
+            self.prior[category_id] = math.log(count / documents)
+            self.unseen[category_id] = math.log(ALPHA / (total + ALPHA * vocabulary))
+        # Para cada token, quanto cada categoria ganha em relação a um token nunca visto nela
+        self.bonus = {
+            token: {
+                c: math.log((n + ALPHA) / ALPHA) for c, n in counts.items() if c in self.prior
+            }
+            for token, counts in model['tokens'].items()
+        }
+
+    def suggest(self, description, payment_method=None, amount=None, tx_type='expense'):
+        """
+        Retorna (category_id, confiança, origem) ou (None, 0.0, None).
+        Origem: 'rule' (confiança 1.0) ou 'model'.
+        """
+        if self.rule_regex is not None:
+            match = self.rule_regex.search(normalize(description))
+            if match:
+                category_id, rule_type = self.rules[match.group(0)]
+                if rule_type == tx_type:
+                    return category_id, 1.0, 'rule'
+
+        candidates = self.by_type.get(tx_type)
+        if not candidates:
+            return None, 0.0, None
+        tokens = [t for t in features(description, payment_method, amount) if t in self.bonus]
+        if not any(':' not in token for token in tokens):
+            # Sem nenhuma palavra conhecida na descrição, forma de pagamento e
+            # valor sozinhos não bastam para sugerir
+            return None, 0.0, None
+        scores = {c: self.prior[c] + len(tokens) * self.unseen[c] for c in candidates}
+        for token in tokens:
+            for category_id, bonus in self.bonus[token].items():
+                if category_id in scores:
+                    scores[category_id] += bonus
+        best = max(scores, key=scores.get)
+        # Probabilidade (softmax) da melhor categoria
+        top = scores[best]
+        confidence = 1.0 / sum(math.exp(score - top) for score in scores.values())
+        return best, confidence, 'model'
+
+    def suggest_many(self, rows):
+        """
+        Sugestões para vários dicts (description, payment_method, amount, type).
+        Retorna uma lista de dicts, na mesma ordem.
+        """
+        results = []
+        for row in rows:
+            category_id, confidence, source = self.suggest(
+                row.get('description'), row.get('payment_method'),
+                row.get('amount'), row.get('type') or 'expense',
+            )
+            results.append({
+                'category': category_id,
+                'category_name': self.names.get(category_id),
+                'confidence': round(confidence, 3),
+                'source': source,
+            })
+        return results
+
+    def assign(self, description, payment_method=None, amount=None, tx_type='expense'):
+        """ Categoria para gravar sem perguntar, ou None se a confiança for baixa. """
+        category_id, confidence, _ = self.suggest(description, payment_method, amount, tx_type)
+        return category_id if confidence >= AUTO_ASSIGN_CONFIDENCE else None
@@ -0,0 +1,87 @@
+from django.db.models import Q
+from collections import defaultdict
+import datetime
+from .models import Transaction
+
+# --- DETECÇÃO DE DUPLICATAS ---
+# Cada transação guarda uma impressão digital (models.transaction_fingerprint:
+# conta, data, tipo, valor e descrição normalizada), indexada com o usuário.
+# Antes de gravar um lote, uma única consulta traz as transações já gravadas
+# que podem colidir com ele:
+# - duplicatas exatas (mesma impressão): não são gravadas de novo. Uma
+#   impressão repetida N vezes no banco absorve até N linhas do lote, então
+#   duas compras iguais no mesmo dia continuam sendo duas;
+# - quase duplicatas (mesma conta, tipo e valor, até WINDOW_DAYS dias de distância,
+#   descrição diferente): são gravadas, mas marcadas em possible_duplicate
+#   para o usuário revisar.
+
+WINDOW_DAYS = 3
+
+
+class DuplicateScreen:
+    """
+    Separa os lotes de transações (ainda não salvas) de um usuário em novas e
+    duplicatas. Guarda o que já foi gravado pela mesma importação, para que
+    as linhas do próprio arquivo não sejam tomadas por duplicatas umas das
+    outras entre um lote e o seguinte.
+    """
+    def __init__(self, user, window=WINDOW_DAYS):
+        self.user = user
+        self.window = datetime.timedelta(days=window)
+        self.recorded_ids = set()
+
+    def _candidates(self, transactions):
+        """ Transações gravadas que colidem (exata ou aproximadamente) com o lote. """
+        dates = [tx.date for tx in transactions]
+        near = Q(
+            account_id__in={tx.account_id for tx in transactions},
+            type__in={tx.type for tx in transactions},
+            amount__in={tx.amount for tx in transactions},
+            date__gte=min(dates) - self.window,
+            date__lte=max(dates) + self.window,
+        )
+        return (
+            Transaction.objects.filter(user=self.user)
+            .filter(Q(fingerprint__in={tx.fingerprint for tx in transactions}) | near)
+            .order_by('pk')
+            .values_list('pk', 'fingerprint', 'account_id', 'type', 'amount', 'date')
+        )
+
+    def split(self, transactions):
+        """
+        Retorna (novas, duplicatas). 'duplicatas' é uma lista de pares
+        (transação, ID da já gravada). As novas parecidas com alguma gravada
+        saem com possible_duplicate_id preenchido.
+        """
+        for tx in transactions:
+            tx.date = Transaction._meta.get_field('date').to_python(tx.date)
+            tx.fingerprint = tx.compute_fingerprint()
+        if not transactions:
+            return [], []
+
+        exact = defaultdict(list)
+        near = defaultdict(list)
+        for pk, fingerprint, account_id, tx_type, amount, date in self._candidates(transactions):
+            if pk in self.recorded_ids:
+                continue
+            exact[fingerprint].append(pk)
+            near[(account_id, tx_type, amount)].append((date, pk))
+
+        fresh, duplicates = [], []
+        for tx in transactions:
+            matches = exact.get(tx.fingerprint)
+            if matches:
+                duplicates.append((tx, matches.pop(0)))
+                continue
+            close = [
+                (abs(date - tx.date), pk)
+                for date, pk in near.get((tx.account_id, tx.type, tx.amount), ())
+                if abs(date - tx.date) <= self.window
+            ]
+            tx.possible_duplicate_id = min(close)[1] if close else None
+            fresh.append(tx)
+        return fresh, duplicates
+
+    def record(self, transactions):
+        """ Anota as transações gravadas (com pk) depois de um split(). """
+        self.recorded_ids.update(tx.pk for tx in transactions)
@@ -0,0 +1,140 @@
+from decimal import Decimal
+import csv
+from .models import Transaction
+
+# --- EXPORTAÇÃO DE TRANSAÇÕES (CSV / PARQUET / XLSX) ---
+# As linhas saem do banco com values_list() + iterator(chunk_size): nenhum
+# objeto de modelo é criado e o histórico nunca fica inteiro em memória.
+# O CSV é gerado enquanto é enviado (StreamingHttpResponse). Parquet e XLSX
+# precisam de um arquivo completo (o índice fica no fim), então são escritos
+# lote a lote em um arquivo temporário e enviados depois.
+# Os nomes das colunas são os mesmos aceitos pela importação (importers.py).
+
+COLUMNS = ('id', 'date', 'type', 'amount', 'description', 'category', 'account', 'payment_method', 'note')
+_FIELDS = ('id', 'date', 'type', 'amount', 'description', 'category__name', 'account__name', 'payment_method', 'note')
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+class ExportFormatError(ValueError):
+    """ Formato desconhecido ou sem a biblioteca opcional instalada. """
+
+
+def export_queryset(user, start=None, end=None, account=None, category=None):
+    """ Transações do usuário com os filtros opcionais (end é exclusivo). """
+    qs = Transaction.objects.filter(user=user)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lt=end)
+    if account:
+        qs = qs.filter(account=account)
+    if category:
+        qs = qs.filter(category=category)
+    # A ordem (date, id) usa o índice (user, date, id)
+    return qs.order_by('date', 'id')
+
+
+def iter_chunks(queryset, chunk_size=2000):
+    """ Gera listas de até chunk_size tuplas, na ordem de COLUMNS. """
+    chunk = []
+    for row in queryset.values_list(*_FIELDS).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Echo:
+    """ "Arquivo" cujo write() só devolve o texto, para o csv.writer. """
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, chunk_size=2000):
+    """ Gera o CSV em pedaços de texto (um por lote de linhas). """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for chunk in iter_chunks(queryset, chunk_size):
+        yield ''.join(writer.writerow(row) for row in chunk)
+
+
+def write_csv(queryset, fileobj, chunk_size=2000):
+    """ Escreve o CSV em um arquivo de texto. Retorna o número de linhas. """
+    count = 0
+    writer = csv.writer(fileobj)
+    writer.writerow(COLUMNS)
+    for chunk in iter_chunks(queryset, chunk_size):
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def write_parquet(queryset, fileobj, chunk_size=50_000):
+    """
+    Escreve um arquivo Parquet (colunar) com um row group por lote.
+    Retorna o número de linhas. Requer pyarrow.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportFormatError('A exportação em Parquet requer o pacote pyarrow.')
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('date', pa.date32()),
+        ('type', pa.string()),
+        ('amount', pa.decimal128(12, 2)),
+        ('description', pa.string()),
+        ('category', pa.string()),
+        ('account', pa.string()),
+        ('payment_method', pa.string()),
+        ('note', pa.string()),
+    ])
+    count = 0
+    with pq.ParquetWriter(fileobj, schema, compression='snappy') as writer:
+        for chunk in iter_chunks(queryset, chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            count += len(chunk)
+    return count
+
+
+def write_xlsx(queryset, fileobj, chunk_size=2000):
+    """
+    Escreve uma planilha XLSX no modo write_only do openpyxl (as linhas vão
+    direto para o arquivo). Retorna o número de linhas. Requer openpyxl.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportFormatError('A exportação em XLSX requer o pacote openpyxl.')
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Transações')
+    sheet.append(COLUMNS)
+    count = 0
+    for chunk in iter_chunks(queryset, chunk_size):
+        for row in chunk:
+            # Valores monetários como número, não texto
+            sheet.append([float(value) if isinstance(value, Decimal) else value for value in row])
+        count += len(chunk)
+    workbook.save(fileobj)
+    return count
+
+
+WRITERS = {
+    'csv': write_csv,
+    'parquet': write_parquet,
+    'xlsx': write_xlsx,
+}
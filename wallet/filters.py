@@ -0,0 +1,158 @@
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+from decimal import Decimal, InvalidOperation
+from .models import Account, Category, MonthlyRollup, Transaction
+from .reports import parse_date
+
+# --- FILTROS E FACETAS DE TRANSAÇÕES ---
+# Os filtros (conta, categoria, tipo, faixa de valor e de datas) vêm da query
+# string e são os mesmos na lista HTML e na API. As facetas (quantidade,
+# receita e despesa por conta, por categoria, por tipo e no total) saem de
+# uma única consulta com GROUPING SETS sobre o conjunto já filtrado; quando
+# os filtros permitem, sobre os resumos mensais em vez das transações.
+
+def _ids(params, name):
+    values = [value for value in params.getlist(name) if value]
+    if not all(value.isdigit() for value in values):
+        raise ValidationError({name: 'Informe IDs numéricos.'})
+    return [int(value) for value in values]
+
+
+def _amount(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: 'Informe um valor numérico.'})
+
+
+def parse(params):
+    """
+    Lê os filtros da query string. 'account' e 'category' podem se repetir;
+    'end' é exclusivo. Retorna um dict só com os filtros informados.
+    """
+    filters = {
+        'account': _ids(params, 'account'),
+        'category': _ids(params, 'category'),
+        'type': params.get('type'),
+        'min_amount': _amount(params, 'min_amount'),
+        'max_amount': _amount(params, 'max_amount'),
+        'start': parse_date(params, 'start', None),
+        'end': parse_date(params, 'end', None),
+    }
+    if filters['type'] and filters['type'] not in dict(Transaction.TYPE_CHOICES):
+        raise ValidationError({'type': "Use 'income' ou 'expense'."})
+    if filters['start'] and filters['end'] and filters['start'] >= filters['end']:
+        raise ValidationError({'end': "'end' deve ser depois de 'start'."})
+    return {name: value for name, value in filters.items() if value not in (None, '', [])}
+
+
+def apply(queryset, filters):
+    """ Aplica os filtros de parse() ao queryset de transações. """
+    lookups = {
+        'account': 'account_id__in',
+        'category': 'category_id__in',
+        'type': 'type',
+        'min_amount': 'amount__gte',
+        'max_amount': 'amount__lte',
+        'start': 'date__gte',
+        'end': 'date__lt',
+    }
+    return queryset.filter(**{lookups[name]: value for name, value in filters.items()})
+
+
+def _empty():
+    return {
+        'total': {'count': 0, 'income': 0.0, 'expense': 0.0, 'net': 0.0},
+        'accounts': [],
+        'categories': [],
+        'types': [],
+    }
+
+
+def _uses_rollup(filters):
+    """
+    Sem faixa de valor e com datas no dia 1, as facetas podem ser somadas da
+    tabela MonthlyRollup (uma linha por conta/categoria/mês/tipo), sem ler
+    as transações.
+    """
+    if 'min_amount' in filters or 'max_amount' in filters:
+        return False
+    return all(filters[name].day == 1 for name in ('start', 'end') if name in filters)
+
+
+def facets_for(user, filters):
+    """ Facetas das transações do usuário com os filtros de parse(). """
+    if not _uses_rollup(filters):
+        return facets(apply(Transaction.objects.filter(user=user), filters))
+    rollups = apply(
+        MonthlyRollup.objects.filter(user=user),
+        {name: value for name, value in filters.items() if name not in ('start', 'end')},
+    )
+    if 'start' in filters:
+        rollups = rollups.filter(month__gte=filters['start'])
+    if 'end' in filters:
+        rollups = rollups.filter(month__lt=filters['end'])
+    return _grouped(rollups.values('account_id', 'category_id', 'type', 'count', amount=F('total')), 'SUM(count)')
+
+
+def facets(queryset):
+    """
+    Quantidade, receita e despesa do queryset de transações (já filtrado)
+    por conta, por categoria, por tipo e no total, em uma única consulta.
+    """
+    return _grouped(queryset.values('account_id', 'category_id', 'type', 'amount'), 'COUNT(*)')
+
+
+def _grouped(rows, count_sql):
+    """
+    Agrega 'rows' (account_id, category_id, type, amount) com GROUPING SETS.
+    Os nomes das contas e categorias são juntados só às linhas já agregadas,
+    para que a leitura das transações não dependa de JOINs.
+    """
+    try:
+        inner, params = rows.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return _empty()
+
+    with connection.cursor() as cursor:
+        # GROUPING(...) diz a qual conjunto a linha pertence: o bit de cada
+        # coluna fica ligado quando ela NÃO faz parte do agrupamento.
+        cursor.execute(
+            f"""
+            SELECT g.level, g.account_id, a.name, g.category_id, c.name, g.type,
+                   g.count, g.income, g.expense
+            FROM (
+                SELECT GROUPING(account_id, category_id, type) AS level,
+                       account_id, category_id, type,
+                       {count_sql} AS count,
+                       COALESCE(SUM(amount) FILTER (WHERE type = 'income'), 0) AS income,
+                       COALESCE(SUM(amount) FILTER (WHERE type = 'expense'), 0) AS expense
+                FROM ({inner}) AS filtered
+                GROUP BY GROUPING SETS ((account_id), (category_id), (type), ())
+            ) AS g
+            LEFT JOIN {Account._meta.db_table} AS a ON a.id = g.account_id
+            LEFT JOIN {Category._meta.db_table} AS c ON c.id = g.category_id
+            """,
+            params,
+        )
+        result = cursor.fetchall()
+
+    data = _empty()
+    for level, account_id, account_name, category_id, category_name, tx_type, count, income, expense in result:
+        totals = {'count': int(count or 0), 'income': float(income), 'expense': float(expense)}
+        if level == 0b011:
+            data['accounts'].append({'id': account_id, 'name': account_name, **totals})
+        elif level == 0b101:
+            data['categories'].append({'id': category_id, 'name': category_name, **totals})
+        elif level == 0b110:
+            data['types'].append({'type': tx_type, **totals})
+        else:
+            data['total'] = {**totals, 'net': float(income - expense)}
+    for name in ('accounts', 'categories', 'types'):
+        data[name].sort(key=lambda row: (-row['count'], str(row.get('name', row.get('type')))))
+    return data
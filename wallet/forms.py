@@ -2,6 +2,28 @@ from django import forms
 from .models import Transaction, Category, Account
 from django.utils import timezone # Importar timezone
 from django.forms.widgets import NumberInput
+from .categorizer import Categorizer
+
+
+def _suggest_category(form, tx_type):
+    """
+    Categoria sugerida pelo categorizador quando o usuário deixa o campo em
+    branco. Sem sugestão confiável, pede que ele escolha.
+    """
+    data = form.cleaned_data
+    if data.get('category') or form.user is None or 'category' in form.errors:
+        return
+    category_id = Categorizer(form.user).assign(
+        data.get('description'), data.get('payment_method'), data.get('amount'), tx_type,
+    )
+    # O modelo pode sugerir uma categoria apagada (ou de outro tipo) desde o último treino
+    category = None
+    if category_id is not None:
+        category = form.fields['category'].queryset.filter(pk=category_id).first()
+    if category is None:
+        form.add_error('category', 'Não foi possível sugerir uma categoria. Escolha uma.')
+    else:
+        data['category'] = category
 
 class ExpenseForm(forms.ModelForm):
     """
@@ -10,6 +32,7 @@ class ExpenseForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         # Pega o 'user' passado pela View
         user = kwargs.pop('user', None) 
+        self.user = user
         
         super().__init__(*args, **kwargs)
         
@@ -21,6 +44,10 @@ class ExpenseForm(forms.ModelForm):
             )
             self.fields['account'].queryset = Account.objects.filter(user=user)
         
+        # Em branco, a categoria é sugerida pelo histórico e pelas regras do usuário
+        self.fields['category'].required = False
+        self.fields['category'].empty_label = 'Sugerir automaticamente'
+
         # Define o valor inicial da data para hoje
         self.fields['date'].initial = timezone.now().date()
 
@@ -35,6 +62,11 @@ class ExpenseForm(forms.ModelForm):
             if field_name in self.fields:
                 self.fields[field_name].widget.attrs.update({'class': 'form-control'})
 
+    def clean(self):
+        cleaned_data = super().clean()
+        _suggest_category(self, 'expense')
+        return cleaned_data
+
     def save(self, commit=True):
         # Define o 'type' automaticamente antes de salvar
         instance = super().save(commit=False)
@@ -67,6 +99,7 @@ class IncomeForm(forms.ModelForm):
     """
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
+        self.user = user
         super().__init__(*args, **kwargs)
         
         # Filtra o campo 'category' para mostrar APENAS categorias de 'income'
@@ -76,6 +109,10 @@ class IncomeForm(forms.ModelForm):
             )
             self.fields['account'].queryset = Account.objects.filter(user=user)
         
+        # Em branco, a categoria é sugerida pelo histórico e pelas regras do usuário
+        self.fields['category'].required = False
+        self.fields['category'].empty_label = 'Sugerir automaticamente'
+
         # Define o valor inicial da data para hoje
         self.fields['date'].initial = timezone.now().date()
 
@@ -90,6 +127,11 @@ class IncomeForm(forms.ModelForm):
             if field_name in self.fields:
                 self.fields[field_name].widget.attrs.update({'class': 'form-control'})
 
+    def clean(self):
+        cleaned_data = super().clean()
+        _suggest_category(self, 'income')
+        return cleaned_data
+
     def save(self, commit=True):
         instance = super().save(commit=False)
         instance.type = 'income' # Força o tipo
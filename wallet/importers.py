@@ -0,0 +1,301 @@
+from django.db import transaction as db_transaction
+from decimal import Decimal, InvalidOperation
+import csv
+import datetime
+import io
+import re
+from .models import Transaction, Account, Category
+from .signals import post_bulk_create
+from .categorizer import Categorizer
+from .dedup import DuplicateScreen
+
+# --- IMPORTAÇÃO DE EXTRATOS (CSV / OFX) ---
+# Os arquivos são lidos linha a linha (geradores), as categorias e contas são
+# resolvidas por dicionários em memória e as transações são gravadas com
+# bulk_create em lotes. O saldo de cada conta é ajustado uma vez por lote.
+
+
+class StatementFormatError(ValueError):
+    """ Linha ou arquivo que não pôde ser interpretado. """
+
+
+# Nomes de coluna aceitos no CSV (em português ou inglês)
+CSV_COLUMNS = {
+    'date': ('date', 'data'),
+    'amount': ('amount', 'valor'),
+    'type': ('type', 'tipo'),
+    'description': ('description', 'descricao', 'descrição', 'historico', 'histórico'),
+    'category': ('category', 'categoria'),
+    'account': ('account', 'conta'),
+    'payment_method': ('payment_method', 'forma_pagamento', 'pagamento'),
+    'note': ('note', 'observacao', 'observação', 'nota'),
+}
+
+TYPE_ALIASES = {
+    'income': 'income', 'receita': 'income', 'credit': 'income', 'credito': 'income', 'crédito': 'income',
+    'expense': 'expense', 'despesa': 'expense', 'debit': 'expense', 'debito': 'expense', 'débito': 'expense',
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y', '%Y%m%d')
+
+
+def parse_date(value):
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise StatementFormatError(f"Data inválida: '{value}'")
+
+
+# Parte inteira com separador de milhares em grupos de 3 dígitos ('1.234.567')
+_GROUPED = {
+    sep: re.compile(rf'^[-+]?\d{{1,3}}(?:{re.escape(sep)}\d{{3}})+$') for sep in '.,'
+}
+
+
+def parse_amount(value):
+    """
+    Aceita '1234.56', '-1234.56', o formato brasileiro '1.234,56' e o
+    americano '1,234.56': o último separador é o decimal e o outro, o de
+    milhares. Um separador repetido ('1.234.567') só pode ser o de milhares.
+    Milhares fora de grupos de 3 dígitos são ambíguos e recusados.
+    """
+    value = (value or '').strip().replace('R$', '').replace(' ', '')
+    separators = [char for char in value if char in '.,']
+    number = value
+    if separators:
+        decimal = separators[-1]
+        if separators.count(decimal) > 1:
+            integer, fraction, thousands = value, None, decimal
+        else:
+            integer, _, fraction = value.rpartition(decimal)
+            thousands = ',' if decimal == '.' else '.'
+        if thousands in integer and not _GROUPED[thousands].match(integer):
+            raise StatementFormatError(f"Valor ambíguo: '{value}'")
+        number = integer.replace(thousands, '') + (f'.{fraction}' if fraction is not None else '')
+    try:
+        amount = Decimal(number)
+    except InvalidOperation:
+        raise StatementFormatError(f"Valor inválido: '{value}'")
+    # Transaction.amount tem 12 dígitos, 2 deles decimais
+    if not amount.is_finite() or abs(amount) >= Decimal('1e10'):
+        raise StatementFormatError(f"Valor inválido: '{value}'")
+    return amount.quantize(Decimal('0.01'))
+
+
+def _text_stream(stream, encoding='utf-8'):
+    """ Garante um stream de texto (arquivos enviados chegam em bytes). """
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding, errors='replace', newline='')
+
+
+def parse_csv(stream, encoding='utf-8'):
+    """
+    Gera um dict por linha do CSV. O separador (',' ou ';') é detectado
+    pelo cabeçalho.
+    """
+    text = _text_stream(stream, encoding)
+    header = text.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    names = [name.strip().lower() for name in next(csv.reader([header], delimiter=delimiter))]
+
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    if 'date' not in columns or 'amount' not in columns:
+        raise StatementFormatError("O CSV precisa das colunas 'date' e 'amount'.")
+
+    for line_no, values in enumerate(csv.reader(text, delimiter=delimiter), start=2):
+        if not any(v.strip() for v in values):
+            continue
+        row = {
+            field: values[index].strip() if index < len(values) else ''
+            for field, index in columns.items()
+        }
+        row['line'] = line_no
+        yield row
+
+
+_OFX_TAG = re.compile(r'<(/?)([A-Z0-9.]+)>([^<]*)', re.IGNORECASE)
+
+
+def parse_ofx(stream, encoding='latin-1'):
+    """
+    Gera um dict por <STMTTRN> de um arquivo OFX (SGML ou XML).
+    Não carrega o arquivo inteiro: os blocos são montados linha a linha.
+    """
+    text = _text_stream(stream, encoding)
+    current = None
+    count = 0
+    for line in text:
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if not closing:
+                    current = {}
+                elif current is not None:
+                    count += 1
+                    yield _ofx_row(current, count)
+                    current = None
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+
+def _ofx_row(block, count):
+    amount = block.get('TRNAMT', '')
+    return {
+        'line': count,
+        'date': (block.get('DTPOSTED') or '')[:8],
+        'amount': amount,
+        'type': '',
+        'description': block.get('NAME') or block.get('MEMO') or '',
+        'note': block.get('MEMO', '') if block.get('NAME') else '',
+        'payment_method': block.get('TRNTYPE', '').lower(),
+    }
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'ofx': parse_ofx,
+}
+
+
+def detect_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in PARSERS:
+        return extension
+    raise StatementFormatError(f"Formato de arquivo não suportado: '{filename}'")
+
+
+class TransactionImporter:
+    """
+    Importa linhas já interpretadas (dicts) para um usuário.
+
+    - account: conta usada quando a linha não informa uma (obrigatória para OFX)
+    - default_category: nome da categoria usada quando a linha não informa uma
+      e o categorizador não tem confiança suficiente
+    - categorize: sugere a categoria das linhas sem uma (categorizer.py)
+    - skip_duplicates: não grava as linhas já importadas e marca as parecidas
+      com transações existentes para revisão (dedup.py)
+    """
+    max_errors = 100
+
+    def __init__(self, user, account=None, default_category='Outros', chunk_size=1000, categorize=True,
+                 skip_duplicates=True):
+        self.user = user
+        self.account = account
+        self.default_category = default_category
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.categorized = 0
+        # Linhas já gravadas (ignoradas) e gravadas com marca de possível duplicata
+        self.duplicates = 0
+        self.flagged = 0
+        self.errors = []
+        self.categorizer = Categorizer(user) if categorize else None
+        self.screen = DuplicateScreen(user) if skip_duplicates else None
+
+        # Dicionários em memória: nenhuma consulta por linha
+        self.accounts = {
+            name.lower(): pk
+            for pk, name in Account.objects.filter(user=user).values_list('pk', 'name')
+        }
+        self.categories = {
+            (name.lower(), tx_type): pk
+            for pk, name, tx_type in Category.objects.filter(user=user).values_list('pk', 'name', 'type')
+        }
+
+    def _category_id(self, name, tx_type):
+        name = name or self.default_category
+        key = (name.lower(), tx_type)
+        if key not in self.categories:
+            category, _ = Category.objects.get_or_create(user=self.user, name=name, type=tx_type)
+            self.categories[key] = category.pk
+        return self.categories[key]
+
+    def _account_id(self, name):
+        if not name:
+            if self.account is None:
+                raise StatementFormatError('Conta não informada.')
+            return self.account.pk
+        try:
+            return self.accounts[name.lower()]
+        except KeyError:
+            raise StatementFormatError(f"Conta desconhecida: '{name}'")
+
+    def build(self, row):
+        """ Converte um dict interpretado em um Transaction (sem salvar). """
+        amount = parse_amount(row.get('amount'))
+        tx_type = TYPE_ALIASES.get((row.get('type') or '').strip().lower())
+        if tx_type is None:
+            # Sem coluna de tipo: valores negativos são despesas
+            tx_type = 'expense' if amount < 0 else 'income'
+        amount = abs(amount)
+        if amount < Decimal('0.01'):
+            raise StatementFormatError('Valor deve ser maior que zero.')
+        date = parse_date(row.get('date'))
+        account_id = self._account_id(row.get('account'))
+
+        description = (row.get('description') or '')[:255] or None
+        payment_method = (row.get('payment_method') or '')[:50] or None
+        # A categoria é resolvida por último: ela pode ser criada no banco
+        category_id = None
+        if not row.get('category') and self.categorizer is not None:
+            category_id = self.categorizer.assign(description, payment_method, amount, tx_type)
+            self.categorized += category_id is not None
+        if category_id is None:
+            category_id = self._category_id(row.get('category'), tx_type)
+        return Transaction(
+            user=self.user,
+            account_id=account_id,
+            category_id=category_id,
+            type=tx_type,
+            amount=amount,
+            date=date,
+            description=description,
+            payment_method=payment_method,
+            note=row.get('note') or None,
+        )
+
+    def run(self, rows):
+        """ Consome o gerador 'rows' e grava em lotes. Retorna o nº de transações criadas. """
+        batch = []
+        for row in rows:
+            try:
+                batch.append(self.build(row))
+            except StatementFormatError as exc:
+                if len(self.errors) < self.max_errors:
+                    self.errors.append({'line': row.get('line'), 'error': str(exc)})
+                continue
+            if len(batch) >= self.chunk_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+        return self.created
+
+    def _flush(self, batch):
+        with db_transaction.atomic():
+            if self.screen is not None:
+                # Uma consulta por lote para achar as duplicatas
+                batch, duplicates = self.screen.split(batch)
+                self.duplicates += len(duplicates)
+                self.flagged += sum(tx.possible_duplicate_id is not None for tx in batch)
+            Transaction.objects.bulk_create(batch)
+            post_bulk_create(batch)
+        if self.screen is not None:
+            self.screen.record(batch)
+        self.created += len(batch)
+
+
+def import_file(user, stream, file_format, account=None, **kwargs):
+    """ Atalho: interpreta e importa um arquivo. Retorna o importador. """
+    importer = TransactionImporter(user, account=account, **kwargs)
+    importer.run(PARSERS[file_format](stream))
+    return importer
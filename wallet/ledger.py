@@ -0,0 +1,219 @@
+from django.db import connection, models, transaction as db_transaction
+from django.db.models import Case, DecimalField, F, Sum, When
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+import datetime
+import threading
+from .models import Account, DailyBalance, Transaction
+from .balances import delta_for
+
+# --- LIVRO-RAZÃO DE SALDOS ---
+# DailyBalance guarda, por conta e dia, o delta do dia e a soma acumulada dos
+# deltas. O saldo numa data é o saldo atual menos tudo o que foi lançado
+# depois dela:
+#     saldo(X) = Account.balance - (acumulado_final - acumulado(X))
+# Assim o saldo inicial da conta (informado no cadastro) não precisa estar no
+# livro, e cada consulta é uma busca no índice único (conta, data).
+# Uma transação com data retroativa muda só os dias a partir dela: o
+# acumulado desse "sufixo" é recalculado com um único UPDATE.
+
+_ZERO = Decimal('0.00')
+_date_field = models.DateField()
+_pending = threading.local()
+
+
+@contextmanager
+def deferred():
+    """
+    Acumula os lançamentos e aplica tudo ao sair, recalculando o sufixo de
+    cada conta uma única vez. Use dentro de um transaction.atomic().
+    """
+    if getattr(_pending, 'entries', None) is not None:
+        yield
+        return
+
+    _pending.entries = defaultdict(Decimal)
+    try:
+        yield
+        entries = _pending.entries
+    finally:
+        _pending.entries = None
+    apply(entries)
+
+
+def apply(entries):
+    """
+    Aplica um dict {(account_id, date): delta}. Deve rodar dentro de um
+    transaction.atomic(). As linhas das contas são travadas (em ordem de ID,
+    como no UPDATE de saldo) antes de ler os dias: duas gravações não leem
+    o mesmo delta nem recalculam o mesmo sufixo ao mesmo tempo, mesmo
+    quando o saldo da conta não mudou (ex.: só a data da transação mudou).
+    """
+    pending = getattr(_pending, 'entries', None)
+    if pending is not None:
+        for key, delta in entries.items():
+            pending[key] += delta
+        return
+
+    by_account = defaultdict(lambda: defaultdict(Decimal))
+    for (account_id, day), delta in entries.items():
+        if account_id is not None and delta:
+            by_account[account_id][_date_field.to_python(day)] += delta
+    if not by_account:
+        return
+
+    # Contas que já não existem ficam de fora
+    locked = (
+        Account.objects.select_for_update().filter(pk__in=list(by_account))
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    for account_id in list(locked):
+        deltas = by_account[account_id]
+        existing = DailyBalance.objects.filter(account_id=account_id, date__in=list(deltas))
+        to_update = []
+        for row in existing:
+            row.delta += deltas.pop(row.date)
+            to_update.append(row)
+        DailyBalance.objects.bulk_update(to_update, ['delta'])
+        DailyBalance.objects.bulk_create([
+            DailyBalance(account_id=account_id, date=day, delta=delta)
+            for day, delta in deltas.items()
+        ])
+        start = min([row.date for row in to_update] + list(deltas))
+        _reroll(account_id, start)
+
+
+def _reroll(account_id, start):
+    """ Recalcula o acumulado dos dias >= start, partindo do dia anterior. """
+    base = (
+        DailyBalance.objects.filter(account_id=account_id, date__lt=start)
+        .order_by('-date').values_list('cumulative', flat=True).first()
+    ) or _ZERO
+    table = DailyBalance._meta.db_table
+    with connection.cursor() as cursor:
+        # Soma corrente com função de janela: um UPDATE para o sufixo inteiro
+        cursor.execute(
+            f"""
+            UPDATE {table} SET cumulative = %s + s.running
+            FROM (
+                SELECT id, SUM(delta) OVER (ORDER BY date ROWS UNBOUNDED PRECEDING) AS running
+                FROM {table} WHERE account_id = %s AND date >= %s
+            ) AS s
+            WHERE {table}.id = s.id
+            """,
+            [base, account_id, start],
+        )
+
+
+def post(account_id, day, amount, tx_type):
+    """ Lança uma transação no livro. """
+    apply({(account_id, day): delta_for(amount, tx_type)})
+
+
+def reverse(account_id, day, amount, tx_type):
+    """ Desfaz o lançamento de uma transação no livro. """
+    apply({(account_id, day): -delta_for(amount, tx_type)})
+
+
+def repost(old_account_id, old_day, old_amount, old_type, new_account_id, new_day, new_amount, new_type):
+    """ Troca o lançamento antigo pelo novo, recalculando cada conta uma vez. """
+    entries = defaultdict(Decimal)
+    entries[(old_account_id, _date_field.to_python(old_day))] -= delta_for(old_amount, old_type)
+    entries[(new_account_id, _date_field.to_python(new_day))] += delta_for(new_amount, new_type)
+    apply(entries)
+
+
+# --- CONSULTAS ---
+
+def _final_cumulative(account_id):
+    return (
+        DailyBalance.objects.filter(account_id=account_id)
+        .order_by('-date').values_list('cumulative', flat=True).first()
+    ) or _ZERO
+
+
+def balance_at(account, day):
+    """ Saldo da conta no fim do dia 'day'. Duas buscas no índice (conta, data). """
+    at = (
+        DailyBalance.objects.filter(account_id=account.pk, date__lte=day)
+        .order_by('-date').values_list('cumulative', flat=True).first()
+    ) or _ZERO
+    return account.balance - (_final_cumulative(account.pk) - at)
+
+
+_PERIOD_START = {
+    'day': lambda d: d,
+    'week': lambda d: d - datetime.timedelta(days=d.weekday()),
+    'month': lambda d: d.replace(day=1),
+    'year': lambda d: d.replace(month=1, day=1),
+}
+
+
+def history(account, start, end, granularity='day'):
+    """
+    Saldo no fim de cada período (com movimentação) entre start e end
+    (exclusivo), em formato colunar. 'opening' é o saldo antes de 'start'.
+    """
+    offset = account.balance - _final_cumulative(account.pk)
+    opening = balance_at(account, start - datetime.timedelta(days=1))
+    rows = (
+        DailyBalance.objects.filter(account_id=account.pk, date__gte=start, date__lt=end)
+        .order_by('date').values_list('date', 'cumulative')
+    )
+
+    period_of = _PERIOD_START[granularity]
+    data = {'period': [], 'balance': []}
+    for day, cumulative in rows.iterator():
+        period = period_of(day).isoformat()
+        balance = float(offset + cumulative)
+        if data['period'] and data['period'][-1] == period:
+            data['balance'][-1] = balance  # fica o último dia do período
+        else:
+            data['period'].append(period)
+            data['balance'].append(balance)
+    return {'opening': float(opening), 'data': data}
+
+
+# --- RECONSTRUÇÃO ---
+
+def rebuild(account_ids=None, batch_size=1000):
+    """
+    Recria o livro a partir das transações (após cargas diretas no banco,
+    por exemplo). Retorna quantas linhas foram criadas.
+    """
+    transactions = Transaction.objects.all()
+    balances = DailyBalance.objects.all()
+    if account_ids is not None:
+        transactions = transactions.filter(account_id__in=account_ids)
+        balances = balances.filter(account_id__in=account_ids)
+
+    signed = Case(
+        When(type='income', then=F('amount')),
+        When(type='expense', then=-F('amount')),
+        default=_ZERO, output_field=DecimalField(),
+    )
+    rows = (
+        transactions.values('account_id', 'date')
+        .annotate(delta=Sum(signed))
+        .order_by('account_id', 'date')
+    )
+
+    def entries():
+        account_id, running = None, _ZERO
+        for row in rows.iterator(chunk_size=batch_size):
+            if row['account_id'] != account_id:
+                account_id, running = row['account_id'], _ZERO
+            running += row['delta']
+            yield DailyBalance(cumulative=running, **row)
+
+    accounts = Account.objects.all()
+    if account_ids is not None:
+        accounts = accounts.filter(pk__in=account_ids)
+
+    with db_transaction.atomic():
+        # Trava as contas para que nenhum lançamento entre durante a reconstrução
+        list(accounts.select_for_update().values_list('pk', flat=True))
+        balances.delete()
+        created = DailyBalance.objects.bulk_create(entries(), batch_size=batch_size)
+    return len(created)
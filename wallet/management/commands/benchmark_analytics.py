@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from wallet import analytics
+import numpy as np
+import statistics
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o tempo das análises de wallet.analytics sobre um DataFrame '
+        'sintético (padrão: 1 milhão de transações) e, com --user, também '
+        'o tempo de leitura das transações do banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--years', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--user', help='Username: mede load_frame() com os dados reais dele.')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            User = get_user_model()
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Usuário '{options['user']}' não encontrado.")
+            started = time.perf_counter()
+            frame = analytics.load_frame(user)
+            self.stdout.write(
+                f'load_frame: {len(frame)} linhas do banco em {(time.perf_counter() - started) * 1000:.0f} ms'
+            )
+        else:
+            started = time.perf_counter()
+            frame = self.synthetic(options['rows'], options['categories'], options['years'])
+            self.stdout.write(
+                f'DataFrame sintético: {len(frame)} linhas em {(time.perf_counter() - started) * 1000:.0f} ms'
+            )
+
+        monthly = analytics.monthly_totals(frame)
+        cases = [
+            ('monthly_totals', lambda: analytics.monthly_totals(frame)),
+            ('rolling_average', lambda: analytics.rolling_average(monthly)),
+            ('month_over_month', lambda: analytics.month_over_month(monthly)),
+            ('category_trends', lambda: analytics.category_trends(frame)),
+            ('burn_rate', lambda: analytics.burn_rate(frame, balance=10_000)),
+            ('outliers', lambda: analytics.outliers(frame)),
+        ]
+        total = 0.0
+        for label, run in cases:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+            median = statistics.median(timings)
+            total += median
+            self.stdout.write(f'  {label:<18} mediana {median:8.1f} ms')
+        style = self.style.SUCCESS if total < 1000 else self.style.WARNING
+        self.stdout.write(style(f'Total das análises: {total:.0f} ms para {len(frame)} linhas.'))
+
+    def synthetic(self, rows, categories, years):
+        rng = np.random.default_rng(42)
+        days = rng.integers(0, 365 * years, rows)
+        is_income = rng.random(rows) < 0.1
+        category_ids = np.where(is_income, 0, rng.integers(1, categories + 1, rows))
+        data = {
+            'id': np.arange(1, rows + 1),
+            'date': np.datetime64('2020-01-01') + days.astype('timedelta64[D]'),
+            'type': np.where(is_income, 'income', 'expense'),
+            'amount': np.round(rng.lognormal(4, 1, rows), 2),
+            'category_id': category_ids,
+            'account_id': rng.integers(1, 4, rows),
+        }
+        names = {0: 'Receita', **{i: f'Despesa {i}' for i in range(1, categories + 1)}}
+        return analytics.build_frame(data, names)
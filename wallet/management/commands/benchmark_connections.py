@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import statistics
+import time
+
+DJANGO_BACKEND = 'django.db.backends.postgresql'
+POOL_BACKEND = 'inwallet.db.backends.postgresql_pool'
+
+# Modo: (ENGINE, CONN_MAX_AGE, CONN_HEALTH_CHECKS)
+MODES = [
+    ('conexão por requisição', DJANGO_BACKEND, 0, False),
+    ('persistente', DJANGO_BACKEND, 600, False),
+    ('persistente + health check', DJANGO_BACKEND, 600, True),
+    ('pool (psycopg_pool)', POOL_BACKEND, 0, False),
+    ('pool + health check', POOL_BACKEND, 0, True),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a latência por requisição com e sem reaproveitamento de conexões '
+        '(CONN_MAX_AGE, health checks e o pool do backend postgresql_pool) contra '
+        'o banco configurado. Cada "requisição" repete o ciclo do Django: '
+        'request_started, consultas, request_finished.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Requisições por thread e modo.')
+        parser.add_argument('--threads', type=int, default=1, help='Threads simultâneas (como um worker gthread).')
+        parser.add_argument('--queries', type=int, default=3, help='Consultas por requisição.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O benchmark compara conexões do PostgreSQL.')
+        self.stdout.write(
+            f"{options['requests']} requisições x {options['threads']} thread(s), "
+            f"{options['queries']} consulta(s) cada\n"
+        )
+        self.stdout.write(f"{'modo':<30}{'média ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'conexões':>10}")
+        for index, (name, engine, max_age, health_checks) in enumerate(MODES):
+            # Cada modo é um alias novo em DATABASES, com o seu backend
+            settings_dict = copy.deepcopy(connection.settings_dict)
+            settings_dict.update(ENGINE=engine, CONN_MAX_AGE=max_age, CONN_HEALTH_CHECKS=health_checks)
+            if engine == POOL_BACKEND:
+                settings_dict['OPTIONS'] = {
+                    **settings_dict['OPTIONS'],
+                    'pool': {'min_size': options['threads'], 'max_size': options['threads']},
+                }
+            alias = f'benchmark_{index}'
+            connections.settings[alias] = settings_dict
+            latencies, pids = self.run_mode(alias, options)
+            self.stdout.write(
+                f"{name:<30}{statistics.mean(latencies):>10.2f}{statistics.median(latencies):>10.2f}"
+                f"{statistics.quantiles(latencies, n=20)[18]:>10.2f}{len(pids):>10}"
+            )
+
+    def run_mode(self, alias, options):
+        def worker(_):
+            # Uma conexão do Django por thread, como nos workers reais
+            wrapper = connections[alias]
+            latencies, pids = [], set()
+            try:
+                for _ in range(options['requests']):
+                    started = time.perf_counter()
+                    wrapper.close_if_unusable_or_obsolete()  # request_started
+                    with wrapper.cursor() as cursor:
+                        cursor.execute('SELECT pg_backend_pid()')
+                        pids.add(cursor.fetchone()[0])
+                        for _ in range(options['queries'] - 1):
+                            cursor.execute('SELECT 1')
+                    wrapper.close_if_unusable_or_obsolete()  # request_finished
+                    latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                wrapper.close()
+            return latencies, pids
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(worker, range(options['threads'])))
+        if hasattr(connections[alias], 'close_pools'):
+            connections[alias].close_pools()
+        latencies = [latency for result, _ in results for latency in result]
+        pids = set().union(*(pids for _, pids in results))
+        return latencies, pids
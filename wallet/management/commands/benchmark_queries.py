@@ -0,0 +1,160 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction as db_transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from wallet.models import Account, Category, Transaction, UserRevision
+from wallet import balances, ledger, rollups
+import datetime
+import statistics
+import time
+
+BENCH_PREFIX = 'bench_'
+# Marca dos usuários criados pelo comando: só eles são apagados
+BENCH_EMAIL_DOMAIN = 'benchmark.invalid'
+
+
+class Command(BaseCommand):
+    help = (
+        'Cria transações sintéticas e compara as consultas do dashboard: filtros '
+        'date__year/date__month (EXTRACT, não usa índice) x intervalos de datas '
+        'e a tabela de resumos. Mostra EXPLAIN e tempos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Total de transações a criar.')
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--years', type=int, default=5, help='Anos de histórico por usuário.')
+        parser.add_argument('--repeat', type=int, default=5, help='Execuções por consulta.')
+        parser.add_argument('--skip-seed', action='store_true', help='Reaproveita os dados de uma execução anterior.')
+        parser.add_argument('--no-explain', action='store_true')
+        parser.add_argument(
+            '--cleanup', action='store_true',
+            help='Apaga os usuários criados pelo benchmark (e-mail @benchmark.invalid) e sai.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O benchmark usa generate_series e EXPLAIN ANALYZE do PostgreSQL.')
+
+        User = get_user_model()
+        if options['cleanup']:
+            self.cleanup(User)
+            return
+
+        if not options['skip_seed']:
+            self.cleanup(User)
+            self.seed(User, options['rows'], options['users'], options['years'])
+
+        user = self.bench_users(User).order_by('pk').first()
+        if user is None:
+            raise CommandError('Nenhum dado de benchmark. Rode sem --skip-seed.')
+
+        year = Transaction.objects.filter(user=user).latest('date').date.year
+        month = 6
+        qs = Transaction.objects.filter(user=user)
+
+        cases = [
+            ('Totais do mês (date__year/date__month)',
+             lambda: qs.filter(date__year=year, date__month=month).values('type').annotate(total=Sum('amount')).order_by()),
+            ('Totais do mês (intervalo de datas)',
+             lambda: qs.in_month(year, month).values('type').annotate(total=Sum('amount')).order_by()),
+            ('Top 5 categorias (date__year/date__month)',
+             lambda: qs.filter(date__year=year, date__month=month, type='expense')
+                       .values('category_id').annotate(total=Sum('amount')).order_by('-total')[:5]),
+            ('Top 5 categorias (intervalo de datas)',
+             lambda: qs.in_month(year, month).filter(type='expense')
+                       .values('category_id').annotate(total=Sum('amount')).order_by('-total')[:5]),
+            ('Resumo anual (date__year)',
+             lambda: qs.filter(date__year=year).annotate(m=TruncMonth('date'))
+                       .values('m', 'type').annotate(total=Sum('amount')).order_by('m')),
+            ('Resumo anual (intervalo de datas)',
+             lambda: qs.in_year(year).annotate(m=TruncMonth('date'))
+                       .values('m', 'type').annotate(total=Sum('amount')).order_by('m')),
+            ('Resumo anual (MonthlyRollup)',
+             lambda: rollups.year_summary(user, year)),
+        ]
+
+        self.stdout.write(f'\nUsuário {user.username}: {qs.count()} transações; período {month}/{year}\n')
+        for label, build in cases:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f'  mín {min(timings):.2f} ms | mediana {statistics.median(timings):.2f} ms')
+            query = build()
+            if not options['no_explain'] and hasattr(query, 'explain'):
+                for line in query.explain(analyze=True).splitlines():
+                    self.stdout.write(f'    {line}')
+
+    def seed(self, User, rows, users, years):
+        per_user = max(1, rows // users)
+        start = datetime.date.today().replace(month=1, day=1) - datetime.timedelta(days=365 * (years - 1))
+        days = 365 * years
+        names = [f'{BENCH_PREFIX}{n}' for n in range(users)]
+        taken = User.objects.filter(username__in=names).exclude(pk__in=self.bench_users(User))
+        if taken.exists():
+            raise CommandError(
+                f"Já existem usuários que não são do benchmark com esses nomes: "
+                f"{', '.join(taken.values_list('username', flat=True))}."
+            )
+        self.stdout.write(f'Criando {per_user * users} transações para {users} usuários...')
+        started = time.perf_counter()
+
+        for n in range(users):
+            with db_transaction.atomic():
+                user = User.objects.create_user(
+                    username=names[n], email=f'{names[n]}@{BENCH_EMAIL_DOMAIN}', password=None,
+                )
+                account = Account.objects.create(user=user, name='Benchmark')
+                categories = [
+                    Category.objects.create(user=user, name=f'Despesa {i}', type='expense').pk
+                    for i in range(8)
+                ]
+                income = Category.objects.create(user=user, name='Receita', type='income').pk
+                base_revision = UserRevision.reserve(user.pk, per_user) - per_user
+                with connection.cursor() as cursor:
+                    # Inserção direta (generate_series): milhões de linhas em segundos
+                    cursor.execute(
+                        """
+                        INSERT INTO wallet_transaction
+                            (user_id, account_id, category_id, type, amount, date, description,
+                             revision, updated_at, fingerprint)
+                        SELECT %s, %s,
+                               CASE WHEN g %% 10 = 0 THEN %s ELSE (%s::bigint[])[1 + g %% 8] END,
+                               v.type, v.amount, v.date, 'Transação ' || g,
+                               %s + g, now(),
+                               -- O mesmo cálculo de models.transaction_fingerprint()
+                               md5(concat_ws('|', %s, v.date, v.type, v.amount, 'transacao ' || g))
+                        FROM generate_series(1, %s) AS g,
+                             LATERAL (SELECT round((random() * 500 + 1)::numeric, 2) AS amount,
+                                             CASE WHEN g %% 10 = 0 THEN 'income' ELSE 'expense' END AS type,
+                                             %s::date + (g %% %s) AS date) AS v
+                        """,
+                        [user.pk, account.pk, income, categories, base_revision, account.pk, per_user, start, days],
+                    )
+            rollups.rebuild(user_ids=[user.pk])
+            ledger.rebuild(account_ids=[account.pk])
+            # A inserção direta não passou pelos saldos: acerta a conta pelas transações
+            balances.fix_drift(balances.find_drift([user.pk]))
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE wallet_transaction')
+        self.stdout.write(f'Dados criados em {time.perf_counter() - started:.1f}s.')
+
+    def bench_users(self, User):
+        return User.objects.filter(
+            username__startswith=BENCH_PREFIX, email__iendswith=f'@{BENCH_EMAIL_DOMAIN}',
+        )
+
+    def cleanup(self, User):
+        ids = list(self.bench_users(User).values_list('pk', flat=True))
+        if not ids:
+            return
+        with connection.cursor() as cursor:
+            # Sem sinais: milhões de linhas sairiam uma a uma pelo ORM
+            cursor.execute('DELETE FROM wallet_transaction WHERE user_id = ANY(%s)', [ids])
+        User.objects.filter(pk__in=ids).delete()
+        self.stdout.write(f'{len(ids)} usuários de benchmark removidos.')
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from wallet import exporters
+from wallet.models import Account, Category
+import datetime
+import os
+import sys
+import time
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Data inválida: '{value}' (use AAAA-MM-DD).")
+
+
+class Command(BaseCommand):
+    help = 'Exporta as transações de um usuário (CSV, Parquet ou XLSX), em lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Arquivo de saída ('-' para CSV na saída padrão).")
+        parser.add_argument('--user', required=True, help='Username do dono das transações.')
+        parser.add_argument('--format', choices=sorted(exporters.FORMATS), help='Padrão: pela extensão do arquivo.')
+        parser.add_argument('--start', type=_date, help='Data inicial (AAAA-MM-DD).')
+        parser.add_argument('--end', type=_date, help='Data final, exclusiva (AAAA-MM-DD).')
+        parser.add_argument('--account', help='Nome da conta.')
+        parser.add_argument('--category', help='Nome da categoria.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário '{options['user']}' não encontrado.")
+
+        filters = {'start': options['start'], 'end': options['end']}
+        if options['account']:
+            filters['account'] = Account.objects.filter(user=user, name=options['account']).first()
+            if filters['account'] is None:
+                raise CommandError(f"Conta '{options['account']}' não encontrada.")
+        if options['category']:
+            filters['category'] = Category.objects.filter(user=user, name=options['category']).first()
+            if filters['category'] is None:
+                raise CommandError(f"Categoria '{options['category']}' não encontrada.")
+
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower() or 'csv'
+        if file_format not in exporters.FORMATS:
+            raise CommandError(f"Formato não suportado: '{file_format}'")
+
+        queryset = exporters.export_queryset(user, **filters)
+        writer = exporters.WRITERS[file_format]
+        kwargs = {}
+        if file_format != 'parquet':
+            kwargs['chunk_size'] = options['chunk_size']
+        started = time.perf_counter()
+        try:
+            if path == '-':
+                if file_format != 'csv':
+                    raise CommandError('Só o CSV pode ir para a saída padrão.')
+                count = writer(queryset, sys.stdout, **kwargs)
+            elif file_format == 'csv':
+                with open(path, 'w', newline='', encoding='utf-8') as output:
+                    count = writer(queryset, output, **kwargs)
+            else:
+                with open(path, 'wb') as output:
+                    count = writer(queryset, output, **kwargs)
+        except exporters.ExportFormatError as exc:
+            raise CommandError(str(exc))
+
+        if path != '-':
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f'{count} transações exportadas em {elapsed:.1f}s.'))
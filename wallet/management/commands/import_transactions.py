@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from wallet import importers
+from wallet.models import Account
+import time
+
+
+class Command(BaseCommand):
+    help = 'Importa um extrato (CSV ou OFX) para um usuário, em lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Caminho do arquivo CSV ou OFX.')
+        parser.add_argument('--user', required=True, help='Username do dono das transações.')
+        parser.add_argument('--account', help='Nome da conta usada quando a linha não informa uma.')
+        parser.add_argument('--format', choices=sorted(importers.PARSERS), help='Padrão: pela extensão do arquivo.')
+        parser.add_argument('--default-category', default='Outros')
+        parser.add_argument(
+            '--no-categorize', action='store_false', dest='categorize',
+            help='Não sugere categorias: linhas sem categoria vão para --default-category.',
+        )
+        parser.add_argument(
+            '--allow-duplicates', action='store_false', dest='skip_duplicates',
+            help='Grava também as linhas iguais a transações já existentes.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--encoding', help='Codificação do arquivo (padrão: utf-8 para CSV, latin-1 para OFX).')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário '{options['user']}' não encontrado.")
+
+        account = None
+        if options['account']:
+            account = Account.objects.filter(user=user, name=options['account']).first()
+            if account is None:
+                raise CommandError(f"Conta '{options['account']}' não encontrada.")
+
+        started = time.perf_counter()
+        try:
+            file_format = options['format'] or importers.detect_format(options['path'])
+            parse_kwargs = {'encoding': options['encoding']} if options['encoding'] else {}
+            importer = importers.TransactionImporter(
+                user,
+                account=account,
+                default_category=options['default_category'],
+                chunk_size=options['chunk_size'],
+                categorize=options['categorize'],
+                skip_duplicates=options['skip_duplicates'],
+            )
+            with open(options['path'], 'rb') as stream:
+                importer.run(importers.PARSERS[file_format](stream, **parse_kwargs))
+        except (OSError, importers.StatementFormatError) as exc:
+            raise CommandError(str(exc))
+
+        for error in importer.errors:
+            self.stderr.write(f"Linha {error['line']}: {error['error']}")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{importer.created} transações importadas em {elapsed:.2f}s '
+            f'({importer.categorized} categorizadas automaticamente, '
+            f'{importer.duplicates} duplicadas ignoradas, {importer.flagged} marcadas para revisão).'
+        ))
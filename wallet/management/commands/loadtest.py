@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from urllib.parse import urlsplit
+import asyncio
+import statistics
+import time
+
+DEFAULT_PATHS = [
+    '/api/v1/reports/monthly/',
+    '/api/v1/reports/by-category/',
+    '/api/v1/reports/cashflow/',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Dispara requisições GET simultâneas contra um ou mais servidores já '
+        'em execução (ex.: gunicorn/WSGI x uvicorn/ASGI) e compara vazão e '
+        'latência. Ex.: --target wsgi=http://127.0.0.1:8000 '
+        '--target asgi=http://127.0.0.1:8001/async --user bench_0'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True, metavar='NOME=URL',
+            help='Servidor a testar. O caminho da URL (ex.: /async) é inserido depois de /api/v1.',
+        )
+        parser.add_argument('--path', action='append', help='Caminhos requisitados em rodízio (padrão: relatórios).')
+        parser.add_argument('--user', required=True, help='Username usado nas requisições (sessão criada no banco).')
+        parser.add_argument('--requests', type=int, default=500, help='Requisições por servidor.')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário '{options['user']}' não encontrado.")
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.session_for(user)}'
+
+        targets = []
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            parts = urlsplit(url)
+            if not sep or parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(f"Use NOME=http://host:porta[/prefixo]: '{target}'")
+            targets.append((name, parts))
+
+        paths = options['path'] or DEFAULT_PATHS
+        self.stdout.write(
+            f"{options['requests']} requisições por servidor, {options['concurrency']} simultâneas, "
+            f"{len(paths)} caminho(s)\n"
+        )
+        self.stdout.write(f"{'servidor':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'erros':>8}")
+        for name, parts in targets:
+            stats = asyncio.run(self.run(parts, paths, cookie, options))
+            self.stdout.write(
+                f"{name:<12}{stats['rps']:>10.1f}{stats['p50']:>10.1f}{stats['p95']:>10.1f}"
+                f"{stats['p99']:>10.1f}{stats['max']:>10.1f}{stats['errors']:>8}"
+            )
+
+    def session_for(self, user):
+        """ Sessão autenticada, como a gravada pelo login. """
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    async def run(self, parts, paths, cookie, options):
+        """ Executa as requisições com no máximo 'concurrency' em andamento. """
+        prefix = parts.path.rstrip('/')
+        urls = [path.replace('/api/v1/', f'/api/v1{prefix}/', 1) for path in paths]
+        total = options['requests']
+        queue = iter(range(total))
+        latencies, errors = [], 0
+
+        async def worker():
+            nonlocal errors
+            for n in queue:
+                started = time.perf_counter()
+                try:
+                    status = await asyncio.wait_for(
+                        self.get(parts.hostname, parts.port or 80, urls[n % len(urls)], cookie),
+                        options['timeout'],
+                    )
+                except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                    status = None
+                latencies.append((time.perf_counter() - started) * 1000)
+                if status != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(options['concurrency'], total))))
+        elapsed = time.perf_counter() - started
+
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'rps': total / elapsed,
+            'p50': percentiles[49],
+            'p95': percentiles[94],
+            'p99': percentiles[98],
+            'max': max(latencies),
+            'errors': errors,
+        }
+
+    async def get(self, host, port, path, cookie):
+        """ GET HTTP/1.1 mínimo (uma conexão por requisição). Retorna o status. """
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: {host}\r\nCookie: {cookie}\r\n'
+                f'Accept: application/json\r\nConnection: close\r\n\r\n'.encode()
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+            return int(status_line.split()[1])
+        finally:
+            writer.close()
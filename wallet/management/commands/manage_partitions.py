@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+import datetime
+from wallet import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Mantém as partições anuais da tabela de transações (PostgreSQL): cria '
+        'as dos próximos anos, arquiva as antigas no schema wallet_archive e '
+        'restaura as arquivadas. Pode ser agendado no cron (ex.: uma vez por mês). '
+        'Enquanto houver partições arquivadas, rebuild_rollups, rebuild_ledger e '
+        'reconcile_balances se recusam a rodar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=1,
+            help='Cria as partições até o ano atual + N (padrão: 1).',
+        )
+        parser.add_argument(
+            '--archive-before', type=int, metavar='ANO',
+            help='Arquiva (desanexa) as partições dos anos anteriores a ANO.',
+        )
+        parser.add_argument(
+            '--restore', type=int, action='append', default=[], metavar='ANO',
+            help='Anexa de novo a partição arquivada do ano (pode ser repetido).',
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned(connection):
+            raise CommandError(
+                'A tabela de transações não é particionada (só no PostgreSQL, migração 0014).'
+            )
+
+        this_year = datetime.date.today().year
+        if options['archive_before'] is not None and options['archive_before'] > this_year:
+            raise CommandError('--archive-before não pode arquivar o ano atual.')
+
+        for year in options['restore']:
+            if year not in partitions.archived_years(connection):
+                raise CommandError(f'Não há partição arquivada de {year}.')
+            moved = partitions.restore_partition(connection, year)
+            self.stdout.write(self.style.SUCCESS(f'{year}: restaurada ({moved} linhas vindas da partição padrão).'))
+
+        for year in range(this_year, this_year + options['ahead'] + 1):
+            moved = partitions.create_partition(connection, year)
+            if moved is not None:
+                self.stdout.write(self.style.SUCCESS(f'{year}: criada ({moved} linhas vindas da partição padrão).'))
+
+        if options['archive_before'] is not None:
+            for partition in partitions.list_partitions(connection):
+                if partition['year'] is not None and partition['year'] < options['archive_before']:
+                    partitions.archive_partition(connection, partition['year'])
+                    self.stdout.write(self.style.WARNING(
+                        f"{partition['year']}: arquivada em {partitions.ARCHIVE_SCHEMA}.{partition['name']}."
+                    ))
+
+        self.stdout.write(f"\n{'partição':<32}{'linhas (estimativa)':>20}")
+        for partition in partitions.list_partitions(connection):
+            self.stdout.write(f"{partition['name']:<32}{partition['rows']:>20}")
+        archived = partitions.archived_years(connection)
+        if archived:
+            self.stdout.write(f"arquivadas: {', '.join(map(str, archived))}")
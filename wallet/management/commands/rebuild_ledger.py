@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from wallet import ledger, partitions
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o livro-razão de saldos (DailyBalance) a partir das transações.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--account', type=int, action='append', dest='account_ids',
+            help='ID da conta a reconstruir (pode ser repetido). Padrão: todas.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        archived = partitions.archived_years(connection)
+        if archived:
+            raise CommandError(partitions.ARCHIVED_ERROR.format(years=', '.join(map(str, archived))))
+        created = ledger.rebuild(
+            account_ids=options['account_ids'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'{created} lançamentos diários recriados.'))
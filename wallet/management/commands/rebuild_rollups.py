@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from wallet import budgets, partitions, rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula a tabela de resumos mensais (MonthlyRollup) e os contadores '
+        'dos orçamentos (BudgetUsage) a partir das transações.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='ID do usuário a reconstruir (pode ser repetido). Padrão: todos.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        archived = partitions.archived_years(connection)
+        if archived:
+            raise CommandError(partitions.ARCHIVED_ERROR.format(years=', '.join(map(str, archived))))
+        created = rollups.rebuild(
+            user_ids=options['user_ids'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'{created} resumos mensais recriados.'))
+        created = budgets.rebuild(user_ids=options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'{created} contadores de orçamento recriados.'))
@@ -0,0 +1,85 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from wallet import balances, partitions
+from wallet.models import Account
+from decimal import Decimal
+import time
+
+
+def _init_worker():
+    # Processos novos (spawn) precisam carregar o Django; com fork é um no-op
+    import django
+    django.setup()
+
+
+def _reconcile_chunk(user_ids, fix):
+    drifts = balances.find_drift(user_ids)
+    if fix and drifts:
+        balances.fix_drift(drifts)
+    return len(user_ids), drifts
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula o saldo esperado de cada conta (saldo inicial + transações), '
+        'lista as divergências e, com --fix, corrige. Os usuários são processados '
+        'em lotes, com uma consulta agregada por lote, opcionalmente em paralelo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='ID do usuário a conciliar (pode ser repetido). Padrão: todos.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=500, help='Usuários por consulta.')
+        parser.add_argument('--workers', type=int, default=1, help='Processos em paralelo.')
+        parser.add_argument('--fix', action='store_true', help='Corrige os saldos divergentes.')
+
+    def handle(self, *args, **options):
+        archived = partitions.archived_years(connection)
+        if archived:
+            raise CommandError(partitions.ARCHIVED_ERROR.format(years=', '.join(map(str, archived))))
+        started = time.perf_counter()
+        user_ids = options['user_ids']
+        if user_ids is None:
+            user_ids = Account.objects.order_by('user_id').values_list('user_id', flat=True).distinct()
+        user_ids = list(user_ids)
+        size = max(1, options['chunk_size'])
+        chunks = [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+        fix = options['fix']
+
+        if options['workers'] > 1 and len(chunks) > 1:
+            # As conexões abertas não podem ser herdadas pelos processos filhos
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                results = pool.map(_reconcile_chunk, chunks, [fix] * len(chunks))
+                checked, drifts = self.collect(results)
+        else:
+            checked, drifts = self.collect(_reconcile_chunk(chunk, fix) for chunk in chunks)
+
+        for row in drifts:
+            self.stdout.write(
+                f"usuário {row['user_id']} | conta {row['account_id']} ({row['name']}): "
+                f"gravado {row['balance']} | esperado {row['expected']} | diferença {row['drift']:+}"
+            )
+        total = sum((abs(row['drift']) for row in drifts), Decimal('0.00'))
+        elapsed = time.perf_counter() - started
+        summary = (
+            f'{checked} usuários conferidos, {len(drifts)} contas divergentes '
+            f'(total {total}) em {elapsed:.1f}s.'
+        )
+        if drifts and not fix:
+            self.stdout.write(self.style.WARNING(summary + ' Use --fix para corrigir.'))
+        elif drifts:
+            self.stdout.write(self.style.SUCCESS(summary + ' Saldos corrigidos.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def collect(self, results):
+        checked, drifts = 0, []
+        for count, chunk_drifts in results:
+            checked += count
+            drifts.extend(chunk_drifts)
+            self.stderr.write(f'  {checked} usuários...', ending='\r')
+        return checked, drifts
@@ -0,0 +1,236 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from collections import defaultdict
+import bisect
+import contextvars
+import heapq
+import logging
+import threading
+import time
+from . import cache as dashboard_cache
+
+# --- MÉTRICAS POR REQUISIÇÃO ---
+# MetricsMiddleware mede cada requisição: latência, número e tempo das
+# consultas SQL, tempo de renderização (template HTML ou JSON do DRF) e
+# tamanho da resposta. Os valores vão para histogramas por view, mantidos
+# na memória do processo e expostos em /metrics no formato do Prometheus.
+# Requisições acima de WALLET_SLOW_REQUEST_MS vão para o log 'wallet.metrics'
+# com as consultas mais lentas.
+#
+# As consultas são medidas por um execute_wrapper instalado em toda conexão
+# nova (sinal connection_created). Ele lê a requisição atual de uma
+# ContextVar, que o sync_to_async copia para as threads: as consultas das
+# views async (async_views._db) também entram na conta da requisição.
+#
+# Os números são do processo: com vários workers, cada scrape do Prometheus
+# lê o worker que o atendeu. Para somar todos, exponha um worker por porta
+# ou agregue por instância no Prometheus.
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SLOW_QUERIES_LOGGED = 5
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# nome: (descrição, limites dos buckets)
+HISTOGRAMS = {
+    'wallet_http_request_duration_seconds': ('Latência da requisição.', LATENCY_BUCKETS),
+    'wallet_http_request_queries': ('Consultas SQL por requisição.', QUERY_BUCKETS),
+    'wallet_http_request_sql_seconds': ('Tempo em SQL por requisição.', LATENCY_BUCKETS),
+    'wallet_http_request_render_seconds': ('Renderização da resposta (template ou JSON).', LATENCY_BUCKETS),
+    'wallet_http_response_size_bytes': ('Tamanho da resposta (exceto streaming).', SIZE_BUCKETS),
+}
+
+_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+_lock = threading.Lock()
+_histograms = {}  # (nome, (view, método)) -> [contagem por bucket + '+Inf', soma]
+_requests = defaultdict(int)  # (view, método, status) -> total
+
+# Estatísticas da requisição em andamento (None fora de uma requisição)
+_current = contextvars.ContextVar('wallet_request_stats', default=None)
+
+
+class RequestStats:
+    """
+    Consultas e renderização de uma requisição. As views async fazem
+    consultas em várias threads ao mesmo tempo, daí a trava.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.slowest = []  # heap com as SLOW_QUERIES_LOGGED consultas mais lentas
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, seconds):
+        with self._lock:
+            self.queries += 1
+            self.sql_seconds += seconds
+            if len(self.slowest) < SLOW_QUERIES_LOGGED:
+                heapq.heappush(self.slowest, (seconds, sql))
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, sql))
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_wrapper(sender, connection, **kwargs):
+    # connect() roda de novo a cada conexão nova do mesmo alias (e a cada
+    # conexão tirada do pool): o wrapper só entra uma vez. Vai no início da
+    # lista porque connection.execute_wrapper() remove o último ao sair, e a
+    # conexão pode ser aberta dentro de um bloco desses.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def observe(name, labels, value):
+    buckets = HISTOGRAMS[name][1]
+    with _lock:
+        entry = _histograms.get((name, labels))
+        if entry is None:
+            entry = _histograms[(name, labels)] = [[0] * (len(buckets) + 1), 0]
+        entry[0][bisect.bisect_left(buckets, value)] += 1
+        entry[1] += value
+
+
+class MetricsMiddleware:
+    """
+    Primeiro item de MIDDLEWARE, para que a latência inclua os outros
+    middlewares. Funciona sob WSGI e ASGI sem trocar de thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, started = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats, started = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def process_template_response(self, request, response):
+        # A renderização acontece logo depois deste método (o último a rodar,
+        # por ser o primeiro middleware) e termina nos post-render callbacks
+        stats = _current.get()
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.render_seconds += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def record(self, request, response, stats, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        method = request.method if request.method in _METHODS else 'other'
+        labels = (match.view_name if match else 'unmatched', method)
+
+        observe('wallet_http_request_duration_seconds', labels, elapsed)
+        observe('wallet_http_request_queries', labels, stats.queries)
+        observe('wallet_http_request_sql_seconds', labels, stats.sql_seconds)
+        observe('wallet_http_request_render_seconds', labels, stats.render_seconds)
+        if not response.streaming:
+            observe('wallet_http_response_size_bytes', labels, len(response.content))
+        with _lock:
+            _requests[(*labels, str(response.status_code))] += 1
+
+        if elapsed * 1000 >= getattr(settings, 'WALLET_SLOW_REQUEST_MS', 500):
+            top = ''.join(
+                f'\n  {seconds * 1000:8.1f} ms  {sql[:300]}'
+                for seconds, sql in sorted(stats.slowest, reverse=True)
+            )
+            logger.warning(
+                'Requisição lenta: %s %s -> %s em %.0f ms (%d consultas, %.0f ms em SQL, %.0f ms renderizando)%s',
+                request.method, request.get_full_path(), response.status_code, elapsed * 1000,
+                stats.queries, stats.sql_seconds * 1000, stats.render_seconds * 1000, top,
+            )
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _pool_stats():
+    engine = 'inwallet.db.backends.postgresql_pool'
+    if not any(database['ENGINE'] == engine for database in settings.DATABASES.values()):
+        return {}
+    from inwallet.db.backends.postgresql_pool import base
+    return base.pool_stats()
+
+
+def render():
+    """ Todas as métricas do processo no formato de texto do Prometheus. """
+    with _lock:
+        histograms = {key: (list(counts), total) for key, (counts, total) in _histograms.items()}
+        requests = dict(_requests)
+
+    lines = [
+        '# HELP wallet_http_requests_total Requisições atendidas.',
+        '# TYPE wallet_http_requests_total counter',
+    ]
+    for (view, method, status), total in sorted(requests.items()):
+        lines.append(f'wallet_http_requests_total{_labels(view=view, method=method, status=status)} {total}')
+
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (metric, (view, method)), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(view=view, method=method, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(view=view, method=method)} {total}')
+            lines.append(f'{name}_count{_labels(view=view, method=method)} {cumulative}')
+
+    for key, value in dashboard_cache.stats().items():
+        name = f'wallet_dashboard_cache_{key}_total'
+        lines += [f'# TYPE {name} counter', f'{name} {value}']
+
+    pools = _pool_stats()
+    for key in ('pool_size', 'pool_available', 'requests_waiting'):
+        name = f'wallet_db_{key}'
+        lines.append(f'# TYPE {name} gauge')
+        for alias, stats in sorted(pools.items()):
+            lines.append(f'{name}{_labels(alias=alias)} {stats.get(key, 0)}')
+    return '\n'.join(lines) + '\n'
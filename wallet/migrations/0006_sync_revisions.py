@@ -0,0 +1,110 @@
+# Generated by Django 4.2.15 on 2026-10-18 10:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_revisions(apps, schema_editor):
+    """
+    Dá uma revisão distinta a cada linha existente (por usuário: categorias,
+    contas e depois transações) e inicializa o contador de cada usuário.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        tables = []
+        for table in ('wallet_category', 'wallet_account', 'wallet_transaction'):
+            cursor.execute(f"""
+                UPDATE {table} SET revision = s.rn + COALESCE(
+                    (SELECT r.revision FROM wallet_userrevision r WHERE r.user_id = s.user_id), 0)
+                FROM (SELECT id, user_id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id) AS rn
+                      FROM {table}) AS s
+                WHERE {table}.id = s.id
+            """)
+            tables.append(table)
+            union = ' UNION ALL '.join(f'SELECT user_id, revision FROM {t}' for t in tables)
+            cursor.execute('DELETE FROM wallet_userrevision')
+            cursor.execute(f"""
+                INSERT INTO wallet_userrevision (user_id, revision)
+                SELECT user_id, MAX(revision) FROM ({union}) AS r GROUP BY user_id
+            """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallet', '0005_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('account', 'Conta'), ('category', 'Categoria'), ('transaction', 'Transação')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('revision', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserRevision',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('revision', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='revision',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='revision',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='revision',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['user', 'revision'], name='wallet_account_rev_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['user', 'revision'], name='wallet_category_rev_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'revision'], name='wallet_tx_user_revision_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'revision'], name='wallet_tombstone_rev_idx'),
+        ),
+        migrations.RunPython(backfill_revisions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.15 on 2026-10-18 11:00
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, Sum, When
+from decimal import Decimal
+import django.db.models.deletion
+
+
+def populate_ledger(apps, schema_editor):
+    Transaction = apps.get_model('wallet', 'Transaction')
+    DailyBalance = apps.get_model('wallet', 'DailyBalance')
+    signed = Case(
+        When(type='income', then=F('amount')),
+        When(type='expense', then=-F('amount')),
+        default=Decimal('0.00'), output_field=DecimalField(),
+    )
+    rows = (
+        Transaction.objects.values('account_id', 'date')
+        .annotate(delta=Sum(signed))
+        .order_by('account_id', 'date')
+    )
+
+    def entries():
+        account_id, running = None, Decimal('0.00')
+        for row in rows.iterator():
+            if row['account_id'] != account_id:
+                account_id, running = row['account_id'], Decimal('0.00')
+            running += row['delta']
+            yield DailyBalance(cumulative=running, **row)
+
+    DailyBalance.objects.bulk_create(entries(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0006_sync_revisions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('delta', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cumulative', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wallet.account')),
+            ],
+            options={
+                'unique_together': {('account', 'date')},
+            },
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
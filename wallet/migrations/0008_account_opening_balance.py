@@ -0,0 +1,40 @@
+# Generated by Django 4.2.15 on 2026-10-18 11:03
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from decimal import Decimal
+
+
+def populate_opening_balance(apps, schema_editor):
+    # Sem histórico do valor cadastrado: parte do saldo atual menos as transações
+    Account = apps.get_model('wallet', 'Account')
+    Transaction = apps.get_model('wallet', 'Transaction')
+    signed = Case(
+        When(type='income', then=F('amount')),
+        When(type='expense', then=-F('amount')),
+        default=Decimal('0.00'), output_field=DecimalField(),
+    )
+    totals = (
+        Transaction.objects.filter(account_id=OuterRef('pk'))
+        .values('account_id').annotate(total=Sum(signed)).values('total')
+    )
+    Account.objects.update(
+        opening_balance=F('balance') - Coalesce(Subquery(totals), Decimal('0.00'), output_field=DecimalField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0007_dailybalance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='opening_balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.RunPython(populate_opening_balance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.15 on 2026-10-18 11:13
+
+from decimal import Decimal
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallet', '0008_account_opening_balance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('expense', 'Despesa'), ('income', 'Receita')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('description', models.CharField(blank=True, max_length=255, null=True)),
+                ('payment_method', models.CharField(blank=True, max_length=50, null=True)),
+                ('frequency', models.CharField(choices=[('daily', 'Diária'), ('weekly', 'Semanal'), ('monthly', 'Mensal'), ('yearly', 'Anual')], default='monthly', max_length=10)),
+                ('interval', models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('start_date', models.DateField(default=django.utils.timezone.now)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(blank=True, help_text='Número máximo de ocorrências.', null=True)),
+                ('next_date', models.DateField(editable=False)),
+                ('occurrences', models.PositiveIntegerField(default=0, editable=False)),
+                ('active', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recurringrule',
+            name='account',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wallet.account'),
+        ),
+        migrations.AddField(
+            model_name='recurringrule',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='wallet.category'),
+        ),
+        migrations.AddField(
+            model_name='recurringrule',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='recurring_rule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='wallet.recurringrule'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringrule',
+            index=models.Index(condition=models.Q(('active', True)), fields=['next_date'], name='wallet_recurring_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('recurring_rule__isnull', False)), fields=('recurring_rule', 'date'), name='wallet_tx_recurring_once'),
+        ),
+    ]
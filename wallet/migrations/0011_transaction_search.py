@@ -0,0 +1,44 @@
+# Generated by Django 4.2.15 on 2026-10-18 11:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    Índice de trigramas da descrição (busca aproximada). A extensão pg_trgm
+    vem no pacote contrib do PostgreSQL, que nem toda instalação tem: sem
+    ela a busca usa só o texto completo.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS wallet_tx_description_trgm_idx '
+        'ON wallet_transaction USING gin (description gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS wallet_tx_description_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0010_budget'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('description', config='portuguese', weight='A'), '||', django.contrib.postgres.search.SearchVector('note', config='portuguese', weight='B'), django.contrib.postgres.search.SearchConfig('portuguese')), '||', django.contrib.postgres.search.SearchVector('payment_method', config='portuguese', weight='C'), django.contrib.postgres.search.SearchConfig('portuguese')), name='wallet_tx_search_idx'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
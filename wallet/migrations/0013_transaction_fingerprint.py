@@ -0,0 +1,57 @@
+# Generated by Django 4.2.15 on 2026-10-18 11:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+from wallet.models import transaction_fingerprint
+
+
+def fill_fingerprints(apps, schema_editor):
+    """
+    Calcula a impressão digital das transações existentes, em lotes por ID,
+    com um UPDATE ... FROM (VALUES ...) por lote.
+    """
+    Transaction = apps.get_model('wallet', 'Transaction')
+    table = Transaction._meta.db_table
+    last_pk = 0
+    while True:
+        rows = list(
+            Transaction.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'account_id', 'date', 'type', 'amount', 'description')[:5000]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        params = []
+        for pk, account_id, date, tx_type, amount, description in rows:
+            params.extend([pk, transaction_fingerprint(account_id, date, tx_type, amount, description)])
+        values = ', '.join(['(%s, %s)'] * len(rows))
+        schema_editor.execute(
+            f'UPDATE {table} SET fingerprint = v.fingerprint '
+            f'FROM (VALUES {values}) AS v(id, fingerprint) WHERE {table}.id = v.id',
+            params,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0012_categoryrule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='fingerprint',
+            field=models.CharField(default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='possible_duplicate',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wallet.transaction'),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'fingerprint'], name='wallet_tx_fingerprint_idx'),
+        ),
+    ]
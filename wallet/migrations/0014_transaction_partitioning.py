@@ -0,0 +1,102 @@
+# Generated by Django 4.2.15 on 2026-10-18 14:02
+
+from django.db import migrations, models
+import datetime
+import django.db.models.deletion
+from wallet import partitions
+
+
+def _rebuild(schema_editor, partitioned):
+    """
+    Recria wallet_transaction (particionada por ano ou não) e copia as
+    linhas. Os índices e as chaves estrangeiras da tabela são lidos do
+    catálogo e recriados com os mesmos nomes, depois da carga.
+    """
+    table = partitions.TABLE
+    old = f'{table}_old'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s '
+            'AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)',
+            [table, table],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT DISTINCT EXTRACT(YEAR FROM date)::int FROM {table}')
+        years = {row[0] for row in cursor.fetchall()}
+
+    schema_editor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    schema_editor.execute(
+        f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY '
+        f'INCLUDING CONSTRAINTS INCLUDING STORAGE)'
+        + (' PARTITION BY RANGE (date)' if partitioned else '')
+    )
+    if partitioned:
+        # Anos com dados, o atual e o próximo; o resto cai na partição padrão
+        this_year = datetime.date.today().year
+        for year in sorted(years | {this_year, this_year + 1}):
+            schema_editor.execute(
+                f'CREATE TABLE {partitions.partition_name(year)} PARTITION OF {table} '
+                f'{partitions.partition_bounds(year)}'
+            )
+        schema_editor.execute(f'CREATE TABLE {partitions.DEFAULT_PARTITION} PARTITION OF {table} DEFAULT')
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass AND attnum > 0 '
+            'AND NOT attisdropped ORDER BY attnum',
+            [table],
+        )
+        columns = ', '.join(row[0] for row in cursor.fetchall())
+    schema_editor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}')
+    # A sequência da coluna identity é nova: continua de onde a antiga parou
+    schema_editor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {table}"
+    )
+    schema_editor.execute(f'DROP TABLE {old}')
+    # Criada ao lado da antiga, a sequência nova ganhou outro nome
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+        sequence = cursor.fetchone()[0]
+    if sequence.split('.')[-1] != f'{table}_id_seq':
+        schema_editor.execute(f'ALTER SEQUENCE {sequence} RENAME TO {table}_id_seq')
+
+    primary_key = '(id, date)' if partitioned else '(id)'
+    schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY {primary_key}')
+    for indexdef in indexes:
+        schema_editor.execute(indexdef)
+    for name, definition in foreign_keys:
+        schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+    schema_editor.execute(f'ANALYZE {table}')
+
+
+def partition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        _rebuild(schema_editor, partitioned=True)
+
+
+def unpartition_transactions(apps, schema_editor):
+    if partitions.is_partitioned(schema_editor.connection):
+        _rebuild(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0013_transaction_fingerprint'),
+    ]
+
+    operations = [
+        # Tabelas particionadas não aceitam chaves estrangeiras para só o 'id'
+        migrations.AlterField(
+            model_name='transaction',
+            name='possible_duplicate',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wallet.transaction'),
+        ),
+        migrations.RunPython(partition_transactions, unpartition_transactions),
+    ]
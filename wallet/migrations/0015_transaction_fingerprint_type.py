@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-18 18:20
+
+from django.db import migrations
+from importlib import import_module
+
+# A impressão digital passou a incluir o tipo: recalcula as já gravadas
+fill_fingerprints = import_module('wallet.migrations.0013_transaction_fingerprint').fill_fingerprints
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0014_transaction_partitioning'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,108 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import IntegrityError, models, transaction as db_transaction
+from django.db.models import F
 from django.conf import settings
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+import calendar
+import datetime
+import hashlib
+import re
+import unicodedata
 
 User = settings.AUTH_USER_MODEL
 
-class Category(models.Model):
+
+# --- REVISÕES PARA SINCRONIZAÇÃO INCREMENTAL ---
+# Cada usuário tem um contador de revisões. Toda gravação de Conta, Categoria
+# ou Transação recebe o próximo número, e as exclusões deixam um Tombstone com
+# a sua revisão. Assim, o cliente pede "o que mudou depois da revisão N".
+# O contador é incrementado dentro da mesma transação do banco que grava a
+# linha e fica travado até o COMMIT: as revisões de um usuário ficam visíveis
+# sempre em ordem, e nenhuma mudança fica para trás do token do cliente.
+
+class UserRevision(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    revision = models.BigIntegerField(default=0)
+
+    @classmethod
+    def reserve(cls, user_id, count=1):
+        """
+        Reserva 'count' revisões para o usuário e retorna a última delas.
+        Deve ser chamado dentro de um transaction.atomic().
+        """
+        rows = cls.objects.filter(user_id=user_id)
+        if not rows.update(revision=F('revision') + count):
+            try:
+                with db_transaction.atomic():
+                    cls.objects.create(user_id=user_id, revision=count)
+                return count
+            except IntegrityError:
+                # Outra requisição criou o contador ao mesmo tempo
+                rows.update(revision=F('revision') + count)
+        return rows.values_list('revision', flat=True).get()
+
+    @classmethod
+    def current(cls, user_id):
+        return cls.objects.filter(user_id=user_id).values_list('revision', flat=True).first() or 0
+
+
+def stamp_revisions(objs):
+    """ Atribui revisões novas (uma por objeto) antes de um bulk_create/bulk_update. """
+    by_user = {}
+    for obj in objs:
+        by_user.setdefault(obj.user_id, []).append(obj)
+    for user_id, group in by_user.items():
+        last = UserRevision.reserve(user_id, len(group))
+        for offset, obj in enumerate(group):
+            obj.revision = last - len(group) + 1 + offset
+
+
+class RevisionedModel(models.Model):
+    """
+    Base dos modelos sincronizados com os clientes: cada save() grava a
+    revisão nova do usuário e a data da última alteração.
+    """
+    revision = models.BigIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'revision', 'updated_at'}
+        with db_transaction.atomic():
+            self.revision = UserRevision.reserve(self.user_id)
+            super().save(*args, **kwargs)
+
+
+class Tombstone(models.Model):
+    """ Registro de uma exclusão, para que os clientes apaguem a cópia local. """
+    MODEL_CHOICES = (
+        ('account', 'Conta'),
+        ('category', 'Categoria'),
+        ('transaction', 'Transação'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    revision = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'revision'], name='wallet_tombstone_rev_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} (rev {self.revision})"
+
+
+class Category(RevisionedModel):
     TYPE_CHOICES = (
         ('expense', 'Despesa'),
         ('income', 'Receita')
@@ -18,20 +114,107 @@ class Category(models.Model):
 
     class   Meta:
         unique_together = ('user', 'name', 'type')
+        indexes = [
+            models.Index(fields=['user', 'revision'], name='wallet_category_rev_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.get_type_display()})"
     
 
-class Account(models.Model):
+class Account(RevisionedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=120)
     balance = models.DecimalField(max_digits=14, decimal_places=2, default=0, validators=[MinValueValidator(Decimal('0.00'))])
+    # Saldo informado no cadastro. Saldo esperado = saldo inicial + transações
+    # (usado pelo comando reconcile_balances para achar divergências).
+    opening_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'revision'], name='wallet_account_rev_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.user.username}"
 
-class Transaction(models.Model):
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.opening_balance = self.balance
+        super().save(*args, **kwargs)
+
+def search_vector():
+    """
+    Vetor de busca das transações (ver search.py). O índice GIN
+    wallet_tx_search_idx é criado sobre esta mesma expressão.
+    """
+    return (
+        SearchVector('description', weight='A', config='portuguese')
+        + SearchVector('note', weight='B', config='portuguese')
+        + SearchVector('payment_method', weight='C', config='portuguese')
+    )
+
+
+def transaction_fingerprint(account_id, date, tx_type, amount, description):
+    """
+    Impressão digital de uma transação para achar duplicatas (ver dedup.py):
+    MD5 de conta, data, tipo, valor e descrição normalizada (minúsculas, sem
+    acentos, espaços simples). Transações iguais nestes campos têm a mesma
+    impressão, mesmo que a descrição venha com outra grafia no extrato. O
+    valor é gravado sem sinal: sem o tipo, o estorno de uma compra seria
+    tomado por duplicata dela.
+    """
+    text = unicodedata.normalize('NFKD', description or '').encode('ascii', 'ignore').decode()
+    text = re.sub(r'\s+', ' ', text).strip().lower()
+    if not isinstance(date, str):
+        date = date.isoformat()
+    key = f'{account_id}|{date}|{tx_type}|{Decimal(amount):.2f}|{text}'
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+class TransactionQuerySet(models.QuerySet):
+    # Colunas usadas pelas listagens (HTML e API)
+    LIST_FIELDS = (
+        'id', 'user', 'account', 'category', 'type', 'amount', 'date',
+        'description', 'payment_method', 'note', 'possible_duplicate',
+    )
+
+    def for_listing(self, fields=LIST_FIELDS):
+        """
+        Queryset otimizado para listagens: traz o nome da conta e da categoria
+        no mesmo SELECT (evita N+1) e só as colunas pedidas em 'fields'.
+        """
+        return self.select_related('account', 'category').only(
+            'account', 'category', *fields, 'account__name', 'category__name',
+        )
+
+    # Filtros de período escritos como intervalos (date >= início AND date < fim).
+    # Ao contrário de date__year/date__month, que aplicam EXTRACT() na coluna,
+    # intervalos podem usar os índices que começam por (user, ..., date).
+
+    def in_range(self, start, end):
+        """ Transações com start <= date < end. """
+        return self.filter(date__gte=start, date__lt=end)
+
+    def in_month(self, year, month):
+        start = datetime.date(year, month, 1)
+        end = datetime.date(year + month // 12, month % 12 + 1, 1)
+        return self.in_range(start, end)
+
+    def in_year(self, year):
+        return self.in_range(datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # Sem save() por objeto: as revisões são reservadas de uma vez por usuário
+        objs = list(objs)
+        for obj in objs:
+            obj.fingerprint = obj.compute_fingerprint()
+        with db_transaction.atomic():
+            stamp_revisions(objs)
+            return super().bulk_create(objs, *args, **kwargs)
+
+
+class Transaction(RevisionedModel):
     TYPE_CHOICES = (
         ('expense', 'Despesa'),
         ('income', 'Receita'),
@@ -45,6 +228,250 @@ class Transaction(models.Model):
     description = models.CharField(max_length=255, blank=True, null=True)
     payment_method = models.CharField(max_length=50, blank=True, null=True)
     note = models.TextField(blank=True, null=True)
+    # Regra que gerou a transação (lançamentos recorrentes)
+    recurring_rule = models.ForeignKey(
+        'RecurringRule', on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions',
+    )
+    # Conta, data, tipo, valor e descrição normalizada (transaction_fingerprint)
+    fingerprint = models.CharField(max_length=32, default='', editable=False)
+    # Transação parecida já gravada (mesma conta e valor, data próxima): a
+    # importação ou a API grava a nova, mas a marca para revisão. Sem
+    # restrição no banco: a tabela é particionada (partitions.py)
+    possible_duplicate = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_constraint=False,
+    )
+
+    objects = TransactionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listagens paginadas por cursor: WHERE user = ? ORDER BY date, id
+            models.Index(fields=['user', 'date', 'id'], name='wallet_tx_user_date_id_idx'),
+            # Agregações por período e tipo (relatórios, reconstrução dos resumos).
+            # 'include' torna o índice de cobertura no PostgreSQL: a soma por
+            # categoria é feita só com o índice, sem visitar a tabela.
+            models.Index(
+                fields=['user', 'type', 'date'], include=['amount', 'category'],
+                name='wallet_tx_user_type_date_idx',
+            ),
+            # Operações por conta (movimentação de saldos, extratos por conta)
+            models.Index(fields=['account', 'date'], name='wallet_tx_account_date_idx'),
+            # Sincronização incremental: WHERE user = ? AND revision > ?
+            models.Index(fields=['user', 'revision'], name='wallet_tx_user_revision_idx'),
+            # Busca por texto completo (search.py). O índice de trigramas da
+            # descrição é criado na migração 0011, se o banco tiver pg_trgm.
+            GinIndex(search_vector(), name='wallet_tx_search_idx'),
+            # Detecção de duplicatas: WHERE user = ? AND fingerprint IN (...).
+            # Não é único: duas compras iguais no mesmo dia são legítimas.
+            models.Index(fields=['user', 'fingerprint'], name='wallet_tx_fingerprint_idx'),
+        ]
+        constraints = [
+            # Uma regra recorrente nunca lança duas vezes a mesma data
+            models.UniqueConstraint(
+                fields=['recurring_rule', 'date'], condition=models.Q(recurring_rule__isnull=False),
+                name='wallet_tx_recurring_once',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.date} - {self.category.name} - R$ {self.amount}"
+
+    FINGERPRINT_FIELDS = ('account', 'account_id', 'date', 'type', 'amount', 'description')
+
+    def compute_fingerprint(self):
+        return transaction_fingerprint(self.account_id, self.date, self.type, self.amount, self.description)
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = self.compute_fingerprint()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.FINGERPRINT_FIELDS):
+            kwargs['update_fields'] = {*update_fields, 'fingerprint'}
+        # A transação, o saldo da conta e os resumos (atualizados pelos sinais)
+        # são gravados juntos: ou tudo é salvo, ou nada é.
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class MonthlyRollup(models.Model):
+    """
+    Resumo pré-calculado das transações (usuário x conta x categoria x mês x tipo).
+    É mantido incrementalmente pelos sinais em signals.py e lido pelo Dashboard,
+    que assim não precisa agregar a tabela de transações inteira.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    month = models.DateField()  # Sempre o dia 1 do mês
+    type = models.CharField(max_length=10, choices=Transaction.TYPE_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'account', 'category', 'month', 'type')
+        indexes = [
+            models.Index(fields=['user', 'month', 'type']),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%m/%Y} - {self.category_id} - R$ {self.total}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Resposta já enviada para uma requisição em lote com o cabeçalho
+    'Idempotency-Key'. Se o cliente repetir a requisição (ex.: timeout de
+    rede), a mesma resposta é devolvida sem aplicar as operações de novo.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)  # sha256 do corpo enviado
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"{self.user_id} - {self.key}"
+
+
+class DailyBalance(models.Model):
+    """
+    Livro-razão de saldos: uma linha por (conta, dia com movimentação), com o
+    efeito líquido das transações do dia ('delta') e a soma acumulada de
+    todos os deltas até o fim do dia ('cumulative'). É mantido pelos sinais
+    (ver ledger.py) e permite saber o saldo em qualquer data com uma busca
+    no índice (conta, data), sem somar o histórico de transações.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    date = models.DateField()
+    delta = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cumulative = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('account', 'date')
+
+    def __str__(self):
+        return f"{self.account_id} - {self.date} - R$ {self.cumulative}"
+
+
+class RecurringRule(models.Model):
+    """
+    Lançamento recorrente (salário, aluguel, assinaturas), no estilo RRULE:
+    a cada 'interval' dias/semanas/meses/anos a partir de 'start_date', até
+    'end_date' ou 'count' ocorrências. O comando run_recurring cria as
+    transações vencidas; 'next_date' é a próxima ocorrência ainda não lançada.
+    """
+    FREQUENCY_CHOICES = (
+        ('daily', 'Diária'),
+        ('weekly', 'Semanal'),
+        ('monthly', 'Mensal'),
+        ('yearly', 'Anual'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    type = models.CharField(max_length=10, choices=Transaction.TYPE_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    description = models.CharField(max_length=255, blank=True, null=True)
+    payment_method = models.CharField(max_length=50, blank=True, null=True)
+
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='monthly')
+    interval = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+    start_date = models.DateField(default=timezone.now)
+    end_date = models.DateField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True, help_text='Número máximo de ocorrências.')
+
+    # Estado do agendador
+    next_date = models.DateField(editable=False)
+    occurrences = models.PositiveIntegerField(default=0, editable=False)
+    active = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            # Busca das regras vencidas: WHERE active AND next_date <= hoje
+            models.Index(
+                fields=['next_date'], condition=models.Q(active=True), name='wallet_recurring_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.description or self.category.name} ({self.get_frequency_display()})"
+
+    def occurrence(self, n):
+        """ Data da n-ésima ocorrência (n = 0 é start_date). """
+        start = self.start_date
+        if self.frequency == 'daily':
+            return start + datetime.timedelta(days=n * self.interval)
+        if self.frequency == 'weekly':
+            return start + datetime.timedelta(weeks=n * self.interval)
+        months = n * self.interval * (12 if self.frequency == 'yearly' else 1)
+        # Sempre a partir de start_date: um dia 31 volta a ser 31 depois de fevereiro
+        year, month = divmod(start.month - 1 + months, 12)
+        year += start.year
+        last_day = calendar.monthrange(year, month + 1)[1]
+        return datetime.date(year, month + 1, min(start.day, last_day))
+
+    def is_finished(self):
+        if self.count is not None and self.occurrences >= self.count:
+            return True
+        return self.end_date is not None and self.next_date > self.end_date
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.start_date = models.DateField().to_python(self.start_date)
+            self.next_date = self.occurrence(self.occurrences)
+        super().save(*args, **kwargs)
+
+
+class Budget(models.Model):
+    """
+    Limite mensal de gastos de uma categoria de despesa. O quanto já foi
+    gasto em cada mês fica em BudgetUsage, mantido pelos sinais.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='budgets')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    # Percentual do limite que dispara o aviso (além dos 100%)
+    alert_percent = models.PositiveSmallIntegerField(default=80, validators=[MinValueValidator(1)])
+
+    class Meta:
+        unique_together = ('user', 'category')
+
+    def __str__(self):
+        return f"{self.category.name} - R$ {self.amount}/mês"
+
+
+class BudgetUsage(models.Model):
+    """
+    Contador do gasto de um orçamento em um mês (soma das despesas da
+    categoria). Só existe para categorias com orçamento; a linha do mês é
+    criada na primeira despesa, a partir das transações já gravadas.
+    """
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='usage')
+    month = models.DateField()  # Sempre o dia 1 do mês
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('budget', 'month')
+
+    def __str__(self):
+        return f"{self.month:%m/%Y} - {self.budget_id} - R$ {self.spent}"
+
+
+class CategoryRule(models.Model):
+    """
+    Regra de categorização automática: transações cuja descrição contém
+    'pattern' (sem acentos, sem diferenciar maiúsculas) vão para 'category'.
+    As regras têm prioridade sobre o modelo aprendido (categorizer.py).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='rules')
+    pattern = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ('user', 'pattern')
+
+    def __str__(self):
+        return f"'{self.pattern}' -> {self.category.name}"
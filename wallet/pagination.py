@@ -0,0 +1,134 @@
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+import base64
+import binascii
+import datetime
+
+# --- PAGINAÇÃO POR CURSOR (KEYSET) ---
+# Em vez de OFFSET (que fica mais lento a cada página), cada página começa
+# logo depois da chave (date, id) da última linha da página anterior.
+# Com o índice (user, date, id) o custo é o mesmo em qualquer página.
+
+ORDERING = ('-date', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, tx):
+    """ Cursor opaco: 'n' (próxima) ou 'p' (anterior) + chave (date, id). """
+    raw = f"{direction}|{tx.date.isoformat()}|{tx.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, date, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        if direction not in ('n', 'p'):
+            raise ValueError(direction)
+        return direction, datetime.date.fromisoformat(date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(token)
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def paginate(queryset, cursor=None, page_size=15):
+    """
+    Pagina 'queryset' (já filtrado por usuário) em ordem ('-date', '-id').
+    Busca page_size + 1 linhas para saber se existe uma página seguinte.
+    """
+    if not cursor:
+        rows = list(queryset.order_by(*ORDERING)[:page_size + 1])
+        has_more, has_previous = len(rows) > page_size, False
+        rows = rows[:page_size]
+    else:
+        direction, date, pk = decode_cursor(cursor)
+        if direction == 'n':
+            # Linhas "depois" da chave: (date, id) < (d, pk)
+            qs = queryset.filter(Q(date__lte=date) & ~Q(date=date, id__gte=pk))
+            rows = list(qs.order_by(*ORDERING)[:page_size + 1])
+            has_more, has_previous = len(rows) > page_size, True
+            rows = rows[:page_size]
+        else:
+            # Linhas "antes" da chave, lidas de trás para frente
+            qs = queryset.filter(Q(date__gte=date) & ~Q(date=date, id__lte=pk))
+            rows = list(qs.order_by('date', 'id')[:page_size + 1])
+            has_previous, has_more = len(rows) > page_size, True
+            rows = rows[:page_size][::-1]
+
+    next_cursor = encode_cursor('n', rows[-1]) if rows and has_more else None
+    previous_cursor = encode_cursor('p', rows[0]) if rows and has_previous else None
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+class TransactionCursorPagination(BasePagination):
+    """
+    Paginação da API de transações. Retorna os links 'next' e 'previous'
+    com cursores opacos, como o CursorPagination do DRF, mas usando a chave
+    composta (date, id).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = paginate(
+                queryset,
+                request.query_params.get(self.cursor_query_param),
+                self.get_page_size(request),
+            )
+        except InvalidCursor:
+            raise NotFound('Cursor inválido.')
+        return self.page.object_list
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self._link(self.page.next_cursor),
+            'previous': self._link(self.page.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
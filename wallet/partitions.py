@@ -0,0 +1,164 @@
+from django.db import transaction as db_transaction
+import datetime
+import re
+
+# --- PARTICIONAMENTO DAS TRANSAÇÕES (PostgreSQL) ---
+# A tabela wallet_transaction é particionada por intervalo de datas, uma
+# partição por ano (wallet_transaction_y2025, ...), mais a partição padrão
+# (wallet_transaction_default) para datas sem partição própria. A migração
+# 0014 faz a conversão; as partições dos próximos anos e o arquivamento das
+# antigas ficam com o comando manage_partitions.
+#
+# Consultas com filtro de data (relatórios, filtros start/end, páginas
+# seguintes da listagem por cursor) só leem as partições do intervalo. A
+# primeira página da listagem (ORDER BY date DESC LIMIT n, sem filtro) lê só
+# o começo do índice (user, date, id) de cada partição (Merge Append).
+#
+# Consequências no esquema:
+# - a chave primária do banco é (id, date): toda restrição única de uma
+#   tabela particionada precisa incluir a coluna de partição. Para o Django a
+#   chave continua sendo 'id' (único pela sequência);
+# - chaves estrangeiras para a tabela (possible_duplicate) não podem ter
+#   restrição no banco (db_constraint=False);
+# - uma partição arquivada sai das listagens e relatórios por transação, mas
+#   continua somada nos saldos, resumos mensais e no livro-razão. Por isso
+#   rebuild_rollups, rebuild_ledger e reconcile_balances, que recalculam a
+#   partir das transações anexadas, se recusam a rodar (ARCHIVED_ERROR).
+
+TABLE = 'wallet_transaction'
+DEFAULT_PARTITION = f'{TABLE}_default'
+ARCHIVE_SCHEMA = 'wallet_archive'
+
+ARCHIVED_ERROR = (
+    'Há partições de transações arquivadas ({years}), ainda somadas nos saldos, '
+    'resumos e livro-razão. Restaure-as com manage_partitions --restore ANO antes de recalcular.'
+)
+
+_YEAR_RE = re.compile(rf'^{TABLE}_y(\d{{4}})$')
+
+
+def partition_name(year):
+    return f'{TABLE}_y{year}'
+
+
+def partition_bounds(year):
+    """ FOR VALUES da partição do ano (as datas vêm de um int, não do usuário). """
+    start, end = datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+    return f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+
+def _exists(cursor, name, schema=None):
+    cursor.execute('SELECT to_regclass(%s)', [f'{schema}.{name}' if schema else name])
+    return cursor.fetchone()[0] is not None
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection):
+    """
+    Partições anexadas: [{'name', 'year' (None na padrão), 'rows'}], em
+    ordem de ano. 'rows' é a estimativa do ANALYZE (0 se nunca analisada).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, c.reltuples FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s)',
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, rows_estimate in rows:
+        match = _YEAR_RE.match(name)
+        partitions.append({
+            'name': name,
+            'year': int(match.group(1)) if match else None,
+            'rows': max(int(rows_estimate), 0),
+        })
+    return sorted(partitions, key=lambda p: (p['year'] is None, p['year'] or 0))
+
+
+def archived_years(connection):
+    if connection.vendor != 'postgresql':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT tablename FROM pg_tables WHERE schemaname = %s AND tablename LIKE %s',
+            [ARCHIVE_SCHEMA, f'{TABLE}_y%'],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(int(_YEAR_RE.match(name).group(1)) for name in names if _YEAR_RE.match(name))
+
+
+def _attach_year(cursor, year, ddl):
+    """
+    Executa 'ddl' (que cria ou anexa a partição do ano). Se a partição padrão
+    tem linhas daquele ano, o PostgreSQL recusaria o DDL: ela é desanexada,
+    as linhas passam para a partição nova e ela volta a ser anexada.
+    """
+    start, end = datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+    stray = False
+    if _exists(cursor, DEFAULT_PARTITION):
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s)', [start, end],
+        )
+        stray = cursor.fetchone()[0]
+    if not stray:
+        cursor.execute(ddl)
+        return 0
+
+    cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+    cursor.execute(ddl)
+    cursor.execute(
+        f'INSERT INTO {TABLE} SELECT * FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s', [start, end],
+    )
+    cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s', [start, end])
+    moved = cursor.rowcount
+    cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+    return moved
+
+
+def create_partition(connection, year):
+    """
+    Cria a partição do ano, se ainda não existe (nem está arquivada).
+    Retorna quantas linhas vieram da partição padrão, ou None se nada foi feito.
+    """
+    name = partition_name(year)
+    with db_transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if _exists(cursor, name) or _exists(cursor, name, ARCHIVE_SCHEMA):
+            return None
+        return _attach_year(cursor, year, f'CREATE TABLE {name} PARTITION OF {TABLE} {partition_bounds(year)}')
+
+
+def archive_partition(connection, year):
+    """
+    Desanexa a partição do ano e a move para o schema ARCHIVE_SCHEMA. Os
+    dados continuam no banco (para pg_dump, consulta ou restore_partition).
+    As chaves estrangeiras herdadas da tabela são removidas, para não
+    impedir a exclusão de contas, categorias e usuários; o ATTACH PARTITION
+    do restore_partition as cria de novo e as valida (o restore falha se
+    alguma linha referenciada foi apagada nesse meio tempo).
+    """
+    name = partition_name(year)
+    with db_transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [name])
+        for (constraint,) in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"')
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}')
+        cursor.execute(f'ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}')
+
+
+def restore_partition(connection, year):
+    """ Traz de volta uma partição arquivada. Retorna as linhas movidas da padrão. """
+    name = partition_name(year)
+    with db_transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('SELECT current_schema()')
+        schema = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE {ARCHIVE_SCHEMA}.{name} SET SCHEMA {schema}')
+        return _attach_year(cursor, year, f'ALTER TABLE {TABLE} ATTACH PARTITION {name} {partition_bounds(year)}')
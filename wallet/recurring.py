@@ -0,0 +1,90 @@
+from django.db import connection, transaction as db_transaction
+import datetime
+from .models import RecurringRule, Transaction
+from .signals import post_bulk_create
+
+# --- LANÇAMENTOS RECORRENTES ---
+# As regras vencidas são lidas em lotes, por ordem de ID (keyset), e cada
+# lote é gravado numa única transação do banco: as transações novas (um
+# bulk_create), os saldos/resumos (post_bulk_create: um UPDATE por conta) e
+# o avanço de next_date das regras. Se o processo parar no meio, os lotes já
+# gravados ficam completos e os outros continuam vencidos: basta rodar de
+# novo. As regras do lote ficam travadas (skip_locked), então duas execuções
+# simultâneas não lançam a mesma regra.
+
+
+def _due_occurrences(rule, today, limit):
+    """ Transações vencidas da regra (até 'limit'); avança o estado da regra. """
+    created = []
+    while not rule.is_finished() and rule.next_date <= today and len(created) < limit:
+        created.append(Transaction(
+            user_id=rule.user_id,
+            account_id=rule.account_id,
+            category_id=rule.category_id,
+            type=rule.type,
+            amount=rule.amount,
+            date=rule.next_date,
+            description=rule.description,
+            payment_method=rule.payment_method,
+            recurring_rule_id=rule.pk,
+        ))
+        rule.occurrences += 1
+        rule.next_date = rule.occurrence(rule.occurrences)
+    if rule.is_finished():
+        rule.active = False
+    return created
+
+
+def _save_progress(rules):
+    """
+    Grava next_date/occurrences/active das regras com um único UPDATE ...
+    FROM (VALUES ...). O bulk_update() monta um CASE por campo e por linha,
+    que custa mais (em Python) do que gravar as próprias transações.
+    """
+    table = RecurringRule._meta.db_table
+    values = ', '.join(['(%s, %s::date, %s, %s)'] * len(rules))
+    params = []
+    for rule in rules:
+        params.extend([rule.pk, rule.next_date, rule.occurrences, rule.active])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} SET next_date = v.next_date, occurrences = v.occurrences, active = v.active
+            FROM (VALUES {values}) AS v(id, next_date, occurrences, active)
+            WHERE {table}.id = v.id
+            """,
+            params,
+        )
+
+
+def materialize(today=None, batch_size=1000, max_per_rule=366):
+    """
+    Lança todas as ocorrências vencidas até 'today' (inclusive).
+    'max_per_rule' limita quantas ocorrências uma regra atrasada gera por
+    execução. Retorna {'rules': regras processadas, 'created': transações}.
+    """
+    today = today or datetime.date.today()
+    stats = {'rules': 0, 'created': 0}
+    last_pk = 0
+    while True:
+        with db_transaction.atomic():
+            rules = list(
+                RecurringRule.objects
+                .filter(active=True, next_date__lte=today, pk__gt=last_pk)
+                .order_by('pk')
+                .select_for_update(skip_locked=True)[:batch_size]
+            )
+            if not rules:
+                break
+            last_pk = rules[-1].pk
+
+            transactions = []
+            for rule in rules:
+                transactions.extend(_due_occurrences(rule, today, max_per_rule))
+            Transaction.objects.bulk_create(transactions, batch_size=1000)
+            post_bulk_create(transactions)
+            _save_progress(rules)
+
+        stats['rules'] += len(rules)
+        stats['created'] += len(transactions)
+    return stats
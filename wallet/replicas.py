@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import caches
+from contextlib import contextmanager
+import contextvars
+import random
+
+# --- RÉPLICAS DE LEITURA ---
+# As agregações do dashboard e dos relatórios só leem, e podem ir para uma
+# réplica do PostgreSQL (DATABASES['replica_N'], configuradas por
+# DB_REPLICA_URLS) em vez de disputar o primário com as gravações.
+#
+# Só o código dentro de reporting() vai para a réplica: o resto (formulários,
+# CRUD, importação, sinais) continua lendo e gravando no primário.
+#
+# Ler o que acabou de gravar: a réplica fica alguns instantes atrás do
+# primário. Cada gravação de um usuário (a mesma que invalida o cache do
+# dashboard, ver cache.invalidate) prende as leituras dele ao primário por
+# WALLET_REPLICA_STICKY_SECONDS, então ele nunca vê um saldo antigo depois de
+# lançar uma transação. A marca fica no cache do dashboard, compartilhado entre
+# os workers quando o cache é o Redis.
+
+STICKY_SECONDS = getattr(settings, 'WALLET_REPLICA_STICKY_SECONDS', 10)
+
+# Alias do banco para as leituras do bloco reporting() atual (None = primário)
+_reading_from = contextvars.ContextVar('wallet_reading_from', default=None)
+
+
+def _cache():
+    return caches[getattr(settings, 'WALLET_DASHBOARD_CACHE', 'default')]
+
+
+def _pin_key(user_id):
+    return f'wallet:replica:pinned:{user_id}'
+
+
+def replica_aliases():
+    return list(getattr(settings, 'WALLET_READ_REPLICAS', []))
+
+
+def pin(user_id):
+    """ Manda as leituras do usuário para o primário pelos próximos segundos. """
+    if replica_aliases():
+        _cache().set(_pin_key(user_id), True, STICKY_SECONDS)
+
+
+def is_pinned(user_id):
+    return bool(_cache().get(_pin_key(user_id)))
+
+
+def choose(user_id):
+    """ Réplica para as leituras do usuário, ou None se devem ir ao primário. """
+    aliases = replica_aliases()
+    if not aliases or is_pinned(user_id):
+        return None
+    return random.choice(aliases)
+
+
+@contextmanager
+def using(alias):
+    """ Leituras do bloco vão para 'alias' (None = primário). """
+    token = _reading_from.set(alias)
+    try:
+        yield alias
+    finally:
+        _reading_from.reset(token)
+
+
+def reporting(user):
+    """
+    Bloco de consultas somente leitura do usuário (dashboard, relatórios):
+    vão para uma réplica, a menos que ele tenha gravado algo há pouco.
+    Em código async, use using(await sync_to_async(choose)(user.pk)).
+    """
+    return using(choose(user.pk))
+
+
+class ReplicaRouter:
+    """
+    DATABASE_ROUTERS: leituras dentro de reporting() vão para a réplica
+    escolhida; as gravações e todas as outras leituras, para o primário.
+    """
+    def db_for_read(self, model, **hints):
+        return _reading_from.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas têm os mesmos dados do primário
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # As réplicas recebem o esquema pela replicação
+        return db not in replica_aliases()
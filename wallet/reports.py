@@ -0,0 +1,146 @@
+from django.db.models import Sum, Count, Case, When, F, DecimalField
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
+from rest_framework.exceptions import ValidationError
+from decimal import Decimal
+import datetime
+from .models import Transaction, MonthlyRollup
+
+# --- RELATÓRIOS AGREGADOS NO BANCO ---
+# Todas as funções retornam JSON "colunar": um dict de listas do mesmo
+# tamanho ({'period': [...], 'income': [...]}), mais compacto que uma
+# lista de objetos e pronto para alimentar gráficos.
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+_ZERO = Decimal('0.0')
+
+
+def _sum_of(tx_type, field='amount'):
+    return Sum(Case(When(type=tx_type, then=F(field)), default=_ZERO, output_field=DecimalField()))
+
+
+def parse_date(params, name, default):
+    value = params.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Use o formato AAAA-MM-DD.'})
+
+
+def parse_params(params):
+    """
+    Lê 'start', 'end' (exclusivo) e 'granularity' da query string.
+    Padrão: os últimos 12 meses completos + o mês atual, por mês.
+    """
+    today = datetime.date.today()
+    default_end = (today.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    default_start = default_end.replace(year=default_end.year - 1)
+
+    start = parse_date(params, 'start', default_start)
+    end = parse_date(params, 'end', default_end)
+    if start >= end:
+        raise ValidationError({'end': "'end' deve ser depois de 'start'."})
+
+    granularity = params.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        raise ValidationError({'granularity': f"Use um de: {', '.join(GRANULARITIES)}."})
+    return start, end, granularity
+
+
+def etag_params(params, start, end, granularity):
+    """
+    Parâmetros que entram no ETag dos relatórios: as datas e a granularidade
+    já resolvidas (sem 'start'/'end', o intervalo padrão anda com o mês mesmo
+    sem gravações novas) e os demais parâmetros da query string.
+    """
+    others = sorted(
+        (key, values) for key, values in params.lists() if key not in ('start', 'end', 'granularity')
+    )
+    return f'{start.isoformat()}|{end.isoformat()}|{granularity}|{others}'
+
+
+def _uses_rollup(start, end, granularity):
+    """
+    Períodos de mês/ano com datas no dia 1 podem ser respondidos pela tabela
+    MonthlyRollup (uma linha por mês), sem ler as transações.
+    """
+    return granularity in ('month', 'year') and start.day == 1 and end.day == 1
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def period_totals(user, start, end, granularity='month'):
+    """ Receita e despesa por período. """
+    trunc = GRANULARITIES[granularity]
+    if _uses_rollup(start, end, granularity):
+        qs = MonthlyRollup.objects.filter(user=user, month__gte=start, month__lt=end)
+        rows = (
+            qs.annotate(period=trunc('month'))
+            .values('period')
+            .annotate(income=_sum_of('income', 'total'), expense=_sum_of('expense', 'total'))
+            .order_by('period')
+        )
+    else:
+        rows = (
+            Transaction.objects.filter(user=user).in_range(start, end)
+            .annotate(period=trunc('date'))
+            .values('period')
+            .annotate(income=_sum_of('income'), expense=_sum_of('expense'))
+            .order_by('period')
+        )
+
+    data = {'period': [], 'income': [], 'expense': []}
+    for row in rows:
+        data['period'].append(_as_date(row['period']).isoformat())
+        data['income'].append(float(row['income']))
+        data['expense'].append(float(row['expense']))
+    return data
+
+
+def category_totals(user, start, end, tx_type=None):
+    """ Total e quantidade por categoria no intervalo, do maior para o menor. """
+    if _uses_rollup(start, end, 'month'):
+        qs = MonthlyRollup.objects.filter(user=user, month__gte=start, month__lt=end)
+        total, count = Sum('total'), Sum('count')
+    else:
+        qs = Transaction.objects.filter(user=user).in_range(start, end)
+        total, count = Sum('amount'), Count('id')
+    if tx_type:
+        qs = qs.filter(type=tx_type)
+
+    rows = (
+        qs.values('category_id', 'category__name', 'type')
+        .annotate(total=total, count=count)
+        .order_by('-total')
+    )
+    data = {'category_id': [], 'category': [], 'type': [], 'total': [], 'count': []}
+    for row in rows:
+        data['category_id'].append(row['category_id'])
+        data['category'].append(row['category__name'])
+        data['type'].append(row['type'])
+        data['total'].append(float(row['total']))
+        data['count'].append(row['count'])
+    return data
+
+
+def cashflow(user, start, end, granularity='month'):
+    """ Receita, despesa, saldo do período (net) e saldo acumulado no intervalo. """
+    data = period_totals(user, start, end, granularity)
+    data['net'] = []
+    data['cumulative'] = []
+    running = 0.0
+    for income, expense in zip(data['income'], data['expense']):
+        net = round(income - expense, 2)
+        running = round(running + net, 2)
+        data['net'].append(net)
+        data['cumulative'].append(running)
+    return data
@@ -0,0 +1,222 @@
+from django.db import IntegrityError, models, transaction as db_transaction
+from django.db.models import Sum, Count, Case, When, F, DecimalField
+from django.db.models.functions import TruncMonth
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+import datetime
+import threading
+from django.contrib.auth import get_user_model
+from .models import Transaction, MonthlyRollup
+from . import cache as dashboard_cache
+
+# --- RESUMOS MENSAIS PRÉ-CALCULADOS (ROLLUPS) ---
+
+_date_field = models.DateField()
+_pending = threading.local()
+
+
+def month_start(value):
+    """ Converte uma data (ou datetime) para o primeiro dia do mês. """
+    return _date_field.to_python(value).replace(day=1)
+
+
+@contextmanager
+def deferred():
+    """
+    Dentro deste bloco os deltas são acumulados por balde e aplicados de uma
+    vez com bump_many() ao sair. Use dentro de um transaction.atomic().
+    """
+    if getattr(_pending, 'buckets', None) is not None:
+        yield
+        return
+
+    _pending.buckets = defaultdict(lambda: [Decimal('0.00'), 0])
+    try:
+        yield
+        buckets = _pending.buckets
+    finally:
+        _pending.buckets = None
+    bump_many(buckets)
+
+
+def _defer(buckets):
+    """ Acumula no bloco deferred() ativo. Retorna False se não houver um. """
+    pending = getattr(_pending, 'buckets', None)
+    if pending is None:
+        return False
+    for key, (total, count) in buckets.items():
+        pending[key][0] += Decimal(total)
+        pending[key][1] += count
+    return True
+
+
+def bump(user_id, account_id, category_id, date, tx_type, amount, count):
+    """
+    Soma 'amount' e 'count' no balde (usuário, conta, categoria, mês, tipo).
+    Usa F() para que a atualização seja feita pelo banco, sem ler o valor antes.
+    """
+    if _defer({(user_id, account_id, category_id, month_start(date), tx_type): (amount, count)}):
+        return
+
+    key = {
+        'user_id': user_id,
+        'account_id': account_id,
+        'category_id': category_id,
+        'month': month_start(date),
+        'type': tx_type,
+    }
+    amount = Decimal(amount)
+    buckets = MonthlyRollup.objects.filter(**key)
+    updated = buckets.update(total=F('total') + amount, count=F('count') + count)
+
+    if not updated:
+        if count <= 0:
+            # Nada para reverter (ex: a conta já foi apagada em cascata)
+            return
+        try:
+            with db_transaction.atomic():
+                MonthlyRollup.objects.create(total=amount, count=count, **key)
+        except IntegrityError:
+            # Outro processo criou o balde ao mesmo tempo
+            buckets.update(total=F('total') + amount, count=F('count') + count)
+    elif count < 0:
+        # Remove baldes vazios para não aparecerem nos gráficos
+        buckets.filter(count__lte=0).delete()
+
+
+def bump_many(buckets):
+    """
+    Aplica vários deltas de uma vez (usado pelas gravações em lote).
+    'buckets' é um dict {(user_id, account_id, category_id, month, type): (total, count)}.
+    Em vez de um UPDATE por balde, lê os baldes existentes de uma vez (travando
+    as linhas), atualiza com bulk_update e cria os que faltam com bulk_create.
+    Deve ser chamado dentro de um transaction.atomic().
+    """
+    if _defer(buckets):
+        return
+
+    buckets = {key: value for key, value in buckets.items() if value[0] or value[1]}
+    if not buckets:
+        return
+
+    keys = list(zip(*buckets))
+    existing = {
+        (r.user_id, r.account_id, r.category_id, r.month, r.type): r
+        for r in MonthlyRollup.objects.select_for_update().filter(
+            user_id__in=set(keys[0]),
+            account_id__in=set(keys[1]),
+            category_id__in=set(keys[2]),
+            month__in=set(keys[3]),
+        )
+    }
+
+    to_update, to_create = [], []
+    for key, (total, count) in buckets.items():
+        row = existing.get(key)
+        if row is not None:
+            row.total += total
+            row.count += count
+            to_update.append(row)
+        elif count > 0:
+            user_id, account_id, category_id, month, tx_type = key
+            to_create.append(MonthlyRollup(
+                user_id=user_id, account_id=account_id, category_id=category_id,
+                month=month, type=tx_type, total=total, count=count,
+            ))
+
+    MonthlyRollup.objects.bulk_update(to_update, ['total', 'count'], batch_size=500)
+    MonthlyRollup.objects.filter(pk__in=[r.pk for r in to_update if r.count <= 0]).delete()
+    try:
+        with db_transaction.atomic():
+            MonthlyRollup.objects.bulk_create(to_create)
+    except IntegrityError:
+        # Algum balde foi criado por outro processo: cai no caminho linha a linha
+        for row in to_create:
+            bump(row.user_id, row.account_id, row.category_id, row.month, row.type, row.total, row.count)
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """
+    Recalcula os rollups a partir da tabela de transações.
+    Se 'user_ids' for informado, reconstrói apenas esses usuários.
+    Retorna o número de baldes criados.
+    """
+    transactions = Transaction.objects.all()
+    rollups = MonthlyRollup.objects.all()
+    if user_ids is not None:
+        transactions = transactions.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    rows = (
+        transactions.annotate(month=TruncMonth('date'))
+        .values('user_id', 'account_id', 'category_id', 'month', 'type')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+
+    created = 0
+    with db_transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(MonthlyRollup(**row))
+            if len(batch) >= batch_size:
+                MonthlyRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            MonthlyRollup.objects.bulk_create(batch)
+            created += len(batch)
+
+        if user_ids is None:
+            user_ids = get_user_model().objects.values_list('pk', flat=True)
+        for user_id in user_ids:
+            dashboard_cache.invalidate_on_commit(user_id)
+    return created
+
+
+# --- CONSULTAS USADAS PELO DASHBOARD ---
+
+def month_totals(user, year, month):
+    """ Retorna (receita, despesa) do mês em uma única consulta. """
+    rows = (
+        MonthlyRollup.objects.filter(user=user, month=datetime.date(year, month, 1))
+        .values('type')
+        .annotate(total=Sum('total'))
+        .order_by()
+    )
+    totals = {row['type']: row['total'] for row in rows}
+    return (
+        totals.get('income') or Decimal('0.00'),
+        totals.get('expense') or Decimal('0.00'),
+    )
+
+
+def top_categories(user, year, month, tx_type='expense', limit=5):
+    """ Categorias com maior valor no mês (padrão: Top 5 gastos). """
+    return list(
+        MonthlyRollup.objects.filter(
+            user=user, month=datetime.date(year, month, 1), type=tx_type
+        )
+        .values('category__name')
+        .annotate(total=Sum('total'))
+        .order_by('-total')[:limit]
+    )
+
+
+def year_summary(user, year):
+    """ Receita e despesa de cada mês do ano, em ordem cronológica. """
+    return list(
+        MonthlyRollup.objects.filter(
+            user=user,
+            month__gte=datetime.date(year, 1, 1),
+            month__lt=datetime.date(year + 1, 1, 1),
+        )
+        .values('month')
+        .annotate(
+            total_income=Sum(Case(When(type='income', then=F('total')), default=Decimal('0.0'), output_field=DecimalField())),
+            total_expense=Sum(Case(When(type='expense', then=F('total')), default=Decimal('0.0'), output_field=DecimalField()))
+        )
+        .order_by('month')
+    )
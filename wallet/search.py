@@ -0,0 +1,71 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from .models import Category, search_vector
+
+# --- BUSCA DE TRANSAÇÕES ---
+# A busca combina:
+# - texto completo (português, com radicais) em descrição, observação e forma
+#   de pagamento, com o índice GIN sobre a expressão models.search_vector();
+# - similaridade de trigramas na descrição (erros de digitação, palavras
+#   incompletas), com o índice GIN gin_trgm_ops, se o banco tiver pg_trgm;
+# - o nome da categoria, buscado antes na tabela (pequena) de categorias.
+# Cada condição usa o seu índice e o banco junta os resultados (BitmapOr),
+# sem ler todas as transações do usuário.
+
+CONFIG = 'portuguese'
+# Peso de um resultado cuja categoria casa com a busca
+CATEGORY_WEIGHT = 0.5
+
+_trigram = {}
+
+
+def has_trigram():
+    """ Se a extensão pg_trgm está instalada neste banco (consultado uma vez). """
+    alias = connection.alias
+    if alias not in _trigram:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram[alias] = cursor.fetchone() is not None
+    return _trigram[alias]
+
+
+def _matching_categories(query, user=None):
+    matches = Q(name__icontains=query)
+    if has_trigram():
+        matches |= Q(name__trigram_word_similar=query)
+    categories = Category.objects.filter(matches)
+    if user is not None:
+        categories = categories.filter(user=user)
+    return list(categories.values_list('pk', flat=True))
+
+
+def search(queryset, query, user=None):
+    """
+    Filtra o queryset de transações pela busca e ordena por relevância
+    (anotada como 'rank'), depois por data. 'user' restringe as categorias.
+    """
+    query = query.strip()
+    if not query:
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField())).order_by('-date', '-id')
+
+    ts_query = SearchQuery(query, config=CONFIG, search_type='websearch')
+    matches = Q(search=ts_query)
+    rank = SearchRank(search_vector(), ts_query)
+    if has_trigram():
+        matches |= Q(description__trigram_word_similar=query)
+        rank += TrigramWordSimilarity(query, 'description')
+
+    category_ids = _matching_categories(query, user)
+    if category_ids:
+        matches |= Q(category_id__in=category_ids)
+        rank += Case(
+            When(category_id__in=category_ids, then=Value(CATEGORY_WEIGHT)),
+            default=Value(0.0), output_field=FloatField(),
+        )
+    return (
+        queryset.annotate(search=search_vector())
+        .filter(matches)
+        .annotate(rank=rank)
+        .order_by('-rank', '-date', '-id')
+    )
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 # 1. Importe todos os três modelos
-from .models import Transaction, Account, Category 
+from .models import Transaction, Account, Budget, Category 
 
 class TransactionSerializer(serializers.ModelSerializer):
     """
@@ -26,12 +26,34 @@ class TransactionSerializer(serializers.ModelSerializer):
             'description', 
             'payment_method', 
             'note',
+            'possible_duplicate', # Transação parecida, para revisão (dedup.py)
             'user' # Incluímos o 'user' para referência
         ]
         
         # O 'user' não deve ser definido pelo cliente (React),
         # e sim pela view (baseado na sessão), então é 'read_only'.
-        read_only_fields = ['user']
+        read_only_fields = ['user', 'possible_duplicate']
+
+    def _owned_by_user(self, obj, label):
+        # A conta e a categoria precisam ser do mesmo usuário da transação
+        request = self.context.get('request')
+        if obj is not None and request is not None and obj.user_id != request.user.pk:
+            raise serializers.ValidationError(f'{label} não encontrada.')
+        return obj
+
+    def validate_account(self, value):
+        return self._owned_by_user(value, 'Conta')
+
+    def validate_category(self, value):
+        return self._owned_by_user(value, 'Categoria')
+
+
+class TransactionSearchSerializer(TransactionSerializer):
+    """ Resultado da busca: a transação mais a relevância ('rank'). """
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(TransactionSerializer.Meta):
+        fields = TransactionSerializer.Meta.fields + ['rank']
 
 
 class AccountSerializer(serializers.ModelSerializer):
@@ -55,4 +77,29 @@ class CategorySerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Category
-        fields = ['id', 'name', 'type']
\ No newline at end of file
+        fields = ['id', 'name', 'type']
+
+
+class BudgetSerializer(serializers.ModelSerializer):
+    """
+    Serializa o modelo Budget (limite mensal de uma categoria de despesa).
+    O gasto do mês vem de budgets.status(), não deste serializer.
+    """
+    category_name = serializers.CharField(source='category.name', read_only=True)
+
+    class Meta:
+        model = Budget
+        fields = ['id', 'category', 'category_name', 'amount', 'alert_percent']
+
+    def validate_category(self, value):
+        request = self.context.get('request')
+        if request is not None and value.user_id != request.user.pk:
+            raise serializers.ValidationError('Categoria não encontrada.')
+        if value.type != 'expense':
+            raise serializers.ValidationError('Orçamentos são só para categorias de despesa.')
+        existing = Budget.objects.filter(category=value)
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError('Esta categoria já tem um orçamento.')
+        return value
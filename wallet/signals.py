@@ -1,94 +1,251 @@
-from django.db import models
-from django.db.models.signals import pre_save, post_save, post_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
-from .models import Transaction, Account
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from .models import Transaction, Account, Budget, Category, Tombstone, UserRevision
+from collections import defaultdict
+from contextlib import contextmanager
 from decimal import Decimal
-from django.apps import apps
+from . import balances, budgets, categorizer, ledger, rollups
+from . import cache as dashboard_cache
 
 # --- SINAIS PARA ATUALIZAR O SALDO DA CONTA ---
+# O cálculo e a gravação dos saldos ficam em balances.py (UPDATEs atômicos).
 
-def _get_delta_for(amount, tx_type):
-    """ Helper para calcular o delta (positivo ou negativo) """
-    if tx_type == 'income':
-        return Decimal(amount)
-    elif tx_type == 'expense':
-        return -Decimal(amount)
-    return Decimal('0.00')
+_OLD_FIELDS = ('amount', 'account_id', 'type', 'category_id', 'date', 'description', 'payment_method')
 
 @receiver(pre_save, sender=Transaction)
 def tx_pre_save(sender, instance, **kwargs):
     """
     Antes de salvar, armazena os valores antigos (se for uma atualização)
     para que possamos reverter o saldo antigo corretamente.
+    A linha é travada (select_for_update) até o fim do save, que é atômico,
+    para que duas edições simultâneas da mesma transação não se cruzem.
     """
+    old = None
     if instance.pk:
-        try:
-            old_tx = Transaction.objects.get(pk=instance.pk)
-            instance._old_amount = old_tx.amount
-            instance._old_account_id = old_tx.account_id
-            instance._old_type = old_tx.type
-        except Transaction.DoesNotExist:
-            # Objeto está sendo criado, mas tem um PK? (raro)
-            instance._old_amount = None
-            instance._old_account_id = None
-            instance._old_type = None
-    else:
-        # Objeto está sendo criado
-        instance._old_amount = None
-        instance._old_account_id = None
-        instance._old_type = None
+        # Uma única consulta, trazendo só as colunas necessárias
+        old = (
+            Transaction.objects.select_for_update()
+            .filter(pk=instance.pk)
+            .values(*_OLD_FIELDS)
+            .first()
+        )
+
+    # 'old' é None quando o objeto está sendo criado
+    for field in _OLD_FIELDS:
+        setattr(instance, f'_old_{field}', old[field] if old else None)
 
 @receiver(post_save, sender=Transaction)
 def tx_post_save(sender, instance, created, **kwargs):
     """
     Após salvar, atualiza os saldos das contas (novas ou antigas).
     """
-    
-    new_delta = _get_delta_for(instance.amount, instance.type)
-    
-    if created:
+    if created or instance._old_amount is None:
         # Transação nova, apenas aplica o delta na conta
-        acc = instance.account
-        acc.balance = (acc.balance or Decimal('0.00')) + new_delta
-        acc.save(update_fields=['balance'])
-    
+        balances.post(instance.account_id, instance.amount, instance.type)
+        ledger.post(instance.account_id, instance.date, instance.amount, instance.type)
     else:
-        # Transação existente (atualização)
-        old_delta = _get_delta_for(instance._old_amount or '0.00', instance._old_type or instance.type)
-        
-        if instance._old_account_id == instance.account_id:
-            # 1. Conta é a mesma, apenas ajusta a diferença
-            acc = instance.account
-            acc.balance = (acc.balance or Decimal('0.00')) - old_delta + new_delta
-            acc.save(update_fields=['balance'])
-        
-        else:
-            # 2. Conta mudou! Reverte na conta antiga, aplica na nova.
-            # Reverte na conta antiga
-            if instance._old_account_id:
-                try:
-                    old_acc = Account.objects.get(pk=instance._old_account_id)
-                    old_acc.balance = (old_acc.balance or Decimal('0.00')) - old_delta
-                    old_acc.save(update_fields=['balance'])
-                except Account.DoesNotExist:
-                    pass # Conta antiga foi deletada?
-            
-            # Aplica na conta nova
-            acc = instance.account
-            acc.balance = (acc.balance or Decimal('0.00')) + new_delta
-            acc.save(update_fields=['balance'])
+        # Transação existente (atualização): reverte o valor antigo e aplica
+        # o novo, na mesma conta ou em contas diferentes.
+        balances.repost(
+            instance._old_account_id, instance._old_amount, instance._old_type,
+            instance.account_id, instance.amount, instance.type,
+        )
+        ledger.repost(
+            instance._old_account_id, instance._old_date, instance._old_amount, instance._old_type,
+            instance.account_id, instance.date, instance.amount, instance.type,
+        )
+
+    _update_rollups(instance, created)
+    _update_budgets(instance, created)
+    _update_categorizer(instance, created)
+    dashboard_cache.invalidate_on_commit(instance.user_id)
+
+def _update_rollups(instance, created):
+    """
+    Mantém a tabela MonthlyRollup em dia: retira a transação do balde antigo
+    (se for uma atualização) e soma no balde novo.
+    """
+    new_amount = Decimal(instance.amount)
+    new_key = (
+        instance.account_id, instance.category_id,
+        rollups.month_start(instance.date), instance.type,
+    )
+
+    if not created and instance._old_amount is not None:
+        old_key = (
+            instance._old_account_id, instance._old_category_id,
+            rollups.month_start(instance._old_date), instance._old_type,
+        )
+        if old_key == new_key:
+            # Mesmo balde: aplica só a diferença
+            rollups.bump(instance.user_id, *new_key, new_amount - instance._old_amount, 0)
+            return
+        rollups.bump(instance.user_id, *old_key, -instance._old_amount, -1)
+
+    rollups.bump(instance.user_id, *new_key, new_amount, 1)
+
+def _update_budgets(instance, created):
+    """
+    Atualiza o gasto do mês nos orçamentos: retira a despesa antiga (se for
+    uma atualização) e soma a nova. Tudo vai em uma única chamada.
+    """
+    entries = defaultdict(Decimal)
+    if not created and instance._old_amount is not None:
+        entries[(instance._old_category_id, budgets.month_start(instance._old_date))] -= (
+            budgets.expense_delta(instance._old_amount, instance._old_type)
+        )
+    entries[(instance.category_id, budgets.month_start(instance.date))] += (
+        budgets.expense_delta(instance.amount, instance.type)
+    )
+    budgets.apply(entries)
+
+_LEARNED_FIELDS = ('category_id', 'type', 'description', 'payment_method', 'amount')
+
+def _learned(tx, prefix=''):
+    """ (tokens, category_id, type) de uma transação, para o categorizador. """
+    values = {field: getattr(tx, prefix + field) for field in _LEARNED_FIELDS}
+    tokens = categorizer.features(values['description'], values['payment_method'], values['amount'])
+    return tokens, values['category_id'], values['type']
+
+def _update_categorizer(instance, created):
+    """
+    Ensina ao modelo de categorização a transação nova ou a correção
+    (ex.: o usuário trocou a categoria sugerida).
+    """
+    if created or instance._old_amount is None:
+        categorizer.observe(instance.user_id, added=[_learned(instance)])
+        return
+    old = _learned(instance, '_old_')
+    new = _learned(instance)
+    if old != new:
+        categorizer.observe(instance.user_id, added=[new], removed=[old])
 
 @receiver(post_delete, sender=Transaction)
-def tx_post_delete(sender, instance, **kwargs):
+def tx_post_delete(sender, instance, origin=None, **kwargs):
     """
     Após deletar uma transação, reverte o valor na conta.
+    Se ela foi apagada em cascata com a conta, o saldo, o livro-razão e os
+    resumos da conta vão junto: lançar o estorno no livro recriaria linhas
+    de uma conta que está sendo apagada.
+    """
+    if _origin_model(origin) is not Account:
+        balances.reverse(instance.account_id, instance.amount, instance.type)
+        ledger.reverse(instance.account_id, instance.date, instance.amount, instance.type)
+        rollups.bump(
+            instance.user_id, instance.account_id, instance.category_id,
+            instance.date, instance.type, -Decimal(instance.amount), -1,
+        )
+    budgets.apply({
+        (instance.category_id, instance.date): -budgets.expense_delta(instance.amount, instance.type),
+    })
+    categorizer.observe(instance.user_id, removed=[_learned(instance)])
+    dashboard_cache.invalidate_on_commit(instance.user_id)
+
+def _origin_model(origin):
+    """ Modelo cuja exclusão (instância ou QuerySet) disparou a cascata. """
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+# --- SINAIS PARA INVALIDAR O CACHE DO DASHBOARD ---
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def settings_changed(sender, instance, **kwargs):
+    """
+    Contas (nome/saldo) e categorias (nome) aparecem no dashboard:
+    qualquer alteração descarta o cache do usuário.
+    """
+    dashboard_cache.invalidate_on_commit(instance.user_id)
+
+@receiver(post_save, sender=Budget)
+def budget_saved(sender, instance, **kwargs):
+    """
+    Um orçamento novo (ou com outra categoria) precisa dos contadores dos
+    meses que já têm despesas: recalcula os dele a partir das transações.
+    """
+    budgets.rebuild(budget_ids=[instance.pk])
+    dashboard_cache.invalidate_on_commit(instance.user_id)
+
+@receiver(post_delete, sender=Budget)
+def budget_deleted(sender, instance, **kwargs):
+    dashboard_cache.invalidate_on_commit(instance.user_id)
+
+
+# --- TOMBSTONES PARA A SINCRONIZAÇÃO ---
+
+@receiver(pre_delete, sender=Transaction)
+@receiver(pre_delete, sender=Account)
+@receiver(pre_delete, sender=Category)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Registra a exclusão com uma revisão nova. Roda no pre_delete para que a
+    revisão seja reservada antes do estorno do saldo (post_delete), que grava
+    na conta a revisão atual do usuário.
+    """
+    if _origin_model(origin) is get_user_model():
+        # O próprio usuário está sendo apagado: não há cliente para avisar
+        return
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        model=sender._meta.model_name,
+        object_id=instance.pk,
+        revision=UserRevision.reserve(instance.user_id),
+    )
+
+
+# --- GRAVAÇÕES EM LOTE ---
+
+def post_bulk_create(transactions):
+    """
+    Equivalente em lote do tx_post_save, para transações criadas com
+    bulk_create (que não dispara sinais). Os deltas são somados antes,
+    resultando em um UPDATE por conta e um por balde de resumo.
+    Deve ser chamado dentro do mesmo transaction.atomic() do bulk_create.
+    """
+    account_deltas = defaultdict(Decimal)
+    ledger_entries = defaultdict(Decimal)
+    buckets = defaultdict(lambda: [Decimal('0.00'), 0])
+    budget_entries = defaultdict(Decimal)
+
+    for tx in transactions:
+        delta = balances.delta_for(tx.amount, tx.type)
+        account_deltas[tx.account_id] += delta
+        ledger_entries[(tx.account_id, tx.date)] += delta
+        bucket = buckets[(
+            tx.user_id, tx.account_id, tx.category_id,
+            rollups.month_start(tx.date), tx.type,
+        )]
+        bucket[0] += Decimal(tx.amount)
+        bucket[1] += 1
+        budget_entries[(tx.category_id, budgets.month_start(tx.date))] += budgets.expense_delta(tx.amount, tx.type)
+
+    balances.apply_deltas(account_deltas)
+    ledger.apply(ledger_entries)
+    rollups.bump_many(buckets)
+    budgets.apply(budget_entries)
+
+    learned = defaultdict(list)
+    for tx in transactions:
+        learned[tx.user_id].append(_learned(tx))
+    with categorizer.deferred():
+        for user_id, added in learned.items():
+            categorizer.observe(user_id, added=added)
+            dashboard_cache.invalidate_on_commit(user_id)
+
+
+@contextmanager
+def batched_postings():
+    """
+    Agrupa os efeitos dos sinais de várias gravações: os saldos recebem um
+    UPDATE por conta, os resumos um por balde e o livro-razão é recalculado
+    uma vez por conta, tudo aplicado ao sair do bloco. Os orçamentos são
+    lidos uma vez por lote, e o modelo do categorizador é atualizado uma vez
+    por usuário no COMMIT.
+    Use dentro de um transaction.atomic().
     """
-    delta_to_reverse = _get_delta_for(instance.amount, instance.type)
-    
-    try:
-        acc = instance.account
-        acc.balance = (acc.balance or Decimal('0.00')) - delta_to_reverse
-        acc.save(update_fields=['balance'])
-    except Account.DoesNotExist:
-        # A conta pode não existir mais, tudo bem.
-        pass
\ No newline at end of file
+    # O livro sai por último: o UPDATE de saldo trava as contas antes dele
+    with ledger.deferred(), budgets.deferred(), balances.deferred(), rollups.deferred(), categorizer.deferred():
+        yield
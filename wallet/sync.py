@@ -0,0 +1,75 @@
+from rest_framework.exceptions import ValidationError
+from .models import Account, Category, Transaction, Tombstone, UserRevision
+from .serializers import AccountSerializer, CategorySerializer, TransactionSerializer
+
+# --- SINCRONIZAÇÃO INCREMENTAL ---
+# O cliente guarda o token (a última revisão que recebeu) e pede só o que
+# mudou depois dele: custo proporcional às mudanças, não ao histórico.
+# Contas e categorias são poucas e vêm sempre inteiras no intervalo; as
+# transações e as exclusões são limitadas a 'limit' linhas por resposta.
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+def parse_params(params):
+    """ Lê 'since' (token) e 'limit' da query string. """
+    try:
+        since = int(params.get('since') or 0)
+        limit = int(params.get('limit') or DEFAULT_LIMIT)
+    except ValueError:
+        raise ValidationError({'since': 'Token inválido.'})
+    if since < 0 or limit < 1:
+        raise ValidationError({'since': 'Token inválido.'})
+    return since, min(limit, MAX_LIMIT)
+
+
+def _nth_revision(queryset, since, limit):
+    """ Revisão da linha número 'limit' depois de 'since', ou None se houver menos. """
+    return (
+        queryset.filter(revision__gt=since)
+        .order_by('revision')
+        .values_list('revision', flat=True)[limit - 1:limit]
+        .first()
+    )
+
+
+def changes(user, since=0, limit=DEFAULT_LIMIT):
+    """
+    Linhas alteradas e apagadas com since < revisão <= token. Se o cliente
+    estiver mais à frente que o servidor (ex.: banco restaurado), devolve
+    tudo de novo com 'reset' = True para que ele descarte a cópia local.
+    """
+    # O contador é lido antes das linhas: tudo com revisão <= current já foi
+    # gravado (a revisão é reservada e travada na mesma transação da gravação).
+    current = UserRevision.current(user.pk)
+    reset = since > current
+    if reset:
+        since = 0
+
+    transactions = Transaction.objects.filter(user=user)
+    tombstones = Tombstone.objects.filter(user=user)
+    upto = current
+    for queryset in (transactions, tombstones):
+        nth = _nth_revision(queryset, since, limit)
+        if nth is not None:
+            upto = min(upto, nth)
+
+    def changed(queryset):
+        return queryset.filter(revision__gt=since, revision__lte=upto).order_by('revision')
+
+    deleted = {'account': [], 'category': [], 'transaction': []}
+    for model, object_id in changed(tombstones).values_list('model', 'object_id'):
+        deleted[model].append(object_id)
+
+    return {
+        'token': str(upto),
+        'has_more': upto < current,
+        'reset': reset,
+        'accounts': AccountSerializer(changed(Account.objects.filter(user=user)), many=True).data,
+        'categories': CategorySerializer(changed(Category.objects.filter(user=user)), many=True).data,
+        'transactions': TransactionSerializer(
+            changed(transactions).select_related('category'), many=True,
+        ).data,
+        'deleted': deleted,
+    }
@@ -1,3 +1,1434 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.http import QueryDict
+from django.urls import reverse
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import datetime
+import importlib.util
+import io
+import unittest
+from .forms import ExpenseForm
+from .models import Account, Budget, BudgetUsage, Category, CategoryRule, Transaction, MonthlyRollup, Tombstone, DailyBalance, RecurringRule
+from . import analytics, budgets, categorizer, dedup, filters, importers, ledger, metrics, partitions, recurring, replicas, rollups, search, signals
+from . import cache as dashboard_cache
 
-# Create your tests here.
+User = get_user_model()
+
+
+def make_user_data(username='ana'):
+    """ Cria um usuário com uma conta e uma categoria de cada tipo. """
+    user = User.objects.create_user(username=username, password='senha-teste')
+    account = Account.objects.create(user=user, name='Carteira', balance=Decimal('100.00'))
+    expense = Category.objects.create(user=user, name='Mercado', type='expense')
+    income = Category.objects.create(user=user, name='Salário', type='income')
+    return user, account, expense, income
+
+
+class BalanceSignalsTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.other = Account.objects.create(user=self.user, name='Banco', balance=Decimal('0.00'))
+
+    def balance(self, account):
+        account.refresh_from_db()
+        return account.balance
+
+    def test_create_update_move_and_delete(self):
+        tx = Transaction.objects.create(
+            user=self.user, account=self.account, category=self.expense,
+            type='expense', amount=Decimal('30.00'), date=datetime.date(2025, 1, 10),
+        )
+        self.assertEqual(self.balance(self.account), Decimal('70.00'))
+
+        tx.amount = Decimal('45.00')
+        tx.save()
+        self.assertEqual(self.balance(self.account), Decimal('55.00'))
+
+        tx.account = self.other
+        tx.save()
+        self.assertEqual(self.balance(self.account), Decimal('100.00'))
+        self.assertEqual(self.balance(self.other), Decimal('-45.00'))
+
+        tx.delete()
+        self.assertEqual(self.balance(self.other), Decimal('0.00'))
+
+    def test_stale_instances_do_not_overwrite_balance(self):
+        # Cada transação guarda a mesma instância (desatualizada) da conta
+        for _ in range(3):
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=self.income,
+                type='income', amount=Decimal('10.00'),
+            )
+        self.assertEqual(self.balance(self.account), Decimal('130.00'))
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.other = Category.objects.create(user=self.user, name='Farmácia', type='expense')
+
+    def buckets(self):
+        return {
+            (r.category_id, r.month, r.type): (r.total, r.count)
+            for r in MonthlyRollup.objects.filter(user=self.user)
+        }
+
+    def test_signals_follow_create_update_and_delete(self):
+        jan, feb = datetime.date(2025, 1, 1), datetime.date(2025, 2, 1)
+        tx = Transaction.objects.create(
+            user=self.user, account=self.account, category=self.expense,
+            type='expense', amount=Decimal('30.00'), date=datetime.date(2025, 1, 10),
+        )
+        Transaction.objects.create(
+            user=self.user, account=self.account, category=self.expense,
+            type='expense', amount=Decimal('5.00'), date=datetime.date(2025, 1, 20),
+        )
+        self.assertEqual(self.buckets(), {(self.expense.pk, jan, 'expense'): (Decimal('35.00'), 2)})
+
+        # Mesmo balde: só a diferença
+        tx.amount = Decimal('40.00')
+        tx.save()
+        self.assertEqual(self.buckets(), {(self.expense.pk, jan, 'expense'): (Decimal('45.00'), 2)})
+
+        # Outro mês
+        tx.date = datetime.date(2025, 2, 3)
+        tx.save()
+        self.assertEqual(self.buckets(), {
+            (self.expense.pk, jan, 'expense'): (Decimal('5.00'), 1),
+            (self.expense.pk, feb, 'expense'): (Decimal('40.00'), 1),
+        })
+
+        # Outra categoria: o balde que ficou vazio some
+        tx.category = self.other
+        tx.save()
+        self.assertEqual(self.buckets(), {
+            (self.expense.pk, jan, 'expense'): (Decimal('5.00'), 1),
+            (self.other.pk, feb, 'expense'): (Decimal('40.00'), 1),
+        })
+
+        tx.delete()
+        self.assertEqual(self.buckets(), {(self.expense.pk, jan, 'expense'): (Decimal('5.00'), 1)})
+
+    def test_rebuild_matches_incremental_updates(self):
+        for day, category, amount in ((3, self.expense, '12.00'), (15, self.other, '8.50'), (40, self.expense, '20.00')):
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=category, type='expense',
+                amount=Decimal(amount), date=datetime.date(2025, 1, 1) + datetime.timedelta(days=day),
+            )
+        salary = Transaction.objects.create(
+            user=self.user, account=self.account, category=self.income,
+            type='income', amount=Decimal('1000.00'), date=datetime.date(2025, 1, 5),
+        )
+        salary.date = datetime.date(2025, 3, 5)
+        salary.save()
+        Transaction.objects.filter(category=self.other).first().delete()
+
+        incremental = self.buckets()
+        self.assertEqual(rollups.rebuild(user_ids=[self.user.pk]), len(incremental))
+        self.assertEqual(self.buckets(), incremental)
+
+        call_command('rebuild_rollups', stdout=io.StringIO())
+        self.assertEqual(self.buckets(), incremental)
+
+
+class ImporterTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+
+    def test_csv_import_posts_balance_and_rollups_per_batch(self):
+        csv_file = io.BytesIO(
+            'data;valor;descricao;categoria\n'
+            '05/01/2025;-1.234,50;Aluguel;Moradia\n'
+            '06/01/2025;3000,00;Pagamento;Salário\n'
+            'ontem;10,00;Data ruim;Mercado\n'
+            '07/02/2025;-20,00;Feira;Mercado\n'.encode('utf-8')
+        )
+        importer = importers.import_file(self.user, csv_file, 'csv', account=self.account, chunk_size=2)
+
+        self.assertEqual(importer.created, 3)
+        self.assertEqual([e['line'] for e in importer.errors], [4])
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('100.00') - Decimal('1234.50') + 3000 - 20)
+        # 'Salário' já existia como receita; 'Moradia' foi criada
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            MonthlyRollup.objects.get(user=self.user, category=self.expense).total,
+            Decimal('20.00'),
+        )
+
+    def test_ofx_import(self):
+        ofx = io.BytesIO(
+            b'<OFX><BANKTRANLIST>'
+            b'<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250105120000[-3:BRT]<TRNAMT>-45.90<NAME>PADARIA</STMTTRN>'
+            b'<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250106<TRNAMT>1000.00<MEMO>SALARIO</STMTTRN>'
+            b'</BANKTRANLIST></OFX>'
+        )
+        importer = importers.import_file(self.user, ofx, 'ofx', account=self.account)
+
+        self.assertEqual(importer.created, 2)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('1054.10'))
+
+    def test_amount_separators(self):
+        # O último separador é o decimal, no formato brasileiro e no americano
+        for value, expected in (
+            ('1.234,56', '1234.56'), ('1,234.56', '1234.56'), ('-1.234.567,8', '-1234567.80'),
+            ('R$ 1,234,567.89', '1234567.89'), ('12,5', '12.50'), ('1.234.567', '1234567.00'),
+        ):
+            self.assertEqual(importers.parse_amount(value), Decimal(expected), value)
+        for value in ('1,2.50', '12.34.56', '1.2345,00'):
+            with self.assertRaises(importers.StatementFormatError):
+                importers.parse_amount(value)
+
+
+class ListQueryCountTests(TestCase):
+    """
+    As listagens devem fazer o mesmo número de consultas por página,
+    não importa quantas transações a página tenha (sem N+1).
+    """
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.client.force_login(self.user)
+
+    def add_transactions(self, n):
+        start = Transaction.objects.count()
+        for i in range(start, start + n):
+            category = Category.objects.create(user=self.user, name=f'Cat {i}', type='expense')
+            account = Account.objects.create(user=self.user, name=f'Conta {i}')
+            Transaction.objects.create(
+                user=self.user, account=account, category=category,
+                type='expense', amount=Decimal('1.00'),
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url, expected):
+        self.add_transactions(2)
+        small = self.count_queries(url)
+        self.add_transactions(13)
+        full = self.count_queries(url)
+        self.assertEqual(small, full)
+        self.assertEqual(full, expected)
+
+    def test_html_list(self):
+        # sessão + usuário + página (a paginação por cursor não faz COUNT)
+        # + facetas dos filtros (uma consulta com GROUPING SETS)
+        self.assertConstantQueries(reverse('wallet:transaction_list'), 4)
+
+    def test_api_list(self):
+        # sessão + usuário + listagem
+        self.assertConstantQueries(reverse('wallet:api:api_transactions_list'), 3)
+
+    def test_api_list_fields(self):
+        self.add_transactions(1)
+        row = self.client.get(reverse('wallet:api:api_transactions_list')).json()['results'][0]
+        self.assertEqual(row['category_name'], 'Cat 0')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.client.force_login(self.user)
+        # Várias transações no mesmo dia, para testar o desempate por id
+        for i in range(7):
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=self.expense,
+                type='expense', amount=Decimal('1.00'),
+                date=datetime.date(2025, 1, 1) + datetime.timedelta(days=i // 3),
+            )
+        self.expected = list(
+            Transaction.objects.filter(user=self.user).order_by('-date', '-id').values_list('id', flat=True)
+        )
+
+    def test_api_walks_forward_and_back(self):
+        url = reverse('wallet:api:api_transactions_list') + '?page_size=3'
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([row['id'] for row in data['results']])
+            url = data['next']
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+
+        # Volta da última página para a primeira
+        url = data['previous']
+        back = []
+        while url:
+            data = self.client.get(url).json()
+            back.insert(0, [row['id'] for row in data['results']])
+            url = data['previous']
+        self.assertEqual(back, pages[:-1])
+
+    def test_html_list_uses_cursor(self):
+        url = reverse('wallet:transaction_list')
+        response = self.client.get(url)
+        page = response.context['page']
+        self.assertEqual([t.pk for t in response.context['transaction']], self.expected[:7])
+        self.assertFalse(page.has_next)
+        self.assertEqual(self.client.get(url + '?cursor=lixo').status_code, 404)
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.client.force_login(self.user)
+        self.url = reverse('wallet:dashboard') + '?year=2025&month=3'
+
+    def add_expense(self, amount):
+        # Os sinais invalidam o cache no COMMIT
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=self.expense,
+                type='expense', amount=Decimal(amount), date=datetime.date(2025, 3, 10),
+            )
+
+    def test_hit_after_miss_and_invalidation_on_write(self):
+        self.add_expense('10.00')
+        before = dashboard_cache.stats()
+
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url)
+        after = dashboard_cache.stats()
+
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(first.context['monthly_expense'], second.context['monthly_expense'])
+        # Com o cache, só sessão e usuário vão ao banco
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+        self.add_expense('5.00')
+        third = self.client.get(self.url)
+        self.assertEqual(third.context['monthly_expense'], Decimal('15.00'))
+        self.assertEqual(third.context['total_balance'], Decimal('85.00'))
+
+    def test_reconcile_fix_invalidates(self):
+        Account.objects.filter(pk=self.account.pk).update(balance=Decimal('500.00'))
+        self.assertEqual(self.client.get(self.url).context['total_balance'], Decimal('500.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_balances', '--fix', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(self.client.get(self.url).context['total_balance'], Decimal('100.00'))
+
+
+class ReportAPITests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.client.force_login(self.user)
+        for day, category, tx_type, amount in [
+            (datetime.date(2025, 1, 5), self.income, 'income', '1000.00'),
+            (datetime.date(2025, 1, 20), self.expense, 'expense', '300.00'),
+            (datetime.date(2025, 2, 3), self.expense, 'expense', '200.00'),
+        ]:
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=category,
+                type=tx_type, amount=Decimal(amount), date=day,
+            )
+
+    def get(self, name, **params):
+        return self.client.get(reverse(f'wallet:api:{name}'), params)
+
+    def test_monthly_from_rollup_and_daily_from_transactions(self):
+        monthly = self.get('api_reports_monthly', start='2025-01-01', end='2025-03-01').json()['data']
+        self.assertEqual(monthly, {
+            'period': ['2025-01-01', '2025-02-01'],
+            'income': [1000.0, 0.0],
+            'expense': [300.0, 200.0],
+        })
+        daily = self.get('api_reports_monthly', start='2025-01-10', end='2025-02-10', granularity='day').json()['data']
+        self.assertEqual(daily['period'], ['2025-01-20', '2025-02-03'])
+
+    def test_by_category_and_cashflow(self):
+        by_category = self.get('api_reports_by_category', start='2025-01-01', end='2025-03-01', type='expense').json()['data']
+        self.assertEqual(by_category['category'], ['Mercado'])
+        self.assertEqual(by_category['total'], [500.0])
+
+        cashflow = self.get('api_reports_cashflow', start='2025-01-01', end='2025-03-01').json()['data']
+        self.assertEqual(cashflow['net'], [700.0, -200.0])
+        self.assertEqual(cashflow['cumulative'], [700.0, 500.0])
+
+    def test_etag_returns_304_until_data_changes(self):
+        first = self.get('api_reports_cashflow', start='2025-01-01', end='2025-03-01')
+        etag = first['ETag']
+        again = self.client.get(
+            reverse('wallet:api:api_reports_cashflow'),
+            {'start': '2025-01-01', 'end': '2025-03-01'},
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(again.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=self.expense,
+                type='expense', amount=Decimal('1.00'), date=datetime.date(2025, 2, 4),
+            )
+        changed = self.client.get(
+            reverse('wallet:api:api_reports_cashflow'),
+            {'start': '2025-01-01', 'end': '2025-03-01'},
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_etag_follows_the_resolved_default_window(self):
+        # Sem parâmetros, o ETag é o do intervalo padrão resolvido: quando o
+        # mês vira, o intervalo e o ETag mudam, mesmo sem gravações novas
+        url = reverse('wallet:api:api_reports_cashflow')
+        default = self.client.get(url)
+        window = {'start': default.json()['start'], 'end': default.json()['end']}
+        self.assertEqual(self.client.get(url, window)['ETag'], default['ETag'])
+        moved = {'start': '2025-02-01', 'end': window['end']}
+        self.assertNotEqual(self.client.get(url, moved)['ETag'], default['ETag'])
+
+    def test_invalid_params(self):
+        self.assertEqual(self.get('api_reports_monthly', granularity='hour').status_code, 400)
+        self.assertEqual(self.get('api_reports_monthly', start='2025-02-01', end='2025-01-01').status_code, 400)
+
+
+class BatchAPITests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.client.force_login(self.user)
+        self.url = reverse('wallet:api:api_transactions_batch')
+
+    def make_tx(self, amount):
+        return Transaction.objects.create(
+            user=self.user, account=self.account, category=self.expense,
+            type='expense', amount=Decimal(amount), date=datetime.date(2025, 1, 10),
+        )
+
+    def post(self, operations, **headers):
+        return self.client.post(self.url, {'operations': operations}, content_type='application/json', **headers)
+
+    def create_op(self, amount):
+        return {'op': 'create', 'data': {
+            'account': self.account.pk, 'category': self.expense.pk, 'type': 'expense',
+            'amount': amount, 'date': '2025-01-15', 'description': 'Lote',
+        }}
+
+    def test_mixed_batch_updates_each_balance_once(self):
+        edited, removed = self.make_tx('10.00'), self.make_tx('5.00')  # saldo: 85
+        operations = [
+            self.create_op('20.00'),
+            self.create_op('30.00'),
+            {'op': 'update', 'id': edited.pk, 'data': {'amount': '15.00'}},
+            {'op': 'delete', 'id': removed.pk},
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post(operations)
+        self.assertEqual(response.status_code, 200)
+        statuses = [item['status'] for item in response.json()['results']]
+        self.assertEqual(statuses, [201, 201, 200, 204])
+
+        # 100 - 20 - 30 - 15 = 35
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('35.00'))
+        balance_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "wallet_account"')]
+        self.assertEqual(len(balance_updates), 1)
+        rollup = MonthlyRollup.objects.get(user=self.user, type='expense')
+        self.assertEqual((rollup.total, rollup.count), (Decimal('65.00'), 3))
+
+    def test_duplicate_creates_are_skipped_unless_forced(self):
+        first = self.post([self.create_op('20.00')]).json()['results'][0]
+        response = self.post([self.create_op('20.00'), self.create_op('7.00')])
+        self.assertEqual(response.status_code, 200)
+        skipped, created = response.json()['results']
+        self.assertEqual((skipped['status'], skipped['duplicate_of']), (409, first['id']))
+        self.assertEqual(created['status'], 201)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('73.00'))
+
+        self.client.post(
+            self.url + '?force=1', {'operations': [self.create_op('20.00')]}, content_type='application/json',
+        )
+        self.assertEqual(Transaction.objects.filter(amount=Decimal('20.00')).count(), 2)
+
+    def test_invalid_item_rejects_whole_batch(self):
+        other_user, other_account, _, _ = make_user_data('bia')
+        operations = [
+            self.create_op('20.00'),
+            {'op': 'create', 'data': {**self.create_op('1.00')['data'], 'account': other_account.pk}},
+            {'op': 'delete', 'id': 999999},
+        ]
+        response = self.post(operations)
+        self.assertEqual(response.status_code, 400)
+        statuses = [item['status'] for item in response.json()['results']]
+        self.assertEqual(statuses, [200, 400, 404])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_idempotency_key_replays_response(self):
+        first = self.post([self.create_op('20.00')], HTTP_IDEMPOTENCY_KEY='abc')
+        again = self.post([self.create_op('20.00')], HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+        self.assertEqual(Transaction.objects.count(), 1)
+
+        reused = self.post([self.create_op('99.00')], HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(reused.status_code, 422)
+
+
+class SyncAPITests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.client.force_login(self.user)
+
+    def sync(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        return self.client.get(reverse('wallet:api:api_sync'), params).json()
+
+    def make_tx(self, amount='10.00'):
+        return Transaction.objects.create(
+            user=self.user, account=self.account, category=self.expense,
+            type='expense', amount=Decimal(amount), date=datetime.date(2025, 1, 10),
+        )
+
+    def test_returns_only_changes_since_token(self):
+        first = self.make_tx()
+        full = self.sync()
+        self.assertEqual([t['id'] for t in full['transactions']], [first.pk])
+        self.assertEqual(len(full['categories']), 2)
+
+        # Nada mudou: resposta vazia
+        self.assertEqual(self.sync(full['token'])['transactions'], [])
+
+        second = self.make_tx('5.00')
+        first_pk = first.pk
+        first.delete()
+        delta = self.sync(full['token'])
+        self.assertEqual([t['id'] for t in delta['transactions']], [second.pk])
+        self.assertEqual(delta['deleted']['transaction'], [first_pk])
+        self.assertEqual(delta['categories'], [])
+        # O saldo mudou, então a conta vem junto
+        self.assertEqual(delta['accounts'][0]['balance'], '95.00')
+
+    def test_pages_with_limit(self):
+        for _ in range(5):
+            self.make_tx()
+        token, seen = 0, []
+        while True:
+            page = self.sync(token, limit=2)
+            seen += [t['id'] for t in page['transactions']]
+            token = page['token']
+            if not page['has_more']:
+                break
+        self.assertEqual(sorted(seen), sorted(Transaction.objects.values_list('pk', flat=True)))
+
+    def test_deleting_user_skips_tombstones(self):
+        self.user.delete()
+        self.assertFalse(Tombstone.objects.exists())
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.client.force_login(self.user)
+
+    def make_tx(self, day, amount, category=None):
+        category = category or self.expense
+        return Transaction.objects.create(
+            user=self.user, account=self.account, category=category,
+            type=category.type, amount=Decimal(amount), date=day,
+        )
+
+    def balance_on(self, day):
+        self.account.refresh_from_db()
+        return ledger.balance_at(self.account, day)
+
+    def test_point_in_time_balance_with_back_dated_edits(self):
+        jan, feb, mar = datetime.date(2025, 1, 10), datetime.date(2025, 2, 10), datetime.date(2025, 3, 10)
+        self.make_tx(jan, '500.00', self.income)
+        self.make_tx(mar, '50.00')
+        edited = self.make_tx(mar, '30.00')
+        self.assertEqual(self.balance_on(datetime.date(2025, 1, 1)), Decimal('100.00'))
+        self.assertEqual(self.balance_on(feb), Decimal('600.00'))
+        self.assertEqual(self.balance_on(mar), Decimal('520.00'))
+
+        # Retroativa: move a despesa de março para fevereiro
+        edited.date = feb
+        edited.save()
+        self.assertEqual(self.balance_on(feb), Decimal('570.00'))
+        self.assertEqual(self.balance_on(mar), Decimal('520.00'))
+
+        edited.delete()
+        self.assertEqual(self.balance_on(feb), Decimal('600.00'))
+        self.assertEqual(self.balance_on(mar), Decimal('550.00'))
+
+        # A reconstrução chega ao mesmo livro (sem os dias que ficaram zerados)
+        rows = DailyBalance.objects.exclude(delta=0).order_by('date').values_list('date', 'cumulative')
+        before = list(rows)
+        ledger.rebuild(account_ids=[self.account.pk])
+        self.assertEqual(list(rows), before)
+
+    def test_balance_history_endpoint(self):
+        self.make_tx(datetime.date(2025, 1, 10), '500.00', self.income)
+        self.make_tx(datetime.date(2025, 1, 20), '40.00')
+        self.make_tx(datetime.date(2025, 2, 5), '60.00')
+        response = self.client.get(reverse('wallet:api:api_reports_balance_history'), {
+            'account': self.account.pk, 'start': '2025-01-15', 'end': '2025-03-01', 'granularity': 'month',
+        })
+        data = response.json()['data']
+        self.assertEqual(data['opening'], 600.0)
+        self.assertEqual(data['period'], ['2025-01-01', '2025-02-01'])
+        self.assertEqual(data['balance'], [560.0, 500.0])
+
+        point = self.client.get(
+            reverse('wallet:api:api_account_balance', args=[self.account.pk]), {'date': '2025-01-31'}
+        )
+        self.assertEqual(point.json()['balance'], 560.0)
+
+    def test_deleting_account_with_transactions(self):
+        self.make_tx(datetime.date(2025, 1, 10), '500.00', self.income)
+        self.make_tx(datetime.date(2025, 1, 20), '40.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('wallet:account_delete', args=[self.account.pk]))
+        self.assertEqual(response.status_code, 302)
+        # As chaves estrangeiras são DEFERRABLE: confere como no COMMIT
+        connection.check_constraints()
+        self.assertFalse(DailyBalance.objects.exists())
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+
+class ReconcileBalancesTests(TestCase):
+    def test_reports_and_fixes_drift(self):
+        user, account, expense, _ = make_user_data()
+        Transaction.objects.create(
+            user=user, account=account, category=expense, type='expense',
+            amount=Decimal('30.00'), date=datetime.date(2025, 1, 10),
+        )
+        # Gravação sem sinais: o saldo fica errado
+        Account.objects.filter(pk=account.pk).update(balance=Decimal('10.00'))
+
+        out = io.StringIO()
+        call_command('reconcile_balances', stdout=out, stderr=io.StringIO())
+        self.assertIn('diferença +60.00', out.getvalue())
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal('10.00'))
+
+        # Um cliente que já sincronizou recebe a conta corrigida
+        self.client.force_login(user)
+        token = self.client.get(reverse('wallet:api:api_sync')).json()['token']
+        call_command('reconcile_balances', '--fix', stdout=io.StringIO(), stderr=io.StringIO())
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal('70.00'))
+        delta = self.client.get(reverse('wallet:api:api_sync'), {'since': token}).json()
+        self.assertEqual([a['balance'] for a in delta['accounts']], ['70.00'])
+
+        out = io.StringIO()
+        call_command('reconcile_balances', stdout=out, stderr=io.StringIO())
+        self.assertIn('0 contas divergentes', out.getvalue())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.client.force_login(self.user)
+        for day, amount in [(datetime.date(2025, 1, 5), '10.50'), (datetime.date(2025, 2, 5), '20.00')]:
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=self.expense,
+                type='expense', amount=Decimal(amount), date=day, description='Feira; "orgânica"',
+            )
+
+    def test_streams_csv_that_can_be_imported_again(self):
+        url = reverse('wallet:api:api_transactions_export', args=['csv'])
+        response = self.client.get(url, {'start': '2025-01-01', 'end': '2025-02-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        lines = content.strip().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('10.50', lines[1])
+
+        other, _, _, _ = make_user_data('bia')
+        rows = list(importers.parse_csv(io.BytesIO(content.encode())))
+        importer = importers.TransactionImporter(other)
+        importer.run(rows)
+        self.assertEqual(importer.created, 1)
+        self.assertEqual(Transaction.objects.get(user=other).description, 'Feira; "orgânica"')
+
+    def test_unknown_format(self):
+        url = reverse('wallet:api:api_transactions_export', args=['pdf'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.client.force_login(self.user)
+
+    def add(self, day, amount, category):
+        Transaction.objects.create(
+            user=self.user, account=self.account, category=category,
+            type=category.type, amount=Decimal(amount), date=day,
+        )
+
+    def test_monthly_deltas_trends_and_outliers(self):
+        for month, amount in [(1, '100.00'), (2, '150.00'), (4, '300.00')]:
+            self.add(datetime.date(2025, month, 10), amount, self.expense)
+        self.add(datetime.date(2025, 1, 5), '1000.00', self.income)
+        for day in range(1, 8):
+            self.add(datetime.date(2025, 3, day), '10.00', self.expense)
+        self.add(datetime.date(2025, 3, 20), '10.00', self.expense)
+
+        frame = analytics.load_frame(self.user)
+        monthly = analytics.monthly_totals(frame)
+        # Março entra mesmo sem receita; meses vazios seriam zero
+        self.assertEqual(monthly['expense'].tolist(), [100.0, 150.0, 80.0, 300.0])
+        self.assertEqual(monthly['net'].tolist()[0], 900.0)
+        mom = analytics.month_over_month(monthly)
+        self.assertEqual(mom['expense'].tolist()[1:], [50.0, -70.0, 220.0])
+        self.assertAlmostEqual(analytics.rolling_average(monthly, 2)['expense'].iloc[-1], 190.0)
+        self.assertGreater(analytics.category_trends(frame, months=4).loc['Mercado', 'slope'], 0)
+
+        flagged = analytics.outliers(frame, threshold=2.0)
+        self.assertEqual(flagged['amount'].tolist(), [300.0])
+
+    def test_insights_endpoint(self):
+        self.add(datetime.date(2025, 1, 10), '100.00', self.expense)
+        response = self.client.get(
+            reverse('wallet:api:api_reports_insights'), {'start': '2025-01-01', 'end': '2025-02-01'}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data['monthly']['period'], ['2025-01-01'])
+        self.assertEqual(data['monthly']['expense'], [100.0])
+        self.assertEqual(data['category_trends']['category'], ['Mercado'])
+
+
+class RecurringRuleTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+
+    def test_monthly_dates_keep_day_of_month(self):
+        rule = RecurringRule(start_date=datetime.date(2025, 1, 31), frequency='monthly', interval=1)
+        self.assertEqual(
+            [rule.occurrence(n) for n in range(4)],
+            [datetime.date(2025, 1, 31), datetime.date(2025, 2, 28), datetime.date(2025, 3, 31), datetime.date(2025, 4, 30)],
+        )
+
+    def test_materialize_is_idempotent_and_posts_balances(self):
+        RecurringRule.objects.create(
+            user=self.user, account=self.account, category=self.income, type='income',
+            amount=Decimal('1000.00'), frequency='monthly', start_date=datetime.date(2025, 1, 5),
+        )
+        RecurringRule.objects.create(
+            user=self.user, account=self.account, category=self.expense, type='expense',
+            amount=Decimal('50.00'), frequency='weekly', interval=2,
+            start_date=datetime.date(2025, 1, 1), count=3,
+        )
+
+        stats = recurring.materialize(today=datetime.date(2025, 3, 10), batch_size=1)
+        self.assertEqual(stats, {'rules': 2, 'created': 6})
+        self.assertEqual(recurring.materialize(today=datetime.date(2025, 3, 10)), {'rules': 0, 'created': 0})
+
+        # 100 + 3 salários - 3 despesas
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('2950.00'))
+        self.assertEqual(
+            sorted(Transaction.objects.filter(type='expense').values_list('date', flat=True)),
+            [datetime.date(2025, 1, 1), datetime.date(2025, 1, 15), datetime.date(2025, 1, 29)],
+        )
+        self.assertFalse(RecurringRule.objects.get(type='expense').active)
+
+        # Continua de onde parou
+        recurring.materialize(today=datetime.date(2025, 4, 5))
+        self.assertEqual(Transaction.objects.filter(type='income').count(), 4)
+
+
+class BudgetTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.march = datetime.date(2025, 3, 1)
+
+    def spend(self, amount, day=datetime.date(2025, 3, 10), **kwargs):
+        return Transaction.objects.create(
+            user=self.user, account=self.account, category=self.expense, type='expense',
+            amount=Decimal(amount), date=day, **kwargs,
+        )
+
+    def spent(self, month):
+        return BudgetUsage.objects.get(budget__category=self.expense, month=month).spent
+
+    def test_counters_follow_writes(self):
+        self.spend('10.00')
+        Budget.objects.create(user=self.user, category=self.expense, amount=Decimal('100.00'))
+        # O orçamento novo já conta as despesas gravadas antes dele
+        self.assertEqual(self.spent(self.march), Decimal('10.00'))
+
+        tx = self.spend('20.00')
+        self.assertEqual(self.spent(self.march), Decimal('30.00'))
+
+        tx.date = datetime.date(2025, 4, 2)
+        tx.save()
+        self.assertEqual(self.spent(self.march), Decimal('10.00'))
+        self.assertEqual(self.spent(datetime.date(2025, 4, 1)), Decimal('20.00'))
+
+        tx.delete()
+        self.assertEqual(self.spent(datetime.date(2025, 4, 1)), Decimal('0.00'))
+
+        # Receitas não contam
+        Transaction.objects.create(
+            user=self.user, account=self.account, category=self.income, type='income',
+            amount=Decimal('500.00'), date=datetime.date(2025, 3, 5),
+        )
+        [row] = budgets.status(self.user, self.march)
+        self.assertEqual((row['spent'], row['remaining'], row['status']), (Decimal('10.00'), Decimal('90.00'), 'ok'))
+
+    def test_threshold_crossing_sends_signal_once(self):
+        Budget.objects.create(user=self.user, category=self.expense, amount=Decimal('100.00'), alert_percent=80)
+        received = []
+
+        def handler(sender, budget, month, spent, percent, **kwargs):
+            received.append((month, spent, percent))
+
+        budgets.threshold_crossed.connect(handler)
+        self.addCleanup(budgets.threshold_crossed.disconnect, handler)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spend('50.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spend('40.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spend('5.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spend('30.00')
+        self.assertEqual(received, [
+            (self.march, Decimal('90.00'), 80),
+            (self.march, Decimal('125.00'), 100),
+        ])
+
+    def test_api_status_and_create(self):
+        self.client.force_login(self.user)
+        url = reverse('wallet:api:api_budgets')
+        response = self.client.post(url, {'category': self.expense.pk, 'amount': '200.00'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(url, {'category': self.expense.pk, 'amount': '300.00'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {'category': self.income.pk, 'amount': '300.00'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        self.spend('250.00')
+        with self.assertNumQueries(1):
+            data = budgets.status(self.user, self.march)
+        self.assertEqual(data[0]['status'], 'exceeded')
+        response = self.client.get(url, {'month': '2025-03'})
+        self.assertEqual(response.json()['data'][0]['percent'], 125.0)
+        self.assertEqual(self.client.get(url, {'month': '03/2025'}).status_code, 400)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        transport = Category.objects.create(user=self.user, name='Transporte', type='expense')
+
+        def create(category, **kwargs):
+            return Transaction.objects.create(
+                user=self.user, account=self.account, category=category, type='expense',
+                amount=Decimal('10.00'), date=datetime.date(2025, 3, 1), **kwargs,
+            )
+
+        self.pharmacy = create(transport, description='Farmácia Popular', note='remédios')
+        self.uber = create(transport, description='Corrida Uber', payment_method='Cartão de crédito')
+        self.market = create(self.expense, description='Compra do mês')
+        # Outro usuário com o mesmo texto
+        other, other_account, other_expense, _ = make_user_data('bia')
+        Transaction.objects.create(
+            user=other, account=other_account, category=other_expense, type='expense',
+            amount=Decimal('10.00'), date=datetime.date(2025, 3, 1), description='Farmácia',
+        )
+
+    def results(self, query):
+        qs = Transaction.objects.filter(user=self.user)
+        return list(search.search(qs, query, user=self.user).values_list('pk', flat=True))
+
+    def test_matches_text_stems_and_category(self):
+        self.assertEqual(self.results('farmácias'), [self.pharmacy.pk])
+        self.assertEqual(self.results('remédio'), [self.pharmacy.pk])
+        self.assertEqual(self.results('cartão'), [self.uber.pk])
+        # Nome da categoria (Mercado) sem o texto na transação
+        self.assertEqual(self.results('mercado'), [self.market.pk])
+        # Casar no texto pesa mais que casar só pela categoria
+        self.assertEqual(self.results('uber OR transporte')[0], self.uber.pk)
+        self.assertEqual(self.results('cinema'), [])
+
+    def test_api_and_html(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('wallet:api:api_transactions_search'), {'q': 'farmácia'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['count'], data['results'][0]['id']), (1, self.pharmacy.pk))
+        self.assertGreater(data['results'][0]['rank'], 0)
+        self.assertEqual(self.client.get(reverse('wallet:api:api_transactions_search')).status_code, 400)
+
+        response = self.client.get(reverse('wallet:transaction_list'), {'q': 'uber'})
+        self.assertEqual([t.pk for t in response.context['transaction']], [self.uber.pk])
+
+
+class FilterTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.bank = Account.objects.create(user=self.user, name='Banco')
+        rows = [
+            (self.account, self.expense, 'expense', '30.00', datetime.date(2025, 1, 10)),
+            (self.account, self.expense, 'expense', '70.00', datetime.date(2025, 2, 10)),
+            (self.bank, self.expense, 'expense', '200.00', datetime.date(2025, 2, 15)),
+            (self.bank, self.income, 'income', '1000.00', datetime.date(2025, 2, 5)),
+        ]
+        for account, category, tx_type, amount, day in rows:
+            Transaction.objects.create(
+                user=self.user, account=account, category=category, type=tx_type,
+                amount=Decimal(amount), date=day,
+            )
+        self.client.force_login(self.user)
+
+    def test_facets_in_one_query(self):
+        qs = filters.apply(
+            Transaction.objects.filter(user=self.user),
+            filters.parse(QueryDict('start=2025-02-01&end=2025-03-01')),
+        )
+        with self.assertNumQueries(1):
+            data = filters.facets(qs)
+        self.assertEqual(data['total'], {'count': 3, 'income': 1000.0, 'expense': 270.0, 'net': 730.0})
+        self.assertEqual(
+            [(row['name'], row['count'], row['income'], row['expense']) for row in data['accounts']],
+            [('Banco', 2, 1000.0, 200.0), ('Carteira', 1, 0.0, 70.0)],
+        )
+        self.assertEqual([(row['name'], row['count']) for row in data['categories']], [('Mercado', 2), ('Salário', 1)])
+        self.assertEqual(sorted((row['type'], row['count']) for row in data['types']), [('expense', 2), ('income', 1)])
+
+        # Datas no dia 1: a mesma resposta vem dos resumos mensais
+        parsed = filters.parse(QueryDict('start=2025-02-01&end=2025-03-01'))
+        self.assertEqual(filters.facets_for(self.user, parsed), data)
+
+        empty = filters.facets(Transaction.objects.none())
+        self.assertEqual(empty['total']['count'], 0)
+
+    def test_api_filters_and_facets(self):
+        url = reverse('wallet:api:api_transactions_list')
+        data = self.client.get(url, {'type': 'expense', 'min_amount': '50', 'facets': '1'}).json()
+        self.assertEqual(sorted(row['amount'] for row in data['results']), ['200.00', '70.00'])
+        self.assertEqual(data['facets']['total']['expense'], 270.0)
+
+        data = self.client.get(url, {'account': [self.account.pk, self.bank.pk], 'category': self.income.pk}).json()
+        self.assertEqual([row['amount'] for row in data['results']], ['1000.00'])
+        self.assertNotIn('facets', data)
+        self.assertEqual(self.client.get(url, {'min_amount': 'abc'}).status_code, 400)
+
+    def test_html_filters_keep_query_in_links(self):
+        url = reverse('wallet:transaction_list')
+        response = self.client.get(url, {'account': self.bank.pk})
+        self.assertEqual(len(response.context['transaction']), 2)
+        self.assertEqual(response.context['facets']['total']['count'], 2)
+        self.assertEqual(response.context['filter_query'], f'account={self.bank.pk}')
+        self.assertEqual(self.client.get(url, {'start': 'ontem'}).status_code, 400)
+
+
+class CategorizerTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.transport = Category.objects.create(user=self.user, name='Transporte', type='expense')
+        rows = [
+            (self.expense, 'Supermercado Pão de Açúcar', 'debito', '250.00'),
+            (self.expense, 'Supermercado Extra', 'debito', '180.00'),
+            (self.expense, 'Feira livre', 'dinheiro', '40.00'),
+            (self.transport, 'Uber viagem', 'credito', '25.00'),
+            (self.transport, 'Uber viagem centro', 'credito', '32.00'),
+            (self.transport, 'Posto combustível', 'credito', '200.00'),
+        ]
+        for category, description, payment_method, amount in rows:
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=category, type='expense',
+                amount=Decimal(amount), date=datetime.date(2025, 1, 10),
+                description=description, payment_method=payment_method,
+            )
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        categorizer.forget(self.user.pk)
+
+    def test_rules_win_over_model(self):
+        CategoryRule.objects.create(user=self.user, category=self.expense, pattern='uber eats')
+        suggester = categorizer.Categorizer(self.user)
+        self.assertEqual(suggester.suggest('UBER EATS pedido', 'credito', 30, 'expense'), (self.expense.pk, 1.0, 'rule'))
+        category_id, confidence, source = suggester.suggest('Uber viagem', 'credito', 30, 'expense')
+        self.assertEqual((category_id, source), (self.transport.pk, 'model'))
+        self.assertGreater(confidence, categorizer.AUTO_ASSIGN_CONFIDENCE)
+        # Receitas só recebem categorias de receita
+        self.assertEqual(suggester.suggest('Uber viagem', None, 30, 'income'), (None, 0.0, None))
+
+    def test_model_learns_from_corrections(self):
+        self.assertEqual(categorizer.Categorizer(self.user).assign('Padaria', 'debito', 15), None)
+        with self.captureOnCommitCallbacks(execute=True):
+            tx = Transaction.objects.create(
+                user=self.user, account=self.account, category=self.transport, type='expense',
+                amount=Decimal('15.00'), date=datetime.date(2025, 1, 11), description='Padaria',
+            )
+        self.assertEqual(categorizer.Categorizer(self.user).suggest('Padaria')[0], self.transport.pk)
+
+        # A correção troca as contagens no modelo em cache, sem remontá-lo
+        with self.captureOnCommitCallbacks(execute=True):
+            tx.category = self.expense
+            tx.save()
+        with self.assertNumQueries(2):
+            suggester = categorizer.Categorizer(self.user)
+        self.assertEqual(suggester.suggest('Padaria')[0], self.expense.pk)
+        self.assertEqual(categorizer.build_model(self.user.pk), categorizer.get_model(self.user.pk))
+
+    def test_batched_writes_update_the_model_once(self):
+        categorizer.get_model(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic(), signals.batched_postings():
+                tx = Transaction.objects.create(
+                    user=self.user, account=self.account, category=self.expense, type='expense',
+                    amount=Decimal('12.00'), date=datetime.date(2025, 1, 12), description='Padaria',
+                )
+                tx.category = self.transport
+                tx.save()
+                Transaction.objects.filter(description='Feira livre').get().delete()
+        updates = [c for c in callbacks if c.__module__ == categorizer.__name__]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(categorizer.build_model(self.user.pk), categorizer.get_model(self.user.pk))
+
+    def test_import_and_form_assign_categories(self):
+        csv_file = io.BytesIO(
+            'data;valor;descricao\n'
+            '05/02/2025;-90,00;Supermercado Dia\n'
+            '06/02/2025;-15,00;Coisa desconhecida\n'.encode('utf-8')
+        )
+        importer = importers.import_file(self.user, csv_file, 'csv', account=self.account)
+        self.assertEqual((importer.created, importer.categorized), (2, 1))
+        self.assertEqual(
+            dict(Transaction.objects.filter(date__month=2).values_list('description', 'category__name')),
+            {'Supermercado Dia': 'Mercado', 'Coisa desconhecida': 'Outros'},
+        )
+
+        form = ExpenseForm(user=self.user, data={
+            'account': self.account.pk, 'amount': '28.00', 'date': '2025-02-07', 'description': 'Uber viagem',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['category'], self.transport)
+        form = ExpenseForm(user=self.user, data={
+            'account': self.account.pk, 'amount': '28.00', 'date': '2025-02-07', 'description': 'xyz',
+        })
+        self.assertIn('category', form.errors)
+
+        # O modelo em cache ainda sugere a categoria, que deixou de ser de despesa
+        Category.objects.filter(pk=self.transport.pk).update(type='income')
+        form = ExpenseForm(user=self.user, data={
+            'account': self.account.pk, 'amount': '28.00', 'date': '2025-02-07', 'description': 'Uber viagem',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('category', form.errors)
+
+    def test_categorize_api(self):
+        url = reverse('wallet:api:api_transactions_categorize')
+        response = self.client.post(url, {'transactions': [
+            {'description': 'Supermercado', 'amount': '120.00', 'type': 'expense'},
+            {'description': 'Uber', 'payment_method': 'credito', 'amount': 20},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['category_name'], row['source']) for row in response.json()['results']],
+            [('Mercado', 'model'), ('Transporte', 'model')],
+        )
+        self.assertEqual(self.client.post(url, {'transactions': 'x'}, content_type='application/json').status_code, 400)
+
+        # Valores negativos usam a faixa do valor absoluto; NaN e infinito são recusados
+        for amount, expected in (('-50', 200), ('1e400', 200), ('NaN', 400), ('Infinity', 400), ('-Infinity', 400)):
+            response = self.client.post(url, {'transactions': [
+                {'description': 'Uber viagem', 'amount': amount},
+            ]}, content_type='application/json')
+            self.assertEqual(response.status_code, expected, amount)
+        self.assertEqual(categorizer.features('Uber', None, Decimal('-50')), categorizer.features('Uber', None, 50))
+
+
+class DuplicateTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        self.client.force_login(self.user)
+
+    def statement(self):
+        return io.BytesIO(
+            'data;valor;descricao;categoria\n'
+            '05/01/2025;-12,00;Café;Mercado\n'
+            '05/01/2025;-12,00;Café;Mercado\n'
+            '06/01/2025;-80,00;Farmácia  São João;Mercado\n'.encode('utf-8')
+        )
+
+    def test_reimport_skips_duplicates_and_flags_near_ones(self):
+        first = importers.import_file(self.user, self.statement(), 'csv', account=self.account, chunk_size=2)
+        # Duas compras iguais no mesmo arquivo são duas transações
+        self.assertEqual((first.created, first.duplicates, first.flagged), (3, 0, 0))
+
+        with self.assertNumQueries(1):
+            fresh, duplicates = dedup.DuplicateScreen(self.user).split([
+                Transaction(user=self.user, account=self.account, category=self.expense, type='expense',
+                            amount=Decimal('80'), date=datetime.date(2025, 1, 6), description='FARMACIA SAO JOAO'),
+                Transaction(user=self.user, account=self.account, category=self.expense, type='expense',
+                            amount=Decimal('80'), date=datetime.date(2025, 1, 8), description='Drogaria'),
+            ])
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(fresh[0].possible_duplicate_id, duplicates[0][1])
+
+        again = importers.import_file(self.user, self.statement(), 'csv', account=self.account)
+        self.assertEqual((again.created, again.duplicates), (0, 3))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('100.00') - 104)
+
+    def test_api_conflict_unless_forced(self):
+        url = reverse('wallet:api:api_transactions_list')
+        payload = {
+            'account': self.account.pk, 'category': self.expense.pk, 'type': 'expense',
+            'amount': '50.00', 'date': '2025-03-01', 'description': 'Mercado',
+        }
+        first = self.client.post(url, payload)
+        self.assertEqual(first.status_code, 201)
+        retry = self.client.post(url, payload)
+        self.assertEqual(retry.status_code, 409)
+        self.assertEqual(retry.json()['duplicate_of'], first.json()['id'])
+        self.assertEqual(self.client.post(url + '?force=1', payload).status_code, 201)
+
+        near = self.client.post(url, {**payload, 'date': '2025-03-02', 'description': 'Mercadinho'}).json()
+        self.assertEqual(near['possible_duplicate'], first.json()['id'])
+        review = reverse('wallet:api:api_transactions_duplicates')
+        self.assertEqual([row['id'] for row in self.client.get(review).json()['results']], [near['id']])
+        response = self.client.post(review, {'keep': [near['id']]}, content_type='application/json')
+        self.assertEqual(response.json(), {'kept': 1})
+        self.assertEqual(self.client.get(review).json()['results'], [])
+
+    def test_refund_is_not_a_duplicate_of_the_purchase(self):
+        # Mesma data, valor e descrição, tipos opostos: o estorno entra no saldo
+        debit = io.BytesIO('data,valor,descricao\n2025-01-10,-100.00,PIX JOAO\n'.encode('utf-8'))
+        credit = io.BytesIO('data,valor,descricao\n2025-01-10,100.00,PIX JOAO\n'.encode('utf-8'))
+        importers.import_file(self.user, debit, 'csv', account=self.account)
+        refund = importers.import_file(self.user, credit, 'csv', account=self.account)
+        self.assertEqual((refund.created, refund.duplicates, refund.flagged), (1, 0, 0))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('100.00'))
+
+        url = reverse('wallet:api:api_transactions_list')
+        payload = {
+            'account': self.account.pk, 'category': self.expense.pk, 'type': 'expense',
+            'amount': '30.00', 'date': '2025-03-01', 'description': 'Loja',
+        }
+        self.assertEqual(self.client.post(url, payload).status_code, 201)
+        income = self.client.post(url, {**payload, 'category': self.income.pk, 'type': 'income'})
+        self.assertEqual(income.status_code, 201)
+        self.assertIsNone(income.json()['possible_duplicate'])
+
+
+@unittest.skipUnless(importlib.util.find_spec('psycopg_pool'), 'psycopg-pool não instalado')
+class ConnectionPoolTests(TestCase):
+    def test_connections_return_to_the_pool(self):
+        settings_dict = copy.deepcopy(connection.settings_dict)
+        settings_dict.update(
+            ENGINE='inwallet.db.backends.postgresql_pool', CONN_MAX_AGE=0,
+            OPTIONS={**settings_dict['OPTIONS'], 'pool': {'min_size': 1, 'max_size': 1}},
+        )
+        connections.settings['pool_test'] = settings_dict
+        self.addCleanup(connections.settings.pop, 'pool_test')
+        wrapper = connections['pool_test']
+        self.addCleanup(connections.__delitem__, 'pool_test')
+        self.addCleanup(wrapper.close_pools)
+
+        pids = set()
+        for _ in range(3):
+            wrapper.close_if_unusable_or_obsolete()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT pg_backend_pid()')
+                pids.add(cursor.fetchone()[0])
+            # Fim da requisição: a conexão volta ao pool em vez de fechar
+            wrapper.close_if_unusable_or_obsolete()
+            self.assertIsNone(wrapper.connection)
+        self.assertEqual(len(pids), 1)
+        self.assertEqual(wrapper.pool.get_stats()['pool_size'], 1)
+
+
+class ReplicaRoutingTests(TestCase):
+    """
+    Uma segunda conexão ao banco de testes faz o papel da réplica: os dados
+    do teste não foram confirmados (TestCase), então ela não os vê, como uma
+    réplica atrasada.
+    """
+    def setUp(self):
+        self.user, self.account, self.expense, _ = make_user_data()
+        self.client.force_login(self.user)
+        Transaction.objects.create(
+            user=self.user, account=self.account, category=self.expense,
+            type='expense', amount=Decimal('30.00'), date=datetime.date(2025, 1, 10),
+        )
+
+        settings_dict = copy.deepcopy(connection.settings_dict)
+        settings_dict.update(ENGINE='django.db.backends.postgresql', CONN_MAX_AGE=0)
+        settings_dict['OPTIONS'].pop('pool', None)
+        connections.settings['replica_test'] = settings_dict
+        self.addCleanup(connections.settings.pop, 'replica_test')
+        self.addCleanup(connections.__delitem__, 'replica_test')
+        self.addCleanup(lambda: connections['replica_test'].close())
+        override = override_settings(WALLET_READ_REPLICAS=['replica_test'])
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def cashflow(self):
+        url = reverse('wallet:api:api_reports_cashflow')
+        return self.client.get(url, {'start': '2025-01-01', 'end': '2025-03-01'}).json()['data']
+
+    def test_reports_read_from_replica_until_the_user_writes(self):
+        with replicas.reporting(self.user):
+            self.assertEqual(Transaction.objects.all().db, 'replica_test')
+        self.assertEqual(Transaction.objects.all().db, 'default')
+        # A réplica ainda não recebeu as transações
+        self.assertEqual(self.cashflow()['net'], [])
+
+        # Depois de gravar, o usuário lê do primário
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=self.expense,
+                type='expense', amount=Decimal('20.00'), date=datetime.date(2025, 2, 10),
+            )
+        self.assertTrue(replicas.is_pinned(self.user.pk))
+        self.assertEqual(self.cashflow()['net'], [-30.0, -20.0])
+        response = self.client.get(reverse('wallet:dashboard') + '?year=2025&month=2')
+        self.assertEqual(response.context['monthly_expense'], Decimal('20.00'))
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'particionamento só no PostgreSQL')
+class PartitionTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, _ = make_user_data()
+
+    def partition_of(self, tx):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM wallet_transaction WHERE id = %s', [tx.pk])
+            return cursor.fetchone()[0]
+
+    def foreign_keys(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass "
+                "AND contype = 'f' ORDER BY 1",
+                [table],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_create_archive_and_restore(self):
+        tx = Transaction.objects.create(
+            user=self.user, account=self.account, category=self.expense,
+            type='expense', amount=Decimal('10.00'), date=datetime.date(2031, 5, 1),
+        )
+        # Sem partição do ano, a linha cai na padrão; ao criar a partição, ela é movida
+        self.assertEqual(self.partition_of(tx), partitions.DEFAULT_PARTITION)
+        self.assertEqual(partitions.create_partition(connection, 2031), 1)
+        self.assertIsNone(partitions.create_partition(connection, 2031))
+        self.assertEqual(self.partition_of(tx), partitions.partition_name(2031))
+
+        # Consultas com filtro de data só leem a partição do intervalo
+        plan = Transaction.objects.filter(
+            user=self.user, date__gte=datetime.date(2031, 1, 1), date__lt=datetime.date(2031, 7, 1),
+        ).explain()
+        self.assertIn(partitions.partition_name(2031), plan)
+        self.assertNotIn(partitions.DEFAULT_PARTITION, plan)
+
+        foreign_keys = self.foreign_keys(partitions.partition_name(2031))
+        self.assertTrue(foreign_keys)
+        # Sem checagens DEFERRABLE pendentes, como no comando (transação própria)
+        connection.check_constraints()
+        partitions.archive_partition(connection, 2031)
+        self.assertFalse(Transaction.objects.filter(pk=tx.pk).exists())
+        # A partição arquivada não prende mais as linhas das outras tabelas
+        self.assertEqual(self.foreign_keys(f'{partitions.ARCHIVE_SCHEMA}.{partitions.partition_name(2031)}'), [])
+        self.assertEqual(partitions.archived_years(connection), [2031])
+        # Os recálculos deixariam de fora o ano arquivado
+        for command in ('rebuild_rollups', 'rebuild_ledger', 'reconcile_balances'):
+            with self.assertRaisesMessage(CommandError, '2031'):
+                call_command(command, stdout=io.StringIO(), stderr=io.StringIO())
+        partitions.restore_partition(connection, 2031)
+        self.assertTrue(Transaction.objects.filter(pk=tx.pk).exists())
+        self.assertEqual(self.foreign_keys(partitions.partition_name(2031)), foreign_keys)
+        call_command('reconcile_balances', stdout=io.StringIO(), stderr=io.StringIO())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.user, self.account, self.expense, _ = make_user_data()
+        self.client.force_login(self.user)
+
+    def sample(self, text, line):
+        """ Valor de uma linha do /metrics (0 se não existe). """
+        for row in text.splitlines():
+            if row.startswith(line + ' '):
+                return float(row.rsplit(' ', 1)[1])
+        return 0.0
+
+    @override_settings(WALLET_METRICS_TOKEN='segredo')
+    def test_request_metrics_and_endpoint(self):
+        url = reverse('wallet:metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        auth = {'HTTP_AUTHORIZATION': 'Bearer segredo'}
+        labels = '{view="wallet:dashboard",method="GET"}'
+        before = self.client.get(url, **auth).content.decode()
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('wallet:dashboard'))
+        queries = len(ctx.captured_queries)  # a próxima requisição limpa o log
+        after = self.client.get(url, **auth)
+        self.assertEqual(after['Content-Type'], metrics.CONTENT_TYPE)
+        after = after.content.decode()
+
+        delta = lambda name: self.sample(after, name + labels) - self.sample(before, name + labels)
+        self.assertEqual(delta('wallet_http_request_duration_seconds_count'), 1)
+        self.assertEqual(delta('wallet_http_request_queries_sum'), queries)
+        self.assertGreater(delta('wallet_http_request_render_seconds_sum'), 0)
+        self.assertGreater(delta('wallet_http_response_size_bytes_sum'), 0)
+        self.assertIn('wallet_http_requests_total{view="wallet:dashboard",method="GET",status="200"}', after)
+
+    @override_settings(WALLET_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with self.assertLogs('wallet.metrics', 'WARNING') as logs:
+            self.client.get(reverse('wallet:api:api_reports_cashflow'))
+        self.assertIn('Requisição lenta: GET /api/v1/reports/cashflow/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBalanceTests(TransactionTestCase):
+    """
+    Vários threads (cada um com sua conexão) gravando na mesma conta.
+    Só roda em bancos com travas de linha (PostgreSQL).
+    """
+    workers = 8
+    per_worker = 25
+
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+
+    def _run_concurrently(self, func):
+        def wrapper(i):
+            try:
+                func(i)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(wrapper, range(self.workers)))
+
+    def test_concurrent_creates_and_deletes(self):
+        def hammer(i):
+            for n in range(self.per_worker):
+                tx = Transaction.objects.create(
+                    user=self.user, account=self.account, category=self.income,
+                    type='income', amount=Decimal('2.00'),
+                )
+                if n % 5 == 0:
+                    tx.delete()
+
+        self._run_concurrently(hammer)
+
+        kept = Transaction.objects.filter(account=self.account).count()
+        self.account.refresh_from_db()
+        self.assertEqual(kept, self.workers * (self.per_worker - self.per_worker // 5))
+        self.assertEqual(self.account.balance, Decimal('100.00') + 2 * kept)
+
+    def test_concurrent_edits_of_the_same_transaction(self):
+        tx = Transaction.objects.create(
+            user=self.user, account=self.account, category=self.expense,
+            type='expense', amount=Decimal('1.00'),
+        )
+
+        def hammer(i):
+            for n in range(self.per_worker):
+                obj = Transaction.objects.get(pk=tx.pk)
+                obj.amount = Decimal(i * self.per_worker + n + 1)
+                obj.save()
+
+        self._run_concurrently(hammer)
+
+        tx.refresh_from_db()
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('100.00') - tx.amount)
+
+    def test_concurrent_date_moves_keep_the_ledger(self):
+        # Só a data muda: o saldo não recebe UPDATE, quem trava é o livro
+        days = (datetime.date(2025, 1, 10), datetime.date(2025, 1, 20))
+        ids = [
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=self.expense,
+                type='expense', amount=Decimal('3.00'), date=days[0],
+            ).pk
+            for _ in range(self.workers)
+        ]
+
+        def hammer(i):
+            for n in range(self.per_worker):
+                obj = Transaction.objects.get(pk=ids[i])
+                obj.date = days[(n + 1) % 2]
+                obj.save()
+
+        self._run_concurrently(hammer)
+
+        rows = DailyBalance.objects.exclude(delta=0).order_by('date').values_list('date', 'delta', 'cumulative')
+        incremental = list(rows)
+        ledger.rebuild(account_ids=[self.account.pk])
+        self.assertEqual(incremental, list(rows))
+
+
+class AsyncAPITests(TransactionTestCase):
+    """
+    As views async consultam o banco em outras threads (outras conexões),
+    que não enxergam a transação aberta de um TestCase.
+    """
+    def setUp(self):
+        self.user, self.account, self.expense, self.income = make_user_data()
+        for day, amount in ((5, '30.00'), (6, '70.00'), (7, '20.00')):
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=self.expense, type='expense',
+                amount=Decimal(amount), date=datetime.date(2025, 2, day), description=f'Compra {day}',
+            )
+        self.client.force_login(self.user)
+        # As threads do executor terminam com cada requisição do cliente de
+        # testes: com CONN_MAX_AGE as suas conexões ficariam abertas e
+        # impediriam a remoção do banco de testes
+        max_age = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+        self.addCleanup(connection.settings_dict.__setitem__, 'CONN_MAX_AGE', max_age)
+
+    def test_same_json_as_sync_api(self):
+        params = {'start': '2025-02-01', 'end': '2025-03-01', 'facets': '1', 'page_size': '2'}
+        sync_data = self.client.get(reverse('wallet:api:api_transactions_list'), params).json()
+        async_data = self.client.get(reverse('wallet:api:api_async_transactions_list'), params).json()
+        self.assertEqual(async_data['results'], sync_data['results'])
+        self.assertEqual(async_data['facets'], sync_data['facets'])
+        self.assertIsNotNone(async_data['next'])
+
+        report = {'start': '2025-01-01', 'end': '2025-04-01'}
+        sync_report = self.client.get(reverse('wallet:api:api_reports_cashflow'), report)
+        async_report = self.client.get(reverse('wallet:api:api_async_reports_cashflow'), report)
+        self.assertEqual(async_report.json(), sync_report.json())
+        cached = self.client.get(
+            reverse('wallet:api:api_async_reports_cashflow'), report, HTTP_IF_NONE_MATCH=async_report['ETag'],
+        )
+        self.assertEqual(cached.status_code, 304)
+
+        balance = self.client.get(reverse('wallet:api:api_async_account_balance', args=[self.account.pk]))
+        self.assertEqual(balance.json()['balance'], 100.0 - 120)
+        self.assertEqual(self.client.get(reverse('wallet:api:api_async_account_balance', args=[0])).status_code, 404)
+
+    def test_dashboard_runs_aggregates(self):
+        url = reverse('wallet:api:api_async_dashboard')
+        data = self.client.get(url, {'year': 2025, 'month': 2}).json()
+        self.assertEqual(data['monthly_expense'], 120.0)
+        self.assertEqual(data['top_categories'], [{'name': 'Mercado', 'total': 120.0}])
+        self.assertEqual([row['name'] for row in data['accounts']], ['Carteira'])
+        self.assertEqual(self.client.get(url, {'month': 13}).status_code, 400)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 403)
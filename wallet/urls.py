@@ -1,5 +1,5 @@
 from django.urls import path, include
-from . import views
+from . import async_views, views
 
 app_name = 'wallet'
 
@@ -9,6 +9,35 @@ app_name = 'wallet'
 # Estas URLs serão usadas pelo React
 api_patterns = [
     path('transaction/', views.TransactionListCreateAPIView.as_view(), name='api_transactions_list'),
+    path('transaction/duplicates/', views.TransactionDuplicatesAPIView.as_view(), name='api_transactions_duplicates'),
+    path('transaction/categorize/', views.TransactionCategorizeAPIView.as_view(), name='api_transactions_categorize'),
+    path('transaction/search/', views.TransactionSearchAPIView.as_view(), name='api_transactions_search'),
+    path('transaction/batch/', views.TransactionBatchAPIView.as_view(), name='api_transactions_batch'),
+    path('transaction/export.<str:file_format>', views.TransactionExportAPIView.as_view(), name='api_transactions_export'),
+    path('transaction/import/', views.TransactionImportAPIView.as_view(), name='api_transactions_import'),
+    path('sync/', views.SyncAPIView.as_view(), name='api_sync'),
+
+    # Relatórios agregados no banco (somente leitura)
+    path('reports/monthly/', views.MonthlyReportAPIView.as_view(), name='api_reports_monthly'),
+    path('reports/by-category/', views.CategoryReportAPIView.as_view(), name='api_reports_by_category'),
+    path('reports/cashflow/', views.CashflowReportAPIView.as_view(), name='api_reports_cashflow'),
+    path('reports/insights/', views.InsightsReportAPIView.as_view(), name='api_reports_insights'),
+    path('reports/balance-history/', views.BalanceHistoryReportAPIView.as_view(), name='api_reports_balance_history'),
+
+    # Saldo de uma conta em uma data (livro-razão)
+    path('accounts/<int:pk>/balance/', views.AccountBalanceAPIView.as_view(), name='api_account_balance'),
+
+    # Orçamentos por categoria e o gasto do mês
+    path('budgets/', views.BudgetAPIView.as_view(), name='api_budgets'),
+
+    # Versões async (ASGI) das leituras: as consultas independentes rodam ao mesmo tempo
+    path('async/transaction/', async_views.AsyncTransactionListAPIView.as_view(), name='api_async_transactions_list'),
+    path('async/accounts/', async_views.AsyncAccountListAPIView.as_view(), name='api_async_accounts'),
+    path('async/accounts/<int:pk>/balance/', async_views.AsyncAccountBalanceAPIView.as_view(), name='api_async_account_balance'),
+    path('async/reports/monthly/', async_views.AsyncMonthlyReportAPIView.as_view(), name='api_async_reports_monthly'),
+    path('async/reports/by-category/', async_views.AsyncCategoryReportAPIView.as_view(), name='api_async_reports_by_category'),
+    path('async/reports/cashflow/', async_views.AsyncCashflowReportAPIView.as_view(), name='api_async_reports_cashflow'),
+    path('async/dashboard/', async_views.AsyncDashboardAPIView.as_view(), name='api_async_dashboard'),
     
     # (Adicionaremos as URLs de update/delete da API aqui depois)
     # path('transactions/<int:pk>/', views.TransactionRetrieveUpdateDestroyAPIView.as_view(), name='api_transaction_detail'),
@@ -46,6 +75,9 @@ urlpatterns = [
     path('categories/<int:pk>/edit/', views.CategoryUpdateView.as_view(), name='category_edit'),
     path('categories/<int:pk>/delete/', views.CategoryDeleteView.as_view(), name='category_delete'),
 
+    # Métricas do processo para o Prometheus
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+
     # (NOVO) Namespace da API
     # Inclui todas as nossas URLs da API sob o prefixo 'api/v1/'
     path('api/v1/', include((api_patterns, 'api'), namespace='api')),
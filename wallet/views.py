@@ -1,17 +1,35 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DeleteView
-from django.db.models import Sum, Case, When, F, DecimalField
-from django.db.models.functions import TruncMonth
+from django.core.exceptions import BadRequest
+from django.core.paginator import Paginator
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views import View
+from django.utils.http import parse_etags, quote_etag
+from django.db import IntegrityError, transaction as db_transaction
 from django.urls import reverse_lazy
-from .models import Transaction, Account, Category
+from django.db.models import Sum
+from .models import Transaction, Account, Category, IdempotencyKey
 from .forms import ExpenseForm, IncomeForm
 from django.utils import timezone
 from decimal import Decimal
+import hashlib
 import json
+import tempfile
 from .forms import AccountForm, CategoryForm
 import datetime
-from rest_framework import generics, permissions
-from .serializers import TransactionSerializer, AccountSerializer, CategorySerializer
+from rest_framework import generics, permissions, parsers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from .serializers import (
+    TransactionSerializer, TransactionSearchSerializer, AccountSerializer, BudgetSerializer, CategorySerializer,
+)
+from .pagination import TransactionCursorPagination
+from . import cache as dashboard_cache
+from . import analytics, budgets, categorizer, dedup, exporters, filters, importers, ledger, metrics, pagination, replicas, reports, rollups, search, signals, sync
 
 class DashboardView(LoginRequiredMixin, TemplateView):
     template_name = 'dashboard.html'
@@ -40,6 +58,12 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         except ValueError:
             month_filter = current_month
 
+        # Valores fora do intervalo voltam para o padrão
+        if not 1 <= month_filter <= 12:
+            month_filter = current_month
+        if not datetime.MINYEAR <= year_filter < datetime.MAXYEAR:
+            year_filter = current_year
+
         # Adiciona os filtros ao contexto para o formulário
         ctx['selected_year'] = year_filter
         ctx['selected_month'] = month_filter
@@ -64,70 +88,62 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         
         # --- FIM DA LÓGICA DE FILTRO ---
 
-        # 1. Filtro base de transações (AGORA USA O FILTRO)
-        qs = Transaction.objects.filter(user=user)
-        
-        # Filtra transações pelo mês e ano selecionados
-        monthly_qs = qs.filter(date__year=year_filter, date__month=month_filter)
-        
-        # Filtra transações pelo ano selecionado (para o gráfico anual)
-        yearly_qs = qs.filter(date__year=year_filter)
+        # 1. Os dados vêm do cache (por usuário/ano/mês), que é invalidado pelos
+        # sinais sempre que o usuário grava algo. Em caso de falta, são
+        # calculados a partir da tabela de resumos mensais (MonthlyRollup).
+        # As agregações vão para a réplica de leitura, se houver (replicas.py).
+        def build():
+            with replicas.reporting(user):
+                return self.build_payload(user, year_filter, month_filter)
+
+        ctx.update(dashboard_cache.get_dashboard(user.pk, year_filter, month_filter, build))
+        return ctx
+
+    def build_payload(self, user, year_filter, month_filter):
+        """
+        Calcula os dados do dashboard que dependem das transações.
+        Tudo é materializado (listas/JSON) para poder ser guardado no cache.
+        """
+        payload = {}
 
         # 2. Saldos por conta (Não muda com o filtro de data)
         accounts = Account.objects.filter(user=user)
-        ctx['accounts'] = accounts
+        payload['accounts'] = list(accounts)
 
         # 3. Totais para os Cards Principais (AGORA USAM O FILTRO)
-        total_balance = accounts.aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
-        
-        monthly_income = monthly_qs.filter(
-            type='income'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        
-        monthly_expense = monthly_qs.filter(
-            type='expense'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        total_balance = sum((a.balance for a in payload['accounts']), Decimal('0.00'))
+        monthly_income, monthly_expense = rollups.month_totals(user, year_filter, month_filter)
 
-        ctx['total_balance'] = total_balance
-        ctx['monthly_income'] = monthly_income
-        ctx['monthly_expense'] = monthly_expense
-        ctx['monthly_net'] = monthly_income - monthly_expense
+        payload['total_balance'] = total_balance
+        payload['monthly_income'] = monthly_income
+        payload['monthly_expense'] = monthly_expense
+        payload['monthly_net'] = monthly_income - monthly_expense
 
         # 4. Dados para o Gráfico de Categorias (AGORA USA O FILTRO)
-        category_qs = (
-            monthly_qs.filter(type='expense') # Filtra pelo mês selecionado
-            .values('category__name') 
-            .annotate(total=Sum('amount'))
-            .order_by('-total')[:5]
-        )
+        category_qs = rollups.top_categories(user, year_filter, month_filter)
         category_labels = [item['category__name'] for item in category_qs]
         category_data = [float(item['total']) for item in category_qs]
         
-        ctx['category_labels'] = json.dumps(category_labels)
-        ctx['category_data'] = json.dumps(category_data)
-        ctx['expenses_by_category'] = category_qs
+        payload['category_labels'] = json.dumps(category_labels)
+        payload['category_data'] = json.dumps(category_data)
+        payload['expenses_by_category'] = category_qs
 
         # 5. Dados para o Gráfico Mensal (AGORA FILTRA PELO ANO)
-        monthly_summary_qs = (
-            yearly_qs.annotate(month=TruncMonth('date')) # Filtra pelo ano selecionado
-            .values('month')
-            .annotate(
-                total_income=Sum(Case(When(type='income', then=F('amount')), default=Decimal('0.0'), output_field=DecimalField())),
-                total_expense=Sum(Case(When(type='expense', then=F('amount')), default=Decimal('0.0'), output_field=DecimalField()))
-            )
-            .order_by('month')
-        )
+        monthly_summary_qs = rollups.year_summary(user, year_filter)
         
         month_labels = [item['month'].strftime('%b/%Y') for item in monthly_summary_qs]
         income_data = [float(item['total_income']) for item in monthly_summary_qs]
         expense_data = [float(item['total_expense']) for item in monthly_summary_qs]
         
-        ctx['month_labels'] = json.dumps(month_labels)
-        ctx['income_data'] = json.dumps(income_data)
-        ctx['expense_data'] = json.dumps(expense_data)
-        ctx['monthly_summary'] = monthly_summary_qs
+        payload['month_labels'] = json.dumps(month_labels)
+        payload['income_data'] = json.dumps(income_data)
+        payload['expense_data'] = json.dumps(expense_data)
+        payload['monthly_summary'] = monthly_summary_qs
 
-        return ctx
+        # 6. Orçamentos do mês (contadores mantidos pelos sinais)
+        payload['budgets'] = budgets.status(user, datetime.date(year_filter, month_filter, 1))
+
+        return payload
 
 # ----------------------------------------------------
 # VIEWS DE TRANSAÇÃO (CRUD)
@@ -179,10 +195,45 @@ class TransactionListView(UserFilteredQuerysetMixin, ListView):
     model = Transaction
     template_name = 'transaction/list.html'
     context_object_name = 'transaction'
-    paginate_by = 15 
+    # Paginação por cursor (ver pagination.py), em vez de paginate_by
+    page_size = 15
+    # Colunas exibidas em transaction/list.html
+    list_fields = ('id', 'date', 'type', 'amount', 'description', 'possible_duplicate')
 
     def get_queryset(self):
-        return super().get_queryset().order_by('-date', '-id')
+        try:
+            self.filters = filters.parse(self.request.GET)
+        except ValidationError as exc:
+            raise BadRequest(exc.detail)
+        return filters.apply(super().get_queryset().for_listing(self.list_fields), self.filters)
+
+    def get_context_data(self, **kwargs):
+        query = self.request.GET.get('q', '').strip()
+        kwargs['query'] = query
+        # Filtros ativos (para o formulário e os links de página) e facetas
+        kwargs['filters'] = self.filters
+        kwargs['filter_query'] = self.request.GET.copy()
+        for name in ('cursor', 'page'):
+            kwargs['filter_query'].pop(name, None)
+        kwargs['filter_query'] = kwargs['filter_query'].urlencode()
+        if query:
+            # Resultados da busca vêm por relevância: paginação por número de página
+            results = search.search(self.object_list, query, user=self.request.user)
+            kwargs['facets'] = filters.facets(results)
+            page = Paginator(results, self.page_size).get_page(self.request.GET.get('page'))
+            kwargs['object_list'] = page.object_list
+            kwargs['page'] = page
+            kwargs['is_paginated'] = page.has_other_pages()
+            return super().get_context_data(**kwargs)
+        kwargs['facets'] = filters.facets_for(self.request.user, self.filters)
+        try:
+            page = pagination.paginate(self.object_list, self.request.GET.get('cursor'), self.page_size)
+        except pagination.InvalidCursor:
+            raise Http404('Cursor inválido.')
+        kwargs['object_list'] = page.object_list
+        kwargs['page'] = page
+        kwargs['is_paginated'] = page.has_next or page.has_previous
+        return super().get_context_data(**kwargs)
 
 class TransactionUpdateView(UserFilteredQuerysetMixin, UpdateView):
     model = Transaction
@@ -305,7 +356,8 @@ class CategoryDeleteView(BaseSettingsDeleteView):
 class TransactionListCreateAPIView(generics.ListCreateAPIView):
     """
     API View para:
-    - GET: Listar todas as transações do usuário logado.
+    - GET: Listar as transações do usuário logado (filtros opcionais:
+      account, category, type, min_amount, max_amount, start, end).
     - POST: Criar uma nova transação para o usuário logado.
     """
     
@@ -314,6 +366,10 @@ class TransactionListCreateAPIView(generics.ListCreateAPIView):
     
     # 2. Quem pode acessar? (Apenas usuários autenticados)
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    # 3. Paginação por cursor: custo constante em qualquer página
+    pagination_class = TransactionCursorPagination
+
     def get_queryset(self):
         """
         Esta função garante que a API retorne APENAS as transações
@@ -322,13 +378,567 @@ class TransactionListCreateAPIView(generics.ListCreateAPIView):
         user = self.request.user
         if not user.is_authenticated:
             return Transaction.objects.none()
-        return Transaction.objects.filter(user=user).order_by('-date', '-id')
+        # Filtros da query string (filters.py): conta, categoria, tipo, valor, datas.
+        # A ordenação ('-date', '-id') é aplicada pela paginação
+        self.filters = filters.parse(self.request.query_params)
+        return filters.apply(Transaction.objects.filter(user=user).for_listing(), self.filters)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Com ?facets=1, a primeira página traz também as facetas (quantidade,
+        receita e despesa por conta, categoria e tipo) do conjunto filtrado.
+        """
+        response = super().list(request, *args, **kwargs)
+        wants_facets = request.query_params.get('facets') in ('1', 'true')
+        if wants_facets and not request.query_params.get(self.paginator.cursor_query_param):
+            response.data['facets'] = filters.facets_for(request.user, self.filters)
+        return response
+
+    def create(self, request, *args, **kwargs):
+        """
+        Uma transação igual a outra já gravada (mesma conta, data, valor e
+        descrição) é recusada com 409, para que um POST repetido não conte o
+        valor duas vezes. Com ?force=1 ela é gravada mesmo assim.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        candidate = Transaction(user=request.user, **serializer.validated_data)
+        fresh, duplicates = dedup.DuplicateScreen(request.user).split([candidate])
+        if duplicates and request.query_params.get('force') not in ('1', 'true'):
+            return Response(
+                {'detail': 'Transação duplicada.', 'duplicate_of': duplicates[0][1]},
+                status=status.HTTP_409_CONFLICT,
+            )
+        self.perform_create(serializer, possible_duplicate_id=candidate.possible_duplicate_id)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
-    def perform_create(self, serializer):
+    def perform_create(self, serializer, **extra):
         """
         Esta função é chamada ao criar (POST) uma nova transação.
         Ela define o campo 'user' automaticamente.
         """
-        serializer.save(user=self.request.user)
+        serializer.save(user=self.request.user, **extra)
         # O seu 'signal.py' cuidará de atualizar o saldo da conta
-        # automaticamente, assim como antes.
\ No newline at end of file
+        # automaticamente, assim como antes.
+
+
+class TransactionDuplicatesAPIView(generics.ListAPIView):
+    """
+    API View de revisão das possíveis duplicatas.
+    - GET: transações marcadas como parecidas com outra já gravada.
+    - POST {"keep": [ids]}: confirma que não são duplicatas (tira a marca).
+      Para descartar uma duplicata, apague-a (DELETE /transaction/<id>/).
+    """
+    serializer_class = TransactionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionCursorPagination
+
+    def get_queryset(self):
+        return self._flagged().for_listing()
+
+    def _flagged(self):
+        return Transaction.objects.filter(user=self.request.user, possible_duplicate__isnull=False)
+
+    def post(self, request):
+        ids = request.data.get('keep') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            raise ValidationError({'keep': 'Envie uma lista de IDs.'})
+        kept = 0
+        with db_transaction.atomic():
+            for tx in self._flagged().filter(pk__in=ids).select_for_update():
+                tx.possible_duplicate = None
+                tx.save(update_fields=['possible_duplicate'])
+                kept += 1
+        return Response({'kept': kept})
+
+class TransactionSearchPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class TransactionSearchAPIView(generics.ListAPIView):
+    """
+    API View de busca.
+    - GET ?q=<termos>&page=<n>: transações do usuário que casam com a busca
+      (descrição, observação, forma de pagamento ou nome da categoria),
+      da mais relevante para a menos relevante, com o campo 'rank'.
+    """
+    serializer_class = TransactionSearchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionSearchPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'Informe o que buscar.'})
+        return search.search(
+            Transaction.objects.filter(user=self.request.user).for_listing(),
+            query, user=self.request.user,
+        )
+
+
+class TransactionCategorizeAPIView(APIView):
+    """
+    API View de sugestão de categorias em lote.
+    - POST {"transactions": [{"description", "payment_method", "amount", "type"}, ...]}:
+      devolve, na mesma ordem, a categoria sugerida, a confiança (0 a 1) e a
+      origem ('rule' ou 'model'). Nada é gravado.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_items = 5000
+
+    def post(self, request):
+        rows = request.data.get('transactions') if isinstance(request.data, dict) else None
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValidationError({'transactions': 'Envie uma lista de transações.'})
+        if len(rows) > self.max_items:
+            raise ValidationError({'transactions': f'No máximo {self.max_items} itens por requisição.'})
+        for row in rows:
+            try:
+                row['amount'] = Decimal(str(row.get('amount') or 0))
+            except ArithmeticError:
+                raise ValidationError({'amount': 'Informe um valor numérico.'})
+            if not row['amount'].is_finite():
+                raise ValidationError({'amount': 'Informe um valor finito.'})
+        suggestions = categorizer.Categorizer(request.user).suggest_many(rows)
+        return Response({'results': suggestions})
+
+
+class TransactionImportAPIView(APIView):
+    """
+    API View para importar um extrato (CSV ou OFX) de uma vez.
+    - POST (multipart): 'file' e, opcionalmente, 'account' (ID da conta
+      usada quando o arquivo não informa uma), 'format' ('csv' ou 'ofx') e
+      'force' (grava também as linhas que já existem).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [parsers.MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': "Envie o arquivo no campo 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        account = None
+        if request.data.get('account'):
+            account = Account.objects.filter(user=request.user, pk=request.data['account']).first()
+            if account is None:
+                return Response({'detail': 'Conta não encontrada.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            file_format = request.data.get('format') or importers.detect_format(upload.name)
+            if file_format not in importers.PARSERS:
+                raise importers.StatementFormatError(f"Formato não suportado: '{file_format}'")
+            importer = importers.import_file(
+                request.user, upload.file, file_format, account=account,
+                skip_duplicates=request.data.get('force') not in ('1', 'true'),
+            )
+        except importers.StatementFormatError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                'created': importer.created,
+                'categorized': importer.categorized,
+                'duplicates': importer.duplicates,
+                'flagged': importer.flagged,
+                'errors': importer.errors,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class TransactionExportAPIView(APIView):
+    """
+    API View para exportar as transações do usuário.
+    - GET /transaction/export.<csv|parquet|xlsx>: filtros opcionais 'start',
+      'end' (exclusivo), 'account' e 'category' (IDs).
+    O CSV é gerado e enviado aos poucos (StreamingHttpResponse); Parquet e
+    XLSX são escritos em um arquivo temporário, lote a lote, e depois enviados.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    chunk_size = 2000
+
+    def get(self, request, file_format):
+        if file_format not in exporters.FORMATS:
+            raise Http404('Formato não suportado.')
+        params = request.query_params
+        filters = {
+            'start': reports.parse_date(params, 'start', None),
+            'end': reports.parse_date(params, 'end', None),
+        }
+        for name in ('account', 'category'):
+            value = params.get(name)
+            if value and not value.isdigit():
+                raise ValidationError({name: 'Informe o ID.'})
+            filters[name] = value or None
+
+        queryset = exporters.export_queryset(request.user, **filters)
+        content_type, extension = exporters.FORMATS[file_format]
+        filename = f'transacoes.{extension}'
+
+        if file_format == 'csv':
+            response = StreamingHttpResponse(
+                exporters.stream_csv(queryset, self.chunk_size), content_type=content_type,
+            )
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+
+        output = tempfile.TemporaryFile()
+        try:
+            exporters.WRITERS[file_format](queryset, output)
+        except exporters.ExportFormatError as exc:
+            output.close()
+            return Response({'detail': str(exc)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        output.seek(0)
+        return FileResponse(output, as_attachment=True, filename=filename, content_type=content_type)
+
+
+class TransactionBatchAPIView(APIView):
+    """
+    API View para criar, editar e apagar várias transações de uma vez.
+    - POST: {"operations": [
+          {"op": "create", "data": {...}},
+          {"op": "update", "id": 10, "data": {...}},   (edição parcial)
+          {"op": "delete", "id": 11}
+      ]}
+    Tudo é validado antes de gravar e aplicado numa única transação do banco:
+    ou todas as operações entram, ou nenhuma. Cada conta recebe um único
+    UPDATE de saldo, não importa quantas operações a afetem.
+    O cabeçalho opcional 'Idempotency-Key' permite repetir a requisição com
+    segurança: a resposta original é devolvida sem aplicar nada de novo.
+    Criações iguais a uma transação já gravada (como no POST individual) são
+    puladas e voltam com status 409 e 'duplicate_of'; as outras operações
+    são aplicadas normalmente. Com ?force=1 elas são gravadas mesmo assim.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_operations = 1000
+    operations = ('create', 'update', 'delete')
+
+    def post(self, request):
+        key = request.headers.get('Idempotency-Key', '').strip()
+        request_hash = hashlib.sha256(
+            json.dumps(request.data, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        if key:
+            replay = self.replay(request, key, request_hash)
+            if replay is not None:
+                return replay
+
+        items = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response({'detail': "Envie uma lista em 'operations'."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_operations:
+            return Response(
+                {'detail': f'No máximo {self.max_operations} operações por requisição.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results, creates, updates, deletes = self.validate(request, items)
+        if any(result['status'] >= 400 for result in results):
+            # Nada é gravado se alguma operação for inválida
+            return Response({'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with db_transaction.atomic():
+                record = None
+                if key:
+                    # A chave única (usuário, chave) barra uma requisição concorrente
+                    # com a mesma chave até este bloco terminar.
+                    record = IdempotencyKey.objects.create(
+                        user=request.user, key=key, request_hash=request_hash,
+                        status_code=status.HTTP_200_OK, response={},
+                    )
+                self.apply(request, results, creates, updates, deletes)
+                body = {'results': results}
+                if record is not None:
+                    record.response = body
+                    record.save(update_fields=['response'])
+        except IntegrityError:
+            if not key:
+                raise
+            replay = self.replay(request, key, request_hash)
+            if replay is None:
+                raise
+            return replay
+
+        return Response(body, status=status.HTTP_200_OK)
+
+    def replay(self, request, key, request_hash):
+        record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is None:
+            return None
+        if record.request_hash != request_hash:
+            return Response(
+                {'detail': 'Esta Idempotency-Key já foi usada com outro conteúdo.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+    def validate(self, request, items):
+        """
+        Valida todas as operações. Retorna a lista de resultados (um por item,
+        na ordem recebida) e as operações válidas separadas por tipo.
+        """
+        results = [{'index': index, 'op': None, 'status': 200} for index in range(len(items))]
+        create_rows, create_indexes = [], []
+        updates, deletes = [], []
+
+        # As transações editadas/apagadas são buscadas numa única consulta
+        ids = set()
+        for item in items:
+            if isinstance(item, dict) and item.get('op') in ('update', 'delete'):
+                ids.add(item.get('id'))
+        existing = Transaction.objects.filter(
+            user=request.user, pk__in=[pk for pk in ids if isinstance(pk, int)]
+        ).select_related('account', 'category').in_bulk()
+
+        seen = set()
+        for index, item in enumerate(items):
+            result = results[index]
+            op = item.get('op') if isinstance(item, dict) else None
+            result['op'] = op
+            if op not in self.operations:
+                result.update(status=400, errors={'op': f"Use um de: {', '.join(self.operations)}."})
+                continue
+
+            if op == 'create':
+                create_rows.append(item.get('data') or {})
+                create_indexes.append(index)
+                continue
+
+            pk = item.get('id')
+            result['id'] = pk
+            if pk in seen:
+                result.update(status=400, errors={'id': 'A mesma transação aparece mais de uma vez.'})
+                continue
+            seen.add(pk)
+            instance = existing.get(pk) if isinstance(pk, int) else None
+            if instance is None:
+                result.update(status=404, errors={'id': 'Transação não encontrada.'})
+                continue
+
+            if op == 'delete':
+                deletes.append((index, instance))
+                continue
+
+            serializer = TransactionSerializer(
+                instance, data=item.get('data') or {}, partial=True, context={'request': request}
+            )
+            if serializer.is_valid():
+                updates.append((index, serializer))
+            else:
+                result.update(status=400, errors=serializer.errors)
+
+        creates = []
+        if create_rows:
+            serializer = TransactionSerializer(data=create_rows, many=True, context={'request': request})
+            if serializer.is_valid():
+                creates = list(zip(create_indexes, serializer.validated_data))
+            else:
+                for index, errors in zip(create_indexes, serializer.errors):
+                    if errors:
+                        results[index].update(status=400, errors=errors)
+        return results, creates, updates, deletes
+
+    def apply(self, request, results, creates, updates, deletes):
+        """ Grava as operações já validadas. Deve rodar dentro de um atomic(). """
+        with signals.batched_postings():
+            if creates:
+                pending = [(index, Transaction(user=request.user, **data)) for index, data in creates]
+                # A mesma triagem do POST individual, numa consulta para o lote todo
+                fresh, duplicates = dedup.DuplicateScreen(request.user).split([tx for _, tx in pending])
+                if request.query_params.get('force') not in ('1', 'true'):
+                    duplicate_of = {id(tx): pk for tx, pk in duplicates}
+                    for index, tx in pending:
+                        if id(tx) in duplicate_of:
+                            results[index].update(status=409, duplicate_of=duplicate_of[id(tx)])
+                    pending = [(index, tx) for index, tx in pending if id(tx) not in duplicate_of]
+
+                # Criações em massa: um INSERT e os saldos/resumos de uma vez
+                objs = Transaction.objects.bulk_create([tx for _, tx in pending])
+                signals.post_bulk_create(objs)
+                for (index, _), obj in zip(pending, objs):
+                    results[index].update(status=201, id=obj.pk)
+
+            for index, serializer in updates:
+                serializer.save()
+                results[index]['data'] = serializer.data
+
+            if deletes:
+                Transaction.objects.filter(pk__in=[tx.pk for _, tx in deletes]).delete()
+                for index, _ in deletes:
+                    results[index]['status'] = 204
+
+
+class SyncAPIView(APIView):
+    """
+    API View de sincronização incremental.
+    - GET ?since=<token>&limit=<n>: contas, categorias e transações alteradas
+      depois do token, e os IDs apagados. Repita com o novo 'token' enquanto
+      'has_more' for verdadeiro. Sem 'since', devolve tudo desde o início.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        since, limit = sync.parse_params(request.query_params)
+        return Response(sync.changes(request.user, since, limit))
+
+
+# ----------------------------------------------------
+# API DE RELATÓRIOS (somente leitura)
+# ----------------------------------------------------
+
+class BaseReportAPIView(APIView):
+    """
+    Base dos relatórios. Os dados são agregados no banco e retornados em
+    formato colunar. O ETag é derivado da versão dos dados do usuário (a mesma
+    usada pelo cache do dashboard) e dos parâmetros: se nada mudou, o cliente
+    recebe 304 sem que nenhuma agregação seja executada.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_etag(self, request, start, end, granularity):
+        version = dashboard_cache.get_version(request.user.pk)
+        params = reports.etag_params(request.query_params, start, end, granularity)
+        raw = f"{request.path}|{request.user.pk}|{version}|{params}"
+        return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+    def get(self, request):
+        start, end, granularity = reports.parse_params(request.query_params)
+        etag = self.get_etag(request, start, end, granularity)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            with replicas.reporting(request.user):
+                data = self.build_report(request, start, end, granularity)
+            response = Response({
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'granularity': granularity,
+                'data': data,
+            })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def build_report(self, request, start, end, granularity):
+        raise NotImplementedError
+
+
+class MonthlyReportAPIView(BaseReportAPIView):
+    """ GET: receita e despesa por período (day/week/month/year). """
+    def build_report(self, request, start, end, granularity):
+        return reports.period_totals(request.user, start, end, granularity)
+
+
+class CategoryReportAPIView(BaseReportAPIView):
+    """ GET: totais por categoria no intervalo (filtro opcional 'type'). """
+    def build_report(self, request, start, end, granularity):
+        tx_type = request.query_params.get('type')
+        if tx_type and tx_type not in dict(Transaction.TYPE_CHOICES):
+            raise ValidationError({'type': "Use 'income' ou 'expense'."})
+        return reports.category_totals(request.user, start, end, tx_type)
+
+
+class CashflowReportAPIView(BaseReportAPIView):
+    """ GET: fluxo de caixa por período, com saldo líquido e acumulado. """
+    def build_report(self, request, start, end, granularity):
+        return reports.cashflow(request.user, start, end, granularity)
+
+
+class InsightsReportAPIView(BaseReportAPIView):
+    """
+    GET: análises do período calculadas com pandas: totais mensais, média
+    móvel ('window' meses), variação mês a mês, tendência por categoria,
+    ritmo de gastos (burn rate) e despesas fora do padrão ('threshold' = z-score).
+    """
+    def build_report(self, request, start, end, granularity):
+        try:
+            window = int(request.query_params.get('window', 3))
+            threshold = float(request.query_params.get('threshold', 3.0))
+        except ValueError:
+            raise ValidationError({'window': "'window' e 'threshold' devem ser números."})
+        if window < 1 or threshold <= 0:
+            raise ValidationError({'window': "'window' e 'threshold' devem ser positivos."})
+        balance = Account.objects.filter(user=request.user).aggregate(total=Sum('balance'))['total']
+        return analytics.insights(request.user, start, end, window, threshold, balance)
+
+
+def _get_account(request, pk):
+    account = Account.objects.filter(user=request.user, pk=pk).first()
+    if account is None:
+        raise Http404('Conta não encontrada.')
+    return account
+
+
+class BalanceHistoryReportAPIView(BaseReportAPIView):
+    """
+    GET ?account=<id>: saldo da conta no fim de cada período com
+    movimentação, lido do livro-razão (DailyBalance), mais o saldo de
+    abertura antes de 'start'.
+    """
+    def build_report(self, request, start, end, granularity):
+        pk = request.query_params.get('account')
+        if not pk or not pk.isdigit():
+            raise ValidationError({'account': 'Informe o ID da conta.'})
+        account = _get_account(request, pk)
+        history = ledger.history(account, start, end, granularity)
+        return {'account': account.pk, 'opening': history['opening'], **history['data']}
+
+
+class AccountBalanceAPIView(APIView):
+    """ GET ?date=AAAA-MM-DD: saldo da conta no fim do dia (padrão: hoje). """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        account = _get_account(request, pk)
+        day = reports.parse_date(request.query_params, 'date', datetime.date.today())
+        return Response({
+            'account': account.pk,
+            'date': day.isoformat(),
+            'balance': ledger.balance_at(account, day),
+        })
+
+
+class BudgetAPIView(APIView):
+    """
+    API View de orçamentos por categoria.
+    - GET ?month=AAAA-MM: cada orçamento com o gasto, o restante e o status
+      ('ok', 'alert' ou 'exceeded') no mês (padrão: o mês atual).
+    - POST: cria um orçamento ({"category", "amount", "alert_percent"}).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        month = datetime.date.today().replace(day=1)
+        if request.query_params.get('month'):
+            try:
+                month = datetime.datetime.strptime(request.query_params['month'], '%Y-%m').date()
+            except ValueError:
+                raise ValidationError({'month': 'Use o formato AAAA-MM.'})
+        return Response({
+            'month': month.isoformat(),
+            'data': budgets.status(request.user, month),
+        })
+
+    def post(self, request):
+        serializer = BudgetSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class MetricsView(View):
+    """
+    GET /metrics: métricas deste processo (metrics.py) no formato de texto
+    do Prometheus. Acesso para staff ou com o token WALLET_METRICS_TOKEN.
+    """
+    def get(self, request):
+        token = settings.WALLET_METRICS_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if not (request.user.is_staff or (token and constant_time_compare(header, f'Bearer {token}'))):
+            return HttpResponseForbidden()
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)